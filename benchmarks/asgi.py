@@ -0,0 +1,106 @@
+"""
+Throughput of the hot scooter endpoints through the Django WSGI and ASGI handlers.
+Requests are made in process, so the numbers show handler and view overhead, not network.
+
+Run from the project root:
+    python -m benchmarks.asgi [concurrency] [requests]
+"""
+import asyncio
+import importlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+from django.urls import clear_url_caches
+
+from .common import report
+import idascooter.urls
+from scooter_control.views import ScooterViewSet
+
+CONCURRENCY = 16
+REQUESTS = 2000
+FLEET = 1000
+
+
+def route_async_views(enabled: bool) -> None:
+    settings.ASYNC_VIEWS = enabled
+    importlib.reload(idascooter.urls)
+    clear_url_caches()
+
+
+def endpoints(scooter_id: str) -> list[tuple[str, str, dict]]:
+    return [
+        ('list', '/api/v1/scooter/all?limit=10', {}),
+        ('status count', '/api/v1/scooter/status/count/', {}),
+        ('vacant', '/api/v1/scooter/vacant/', {'scooter_id': scooter_id}),
+    ]
+
+
+def wsgi_rate(path: str, data: dict, concurrency: int, requests: int) -> float:
+    """
+    Serve requests by a pool of threads, as a threaded WSGI server does
+    :return: Requests per second
+    """
+    client = Client()
+    call = (lambda: client.post(path, data, content_type='application/json')) if data else (lambda: client.get(path))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for response in pool.map(lambda _: call(), range(requests)):
+            assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+
+def asgi_rate(path: str, data: dict, concurrency: int, requests: int) -> float:
+    """
+    Serve requests by concurrent tasks on one event loop, as an ASGI server does
+    :return: Requests per second
+    """
+    client = AsyncClient()
+
+    async def call():
+        if data:
+            return await client.post(path, data, content_type='application/json')
+        return await client.get(path)
+
+    async def worker(count: int):
+        for _ in range(count):
+            response = await call()
+            assert response.status_code == 200, response.status_code
+
+    async def run():
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return requests // concurrency * concurrency / (time.perf_counter() - start)
+
+
+def main(concurrency: int, requests: int) -> None:
+    setup_test_environment()  # lets the test clients through ALLOWED_HOSTS
+    service = ScooterViewSet.scooter_service
+    for _ in range(FLEET):
+        scooter = service.add_scooter()
+    rows = []
+    for name, path, data in endpoints(str(scooter.id)):
+        route_async_views(False)
+        wsgi = wsgi_rate(path, data, concurrency, requests)
+        asgi_sync = asgi_rate(path, data, concurrency, requests)
+        route_async_views(True)
+        asgi_async = asgi_rate(path, data, concurrency, requests)
+        rows.append([name, f'{wsgi:.0f}', f'{asgi_sync:.0f}', f'{asgi_async:.0f}'])
+    route_async_views(False)
+    report(
+        f'Requests per second, {concurrency} concurrent clients, {requests} requests',
+        ['endpoint', 'WSGI viewset', 'ASGI viewset', 'ASGI async views'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else CONCURRENCY,
+        int(sys.argv[2]) if len(sys.argv) > 2 else REQUESTS,
+    )
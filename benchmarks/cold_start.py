@@ -0,0 +1,65 @@
+"""
+Cold start of a process loading the API, with the scheduler started lazily and at app load.
+
+Run from the project root:
+    python -m benchmarks.cold_start [runs]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+from .common import report
+
+RUNS = 10
+
+# loads the API the way a worker does and prints seconds spent and live threads
+STARTUP = """
+import threading
+import time
+
+start = time.perf_counter()
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'idascooter.settings')
+from django.conf import settings
+settings.SCHEDULER['AUTOSTART'] = {autostart}
+import django
+django.setup()
+import idascooter.urls
+print(time.perf_counter() - start, threading.active_count())
+"""
+
+
+def cold_start(autostart: bool) -> tuple[float, float, int]:
+    """
+    Start a fresh interpreter loading the API
+    :param autostart: Whether the scheduler starts at app load
+    :return: Seconds of the whole process, seconds loading the API and live threads after loading
+    """
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, '-c', STARTUP.format(autostart=autostart)],
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return time.perf_counter() - start, float(out[0]), int(out[1])
+
+
+def main(runs: int) -> None:
+    rows = []
+    for autostart in (False, True):
+        samples = [cold_start(autostart) for _ in range(runs)]
+        rows.append([
+            'app load' if autostart else 'lazy',
+            f'{statistics.median(s[0] for s in samples) * 1000:.1f}',
+            f'{statistics.median(s[1] for s in samples) * 1000:.1f}',
+            samples[-1][2],
+        ])
+    report(
+        f'Cold start, median of {runs} runs',
+        ['scheduler start', 'process ms', 'load ms', 'threads'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)
@@ -0,0 +1,43 @@
+import os
+import time
+from typing import Callable
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'idascooter.settings')
+django.setup()
+
+
+def best_of(func: Callable, number: int = 1000, repeat: int = 5) -> float:
+    """
+    Time a function call
+    :param func: Function without arguments
+    :param number: Calls per round
+    :param repeat: Number of rounds
+    :return: Best mean seconds per call over all rounds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def report(title: str, header: list[str], rows: list[list]) -> None:
+    """
+    Print benchmark results as a plain table
+    :param title: Table title
+    :param header: Column names
+    :param rows: Table rows
+    """
+    widths = [
+        max(len(str(cell)) for cell in [name] + [row[i] for row in rows])
+        for i, name in enumerate(header)
+    ]
+    print(title)
+    print('  '.join(name.rjust(width) for name, width in zip(header, widths)))
+    for row in rows:
+        print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+    print()
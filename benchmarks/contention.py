@@ -0,0 +1,74 @@
+"""
+Threads racing on occupy and vacant of a few scooters, with striped locks and with a single lock.
+
+Run from the project root:
+    python -m benchmarks.contention [thread counts...]
+"""
+import sys
+import threading
+import time
+from random import Random
+from uuid import uuid4
+
+from .common import report
+from scooter_control.services import ScooterService
+
+THREADS = [1, 2, 4, 8, 16]
+SCOOTERS = 32
+ROUNDS = 20_000
+
+
+def race(service: ScooterService, threads: int, rounds: int) -> tuple[float, int, int]:
+    """
+    Let every thread occupy a random scooter and vacant it when it wins
+    :param service: Service with registered scooters
+    :param threads: Number of racing threads
+    :param rounds: Occupy attempts per thread
+    :return: Seconds, number of lost races and number of wins overwritten by another thread
+    """
+    scooter_ids = list(service.scooters)
+    barrier = threading.Barrier(threads + 1)
+    lost, stolen = [0] * threads, [0] * threads
+
+    def run(index: int) -> None:
+        rng = Random(index)
+        passenger_id = uuid4()
+        barrier.wait()
+        for _ in range(rounds):
+            scooter_id = rng.choice(scooter_ids)
+            if not service.occupy_scooter(scooter_id, passenger_id):
+                lost[index] += 1
+                continue
+            if service.get_scooter(scooter_id).passenger_id != passenger_id:
+                stolen[index] += 1
+            service.vacant_scooter(scooter_id)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, sum(lost), sum(stolen)
+
+
+def main(thread_counts: list[int]) -> None:
+    rows = []
+    for threads in thread_counts:
+        row = [threads]
+        for stripes in (64, 1):
+            service = ScooterService(lock_stripes=stripes)
+            service.add_scooters(SCOOTERS)
+            seconds, lost, stolen = race(service, threads, ROUNDS)
+            row += [f'{threads * ROUNDS / seconds / 1000:.0f}', lost, stolen]
+        rows.append(row)
+    report(
+        f'{ROUNDS} occupy attempts per thread on {SCOOTERS} scooters, thousands per second',
+        ['threads', 'striped', 'lost', 'stolen', 'one lock', 'lost', 'stolen'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or THREADS)
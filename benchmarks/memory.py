@@ -0,0 +1,62 @@
+"""
+Memory held per scooter and per passenger by the in-memory services.
+
+Run from the project root:
+    python -m benchmarks.memory [count]
+"""
+import gc
+import sys
+import tracemalloc
+
+from .common import report
+from scooter_control.services import PassengerService, ScooterService
+
+COUNT = 200_000
+
+
+def measure(fill) -> float:
+    """
+    Measure memory allocated by a function and still held after it returns
+    :param fill: Function creating objects and returning them
+    :return: Allocated bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    kept = fill()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def fill_scooters(count: int) -> ScooterService:
+    service = ScooterService()
+    for _ in range(count):
+        service.add_scooter()
+    return service
+
+
+def fill_passengers(count: int) -> PassengerService:
+    service = PassengerService()
+    for i in range(count):
+        service.add_passenger(f'name{i}', f'surname{i}')
+    return service
+
+
+def main(count: int) -> None:
+    scooters = measure(lambda: fill_scooters(count))
+    passengers = measure(lambda: fill_passengers(count))
+    report(
+        f'Service memory for {count} records, including IDs and indexes',
+        ['record', 'bytes per record'],
+        [
+            ['scooter', f'{scooters / count:.1f}'],
+            ['passenger', f'{passengers / count:.1f}'],
+        ],
+    )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT)
@@ -0,0 +1,35 @@
+"""
+Page latency of ScooterService.get_scooter_list as the fleet grows.
+
+Run from the project root:
+    python -m benchmarks.pagination [fleet sizes...]
+"""
+import sys
+
+from .common import best_of, report
+from scooter_control.services import ScooterService
+
+FLEET_SIZES = [1_000, 10_000, 100_000, 500_000]
+LIMIT = 50
+
+
+def main(fleet_sizes: list[int]) -> None:
+    rows = []
+    service = ScooterService()
+    for size in sorted(fleet_sizes):
+        while len(service.scooters) < size:
+            service.add_scooter()
+        row = [size]
+        for offset in (0, size // 2, size - LIMIT):
+            seconds = best_of(lambda: service.get_scooter_list(limit=LIMIT, offset=offset))
+            row.append(f'{seconds * 1e6:.2f}')
+        rows.append(row)
+    report(
+        f'get_scooter_list(limit={LIMIT}), microseconds per page',
+        ['fleet', 'first page', 'middle page', 'last page'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or FLEET_SIZES)
@@ -0,0 +1,67 @@
+"""
+Warm restart of a fleet from a snapshot and a journal of the changes made after it.
+
+Run from the project root:
+    python -m benchmarks.warm_restart [scooter counts...]
+"""
+import os
+import sys
+import tempfile
+
+from .common import report
+from scooter_control.services import PassengerService, ScooterService
+from scooter_control.services.fleet_store import SnapshotFleetStore
+
+SCOOTERS = [100_000, 1_000_000]
+# passengers per scooter
+PASSENGERS = 0.1
+# occupy changes journaled after the snapshot per scooter
+CHANGES = 0.05
+
+
+def warm_restart(path: str, scooters: int) -> list:
+    """
+    Fill a fleet, snapshot it, journal some changes and restore it in fresh services
+    :param path: Empty directory for the fleet files
+    :param scooters: Number of scooters
+    :return: Table row
+    """
+    store = SnapshotFleetStore(path, snapshot_interval=None)
+    scooter_service, passenger_service = ScooterService(store=store), PassengerService(store=store)
+    added = scooter_service.add_scooters(scooters)
+    passenger_ids = passenger_service.add_passengers([("Elon", "Musk")] * int(scooters * PASSENGERS))
+    snapshot = store.snapshot()
+    for i in range(int(scooters * CHANGES)):
+        scooter_service.occupy_scooter(added[i].id, passenger_ids[i % len(passenger_ids)])
+    journal_size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if "journal" in name)
+    store.close()
+
+    store = SnapshotFleetStore(path, snapshot_interval=None)
+    # services register with the store to receive the restored entities
+    scooter_service, passenger_service = ScooterService(store=store), PassengerService(store=store)
+    restored = store.restore()
+    store.close()
+    return [
+        scooters,
+        f'{snapshot["size"] / 2 ** 20:.1f}',
+        f'{snapshot["seconds"]:.2f}',
+        f'{journal_size / 2 ** 20:.1f}',
+        f'{restored["seconds"]:.2f}',
+        f'{(restored["snapshot"] + restored["journal"]) / restored["seconds"] / 1000:.0f}',
+    ]
+
+
+def main(counts: list[int]) -> None:
+    rows = []
+    for scooters in counts:
+        with tempfile.TemporaryDirectory() as path:
+            rows.append(warm_restart(path, scooters))
+    report(
+        f'Snapshot with {PASSENGERS:.0%} passengers, journal of {CHANGES:.0%} occupied scooters',
+        ['scooters', 'snapshot MB', 'write s', 'journal MB', 'restore s', 'thousands/s'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SCOOTERS)
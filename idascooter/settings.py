@@ -86,8 +86,105 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
 }
 
+# Passenger log
+# MODE is "direct" to write every entry at once, "buffered" to write entries
+# in batches of FLUSH_SIZE, at most FLUSH_INTERVAL seconds late, or "background"
+# to hand entries to a writer thread through a queue of QUEUE_SIZE entries.
+# When the queue is full, QUEUE_POLICY "block" waits up to QUEUE_TIMEOUT seconds
+# before dropping the entry and "drop" drops it at once.
+# The log file is rotated into a numbered segment once it would grow over
+# MAX_BYTES or once it is older than ROTATE_INTERVAL seconds, None disables
+# either trigger. Only the latest MAX_SEGMENTS segments are kept, older ones
+# are deleted once no kept export refers to them, None keeps every segment.
+# COMPRESS gzips rotated segments in the scheduler executor COMPRESS_EXECUTOR,
+# "processpool" by default.
+# The file is also rotated on start, so entries of the previous run are kept.
+# PER_PROCESS keeps the log of every worker process in the subdirectory of a
+# worker slot, so workers do not rotate each other's files or export each
+# other's entries. A worker locks the lowest free slot while it runs, so a
+# restarted worker continues the log of the one it replaces. Downloads of an
+# export of another worker answer 410. It is on by default with the "shared"
+# FLEET_STORE.
+
+PASSENGER_LOG = {
+    "MODE": "direct",
+    "FLUSH_SIZE": 100,
+    "FLUSH_INTERVAL": 1.0,
+    "QUEUE_SIZE": 10000,
+    "QUEUE_POLICY": "block",
+    "QUEUE_TIMEOUT": 1.0,
+    "MAX_BYTES": None,
+    "ROTATE_INTERVAL": None,
+    "MAX_SEGMENTS": 100,
+    "COMPRESS": False,
+    "COMPRESS_EXECUTOR": "processpool",
+}
+
+# Background operations
+# Finished operations are kept for TTL seconds since they were last read, at
+# most MAX_SIZE of them. None disables either limit.
+# PERSIST writes finished operations to the database (run migrate first), they
+# are read back once evicted from memory or after a restart.
+
+OPERATIONS = {
+    "TTL": 3600,
+    "MAX_SIZE": 10000,
+    "PERSIST": False,
+}
+
+# Background scheduler
+# I/O-bound jobs run in a pool of THREAD_POOL_SIZE threads, CPU-bound jobs in a
+# pool of PROCESS_POOL_SIZE processes started with PROCESS_START_METHOD.
+# Jobs run however late they are (misfire_grace_time None), late runs of the
+# same job are merged into one (coalesce).
+# The scheduler starts on the first scheduled job, AUTOSTART starts it once the
+# app is loaded instead. Forked workers start their own scheduler.
+
+SCHEDULER = {
+    "AUTOSTART": False,
+    "THREAD_POOL_SIZE": 10,
+    "PROCESS_POOL_SIZE": 2,
+    "PROCESS_START_METHOD": "spawn",
+    "JOB_DEFAULTS": {
+        "coalesce": True,
+        "max_instances": 1,
+        "misfire_grace_time": None,
+    },
+}
+
 WSGI_APPLICATION = 'idascooter.wsgi.application'
 
+# Fleet state storage
+# "memory" keeps scooters and passengers in the worker process only.
+# "database" persists them in the database, one row each, written through on
+# every change in batches of BATCH_SIZE rows and loaded back on start.
+# "shared" shares them between the worker processes of a host through a change
+# journal in the database: reads are served from memory and lag behind other
+# workers by at most SYNC_INTERVAL seconds, writes are serialized by a database
+# lock. Every COMPACT_INTERVAL seconds the journal is folded into the tables of
+# the "database" store, which starting workers load before replaying the rest.
+# SQLite databases are switched to WAL so reads do not wait for writers.
+# Operations stay per worker, so does the passenger log (see PER_PROCESS).
+# Run migrate before using a database store.
+# "snapshot" keeps them in the worker process and in files under PATH for a
+# warm restart: a binary snapshot every SNAPSHOT_INTERVAL seconds and a journal
+# of the changes made since, synced to disk on every write with FSYNC, e.g.
+# "OPTIONS": {"PATH": BASE_DIR / "fleet", "SNAPSHOT_INTERVAL": 300}.
+# "manage.py fleet_restore" reports how long a restart takes to restore them.
+
+FLEET_STORE = {
+    "STORE": "memory",
+    "OPTIONS": {},
+}
+
+# Serve the scooter list, status count, occupy, vacant, broken and passenger
+# scooter endpoints with async-native views. Turn on when running under ASGI
+# (idascooter.asgi), under WSGI every async view costs an event loop hop instead.
+# Only the "memory" FLEET_STORE can be used with them, the system check refuses
+# the others: their I/O would run on the event loop.
+
+ASYNC_VIEWS = False
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -19,6 +19,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from scooter_control import async_views
 from scooter_control.views import ScooterViewSet
 
 urlpatterns = [
@@ -34,6 +35,24 @@ urlpatterns = [
         ),
         name="get_scooter",
     ),
+    path(
+        "api/v1/scooter/bulk/",
+        ScooterViewSet.as_view(
+            {
+                "post": "post_scooters_bulk",
+            }
+        ),
+        name="post_scooters_bulk",
+    ),
+    path(
+        "api/v1/scooter/batch/",
+        ScooterViewSet.as_view(
+            {
+                "post": "post_scooters_batch",
+            }
+        ),
+        name="post_scooters_batch",
+    ),
     path(
         "api/v1/scooter/all",
         ScooterViewSet.as_view(
@@ -43,6 +62,16 @@ urlpatterns = [
         ),
         name="get_scooters_list",
     ),
+    path(
+        "api/v1/scooter/status/count/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_scooter_status_count",
+            }
+        ),
+        name="get_scooter_status_count",
+    ),
+    path("api/v1/scooter/events/", async_views.get_scooter_events, name="get_scooter_events"),
     path(
         "api/v1/passenger/",
         ScooterViewSet.as_view(
@@ -52,6 +81,24 @@ urlpatterns = [
         ),
         name="post_passenger",
     ),
+    path(
+        "api/v1/passenger/bulk/",
+        ScooterViewSet.as_view(
+            {
+                "post": "post_passengers_bulk",
+            }
+        ),
+        name="post_passengers_bulk",
+    ),
+    path(
+        "api/v1/passenger/scooter/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_passenger_scooter",
+            }
+        ),
+        name="get_passenger_scooter",
+    ),
     path(
         "api/v1/scooter/occupy/",
         ScooterViewSet.as_view(
@@ -98,4 +145,66 @@ urlpatterns = [
         ),
         name="get_log_file_status",
     ),
+    path(
+        "api/v1/log/status/wait/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_log_file_status_wait",
+            }
+        ),
+        name="get_log_file_status_wait",
+    ),
+    path(
+        "api/v1/log/download/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_log_file_download",
+            }
+        ),
+        name="get_log_file_download",
+    ),
+    path(
+        "api/v1/log/entry/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_log_entry",
+            }
+        ),
+        name="get_log_entry",
+    ),
+    path(
+        "api/v1/log/search/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_log_search",
+            }
+        ),
+        name="get_log_search",
+    ),
+    path(
+        "api/v1/metrics/",
+        ScooterViewSet.as_view(
+            {
+                "get": "get_metrics",
+            }
+        ),
+        name="get_metrics",
+    ),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+
+# the long-poll waits on the event loop under ASGI, a sync view would block the thread
+# serving every other sync view; the viewset route below stays for the OpenAPI schema
+urlpatterns = [
+    path("api/v1/log/status/wait/", async_views.get_log_file_status_wait, name="get_log_file_status_wait"),
+] + urlpatterns
+
+if getattr(settings, "ASYNC_VIEWS", False):
+    # matched first, the viewset routes below stay for the OpenAPI schema
+    urlpatterns = [
+        path("api/v1/scooter/all", async_views.get_scooters_list, name="get_scooters_list"),
+        path("api/v1/scooter/status/count/", async_views.get_scooter_status_count, name="get_scooter_status_count"),
+        path("api/v1/scooter/occupy/", async_views.post_occupy_scooter, name="occupy_scooter"),
+        path("api/v1/scooter/vacant/", async_views.post_vacant_scooter, name="vacant_scooter"),
+        path("api/v1/passenger/scooter/", async_views.get_passenger_scooter, name="get_passenger_scooter"),
+        path("api/v1/scooter/broken/", async_views.scooter_broken, name="scooter_broken"),
+    ] + urlpatterns
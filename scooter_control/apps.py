@@ -1,6 +1,44 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+from django.db.backends.signals import connection_created
+
+
+def enable_wal(sender, connection, **kwargs) -> None:
+    """
+    Let SQLite readers run alongside a writer, worker processes share the fleet journal
+    """
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+
+def check_async_views(app_configs, **kwargs) -> list[checks.CheckMessage]:
+    """
+    Refuse async views with a fleet store doing I/O: database queries, journal writes,
+    restores and snapshots would run on the event loop and stall every request and stream
+    """
+    from .services.fleet_store import FleetStore
+
+    store = getattr(settings, "FLEET_STORE", {}).get("STORE", FleetStore.MEMORY)
+    if getattr(settings, "ASYNC_VIEWS", False) and store != FleetStore.MEMORY:
+        return [
+            checks.Error(
+                f'ASYNC_VIEWS cannot be used with the "{store}" FLEET_STORE',
+                hint='Turn ASYNC_VIEWS off or use the "memory" store.',
+                id="scooter_control.E001",
+            )
+        ]
+    return []
 
 
 class ScooterControlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scooter_control'
+
+    def ready(self) -> None:
+        connection_created.connect(enable_wal)
+        checks.register(check_async_views)
+        if getattr(settings, "SCHEDULER", {}).get("AUTOSTART", False):
+            from .scheduler import get_scheduler
+            get_scheduler()
@@ -0,0 +1,274 @@
+"""
+Async-native handlers of the hot scooter and occupancy lookup endpoints, served on the event loop under ASGI.
+They share services with ScooterViewSet and answer exactly like its actions,
+so they are routed instead of the viewset when the ASYNC_VIEWS setting is on.
+The scooter status event stream is served here only, it needs ASGI. The operation
+long-poll is always routed here, so that a waiting request holds no worker thread.
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Iterable
+from uuid import UUID
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from rest_framework import status
+
+from .serializers import (
+    ScooterSerializer,
+    ScooterIDSerializer,
+    PassengerIDSerializer,
+    ValidationErrorSerializer,
+    OccupyScooterSerializer,
+    PaginationSerializer,
+    ScooterPageSerializer,
+    ScooterStatusCountSerializer,
+    ScooterEventsQuerySerializer,
+    StatusEventSerializer,
+    OperationSerializer,
+    WaitOperationQuerySerializer,
+)
+from .models import ScooterStatus
+from .views import ScooterViewSet
+
+scooter_service = ScooterViewSet.scooter_service
+passenger_service = ScooterViewSet.passenger_service
+ops_service = ScooterViewSet.ops_service
+
+# seconds between comments keeping an idle event stream open through proxies
+EVENTS_KEEPALIVE = 15
+
+
+class ParseError(ValueError):
+    pass
+
+
+def request_data(request: HttpRequest):
+    """
+    Read a JSON or form request body
+    :param request: Request
+    :return: Body data
+    :raises ParseError: Malformed JSON
+    """
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
+    return request.POST
+
+
+def parse_error_response(exc: ParseError) -> JsonResponse:
+    return JsonResponse({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@require_POST
+async def post_occupy_scooter(request: HttpRequest) -> HttpResponse:
+    try:
+        in_occupy = OccupyScooterSerializer(data=request_data(request))
+    except ParseError as exc:
+        return parse_error_response(exc)
+    if not in_occupy.is_valid():
+        return JsonResponse(
+            ValidationErrorSerializer({"errors": in_occupy.errors}).data,
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    if passenger_service.get_passenger(UUID(in_occupy.data["passenger_id"])) is None:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+    scooter_id = UUID(in_occupy.data["scooter_id"])
+    if not scooter_service.occupy_scooter(
+        scooter_id=scooter_id,
+        passenger_id=UUID(in_occupy.data["passenger_id"]),
+    ):
+        return HttpResponse(
+            status=status.HTTP_404_NOT_FOUND
+            if scooter_service.get_scooter(scooter_id) is None else status.HTTP_409_CONFLICT
+        )
+
+    return HttpResponse(status=status.HTTP_200_OK)
+
+
+@require_GET
+async def get_passenger_scooter(request: HttpRequest) -> HttpResponse:
+    query_ser = PassengerIDSerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return JsonResponse(
+            ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    passenger_id = UUID(query_ser.data["passenger_id"])
+    if (scooter := scooter_service.get_passenger_scooter(passenger_id)) is not None:
+        return JsonResponse(ScooterSerializer(scooter).data, status=status.HTTP_200_OK)
+    if passenger_service.get_passenger(passenger_id) is None:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+@require_POST
+async def post_vacant_scooter(request: HttpRequest) -> HttpResponse:
+    try:
+        in_data = ScooterIDSerializer(data=request_data(request))
+    except ParseError as exc:
+        return parse_error_response(exc)
+    if not in_data.is_valid():
+        return JsonResponse(
+            ValidationErrorSerializer({"errors": in_data.errors}).data,
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    if scooter_service.vacant_scooter(UUID(in_data.data["scooter_id"])):
+        return HttpResponse(status=status.HTTP_200_OK)
+
+    return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+
+@require_http_methods(["GET", "POST"])
+async def scooter_broken(request: HttpRequest) -> HttpResponse:
+    if request.method == "POST":
+        return await post_broken_scooter(request)
+    return await get_scooter_broken(request)
+
+
+async def post_broken_scooter(request: HttpRequest) -> HttpResponse:
+    try:
+        query_ser = ScooterIDSerializer(data=request_data(request))
+    except ParseError as exc:
+        return parse_error_response(exc)
+    if not query_ser.is_valid():
+        return JsonResponse(query_ser.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    if scooter_service.break_scooter(UUID(query_ser.data["scooter_id"])):
+        return HttpResponse(status=status.HTTP_200_OK)
+
+    return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+
+async def get_scooter_broken(request: HttpRequest) -> HttpResponse:
+    query_ser = ScooterIDSerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return JsonResponse(query_ser.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    if (scooter := scooter_service.get_scooter(UUID(query_ser.data["scooter_id"]))) is not None:
+        if scooter_service.is_scooter_broken(scooter.id):
+            return JsonResponse(ScooterSerializer(scooter).data, status=status.HTTP_200_OK)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+    return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+
+@require_GET
+async def get_scooters_list(request: HttpRequest) -> HttpResponse:
+    query_ser = PaginationSerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return JsonResponse(query_ser.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    if "cursor" in query_ser.data:
+        page = scooter_service.get_scooter_page(
+            limit=query_ser.data["limit"],
+            cursor=query_ser.data["cursor"],
+        )
+        if page is None:
+            return JsonResponse({"cursor": ["Invalid cursor."]}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        scooters, next_cursor = page
+        return JsonResponse(
+            ScooterPageSerializer({"results": scooters, "next_cursor": next_cursor}).data,
+            status=status.HTTP_200_OK,
+        )
+
+    scooters = scooter_service.get_scooter_list(
+        limit=query_ser.data["limit"],
+        offset=query_ser.data["offset"],
+        status=query_ser.validated_data.get("status"),
+    )
+
+    return JsonResponse(ScooterSerializer(scooters, many=True).data, status=status.HTTP_200_OK, safe=False)
+
+
+@require_GET
+async def get_scooter_events(request: HttpRequest) -> HttpResponse:
+    """
+    Server-Sent Events stream of scooter status changes, filtered by status and scooter ID
+    """
+    if not isinstance(request, ASGIRequest):
+        # a WSGI server would buffer the endless stream
+        return JsonResponse(
+            {"detail": "The event stream is served under ASGI only."},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    query_ser = ScooterEventsQuerySerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return JsonResponse(
+            ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    response = StreamingHttpResponse(
+        event_stream(query_ser.validated_data.get("status"), query_ser.validated_data.get("scooter_id")),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def event_stream(
+    statuses: Iterable[ScooterStatus] | None,
+    scooter_ids: Iterable[UUID] | None,
+) -> AsyncIterator[str]:
+    """
+    Subscribe to status changes and format them as Server-Sent Events until the client disconnects
+    :param statuses: Statuses to receive, None for all
+    :param scooter_ids: Scooters to receive, None for all
+    """
+    # subscribed here to get events on the loop serving the response
+    sub = scooter_service.feed.subscribe(statuses=statuses, scooter_ids=scooter_ids)
+    try:
+        yield "retry: 1000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.get(), EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:  # not the builtin TimeoutError before Python 3.11
+                yield ": keepalive\n\n"
+                continue
+            data = json.dumps(StatusEventSerializer(event._asdict()).data)
+            yield f"id: {event.seq}\nevent: status\ndata: {data}\n\n"
+    finally:
+        sub.close()
+
+
+@require_GET
+async def get_log_file_status_wait(request: HttpRequest) -> HttpResponse:
+    query_ser = WaitOperationQuerySerializer(data=request.GET)
+    if not query_ser.is_valid():
+        return JsonResponse(
+            ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    op_id = query_ser.validated_data["id"]
+    op = await ops_service.wait_operation_async(op_id, query_ser.validated_data["timeout"])
+    if op is None:
+        return HttpResponse(
+            status=status.HTTP_410_GONE if ops_service.is_operation_evicted(op_id) else status.HTTP_404_NOT_FOUND,
+        )
+
+    return JsonResponse(
+        OperationSerializer(ScooterViewSet._log_operation_data(op)).data,
+        status=status.HTTP_200_OK,
+    )
+
+
+@require_GET
+async def get_scooter_status_count(_: HttpRequest) -> HttpResponse:
+    counts = scooter_service.count_scooters_by_status()
+    return JsonResponse(
+        ScooterStatusCountSerializer(
+            {scooter_status.name.lower(): count for scooter_status, count in counts.items()}
+        ).data,
+        status=status.HTTP_200_OK,
+    )
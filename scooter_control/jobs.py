@@ -0,0 +1,20 @@
+"""
+CPU-bound job functions for the process pool executor.
+Only the standard library is imported here to keep worker processes light.
+"""
+import gzip
+import os
+import shutil
+
+
+def gzip_file(path: str) -> str:
+    """
+    Compress a file next to the original, which is kept
+    :param path: File path
+    :return: Compressed file path
+    """
+    target = path + ".gz"
+    with open(path, "rb") as source, gzip.open(target + ".tmp", "wb") as compressed:
+        shutil.copyfileobj(source, compressed)
+    os.replace(target + ".tmp", target)
+    return target
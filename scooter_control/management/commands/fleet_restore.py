@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scooter_control.services import PassengerService, ScooterService
+from scooter_control.services.fleet_store import SnapshotFleetStore, create_fleet_store
+
+
+class Command(BaseCommand):
+    help = "Restore the fleet from the snapshot store the way a restarted worker does and report the time it takes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--snapshot",
+            action="store_true",
+            help="Write a new snapshot afterwards, folding the journals into it. Stop the server first.",
+        )
+
+    def handle(self, *args, **options):
+        store = create_fleet_store()
+        if not isinstance(store, SnapshotFleetStore):
+            raise CommandError('FLEET_STORE["STORE"] is not "snapshot"')
+        store.snapshot_interval = None
+        scooter_service = ScooterService(store=store)
+        passenger_service = PassengerService(store=store)
+
+        # loading leaves the files untouched, restoring may cut a torn journal block
+        stats = store.restore() if options["snapshot"] else store.load()
+        self.stdout.write(
+            f"Restored {len(scooter_service.scooters)} scooters and {len(passenger_service.passengers)} passengers "
+            f"in {stats['seconds']:.3f} s: {stats['snapshot']} entities from the snapshot, "
+            f"{stats['journal']} changes from the journal"
+        )
+
+        if options["snapshot"]:
+            stats = store.snapshot()
+            store.close()
+            self.stdout.write(
+                f"Wrote a snapshot of {stats['entities']} entities, {stats['size']} bytes "
+                f"in {stats['seconds']:.3f} s"
+            )
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+def create_fleet_lock(apps, schema_editor):
+    apps.get_model('scooter_control', 'FleetLock').objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=16)),
+                ('entity_id', models.UUIDField()),
+                ('data', models.JSONField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FleetLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_fleet_lock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scooter_control', '0001_fleet_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationRecord',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('result', models.BinaryField()),
+                ('finished', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PassengerRecord',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=255)),
+                ('surname', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScooterRecord',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField(db_index=True)),
+                ('status', models.CharField(choices=[('BROKEN', 'BROKEN'), ('VACANT', 'VACANT'), ('OCCUPIED', 'OCCUPIED')], db_index=True, max_length=8)),
+                ('passenger_id', models.UUIDField(db_index=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scooter_control', '0002_state_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fleetlock',
+            name='checkpoint',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
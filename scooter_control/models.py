@@ -1,5 +1,6 @@
 from django.db import models
 from enum import Enum
+from typing import NamedTuple
 from uuid import UUID, uuid4
 
 
@@ -10,6 +11,8 @@ class ScooterStatus(Enum):
 
 
 class Passenger:
+    __slots__ = ("name", "surname")
+
     name: str
     surname: str
 
@@ -22,32 +25,156 @@ class Passenger:
 
 
 class Scooter:
+    __slots__ = ("id", "status", "passenger_id")
+
     id: UUID
     status: ScooterStatus
     passenger_id: UUID | None
 
-    def __init__(self) -> None:
-        self.id: UUID = uuid4()
-        self.status: ScooterStatus = ScooterStatus.VACANT
-        self.passenger_id: UUID | None = None
+    def __init__(
+        self,
+        id: UUID | None = None,
+        status: ScooterStatus = ScooterStatus.VACANT,
+        passenger_id: UUID | None = None,
+    ) -> None:
+        self.id: UUID = uuid4() if id is None else id
+        self.status: ScooterStatus = status
+        self.passenger_id: UUID | None = passenger_id
 
     def is_broken(self):
         return self.status == ScooterStatus.BROKEN
 
 
 class Operation:
+    __slots__ = ("id", "done", "result", "key", "failed")
+
     id: UUID
     done: bool
+    # done without a result: the job raised or missed its run time
+    failed: bool
 
-    def __init__(self, id: UUID, done: bool = False, result=None) -> None:
+    def __init__(self, id: UUID, done: bool = False, result=None, key=None, failed: bool = False) -> None:
         self.id = id
         self.done = done
         self.result = result
+        self.key = key
+        self.failed = failed
 
     def __eq__(self, other: "Operation") -> bool:
         return (
             self.id == other.id
             and self.done == other.done
             and self.result == other.result
+            and self.failed == other.failed
         )
 
+
+class ScooterTransition(NamedTuple):
+    scooter_id: UUID
+    status: ScooterStatus
+    # passenger taking an OCCUPIED scooter
+    passenger_id: UUID | None = None
+
+
+class StatusEvent(NamedTuple):
+    # position in the feed, increasing by one with every event
+    seq: int
+    scooter_id: UUID
+    status: ScooterStatus
+    passenger_id: UUID | None
+
+
+class LogPin:
+    """
+    Keeps log segments from being deleted while referenced, a restored copy pins nothing
+    """
+    __slots__ = ("first", "__weakref__")
+
+    first: int
+
+    def __init__(self, first: int) -> None:
+        """
+        :param first: Number of the first pinned segment, later segments are pinned too
+        """
+        self.first = first
+
+    def __reduce__(self):
+        # a pin only holds in the process that made it
+        return type(None), ()
+
+
+class LogSnapshot(NamedTuple):
+    path: str
+    size: int
+    # log segment numbers with their sizes in bytes at the moment of the snapshot
+    segments: tuple[tuple[int, int], ...]
+    # directory of the log the segments belong to, the log of one worker with PER_PROCESS
+    directory: str = ""
+    # keeps the segments of the snapshot while it is referenced, None once restored
+    pin: LogPin | None = None
+
+
+class FleetChange(models.Model):
+    """
+    Append-only journal of fleet state changes shared by worker processes,
+    every row holds the new state of one scooter or passenger
+    """
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=16)
+    entity_id = models.UUIDField()
+    data = models.JSONField()
+
+
+class FleetLock(models.Model):
+    """
+    Single row updated first in every journal write, serializing writers across processes
+    """
+    version = models.BigIntegerField(default=0)
+    # last journal row folded into the record tables, the rows up to it are deleted
+    checkpoint = models.BigIntegerField(default=0)
+
+
+class ScooterRecord(models.Model):
+    """
+    Persisted scooter state, services keep scooters in memory in front of it
+    """
+    STATE_FIELDS = ("status", "passenger_id")
+
+    id = models.UUIDField(primary_key=True)
+    # registration order
+    position = models.BigIntegerField(db_index=True)
+    status = models.CharField(
+        max_length=8,
+        choices=[(status.name, status.name) for status in ScooterStatus],
+        db_index=True,
+    )
+    passenger_id = models.UUIDField(null=True, db_index=True)
+
+    def to_state(self) -> dict:
+        return {"status": self.status, "passenger_id": None if self.passenger_id is None else str(self.passenger_id)}
+
+
+class PassengerRecord(models.Model):
+    """
+    Persisted passenger, services keep passengers in memory in front of it
+    """
+    STATE_FIELDS = ("name", "surname")
+
+    id = models.UUIDField(primary_key=True)
+    # registration order
+    position = models.BigIntegerField(db_index=True)
+    name = models.CharField(max_length=255)
+    surname = models.CharField(max_length=255)
+
+    def to_state(self) -> dict:
+        return {"name": self.name, "surname": self.surname}
+
+
+class OperationRecord(models.Model):
+    """
+    Persisted finished operation, read when the operation is no longer in memory
+    """
+    id = models.UUIDField(primary_key=True)
+    # pickled result, the database is as trusted as the process memory
+    result = models.BinaryField()
+    finished = models.DateTimeField(db_index=True)
@@ -1,5 +1,93 @@
+import multiprocessing
+import os
+import threading
+from typing import Callable
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, JobExecutionEvent
+from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
+from apscheduler.job import Job
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from django.conf import settings
+
+# executor for I/O-bound jobs
+THREAD_POOL = "default"
+# executor for CPU-bound jobs, their functions must be importable by reference and their results picklable
+PROCESS_POOL = "processpool"
+
+EVENT_JOB_DONE = EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+
+
+def create_scheduler() -> BackgroundScheduler:
+    """
+    Create a background scheduler with executors configured by the SCHEDULER setting
+    :return: Scheduler, not started
+    """
+    config = getattr(settings, "SCHEDULER", {})
+    return BackgroundScheduler(
+        executors={
+            THREAD_POOL: ThreadPoolExecutor(config.get("THREAD_POOL_SIZE", 10)),
+            PROCESS_POOL: ProcessPoolExecutor(
+                config.get("PROCESS_POOL_SIZE", 2),
+                pool_kwargs={
+                    "mp_context": multiprocessing.get_context(config.get("PROCESS_START_METHOD", "spawn")),
+                },
+            ),
+        },
+        job_defaults=config.get("JOB_DEFAULTS", {}),
+    )
+
+
+_scheduler: BackgroundScheduler | None = None
+_scheduler_lock = threading.Lock()
+# listeners of every scheduler this process creates
+_listeners: list[tuple[Callable[[JobExecutionEvent], None], int]] = []
+
+
+def get_scheduler() -> BackgroundScheduler:
+    """
+    Get the process scheduler, it is created and started on first use
+    :return: Running scheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                scheduler = create_scheduler()
+                for callback, mask in _listeners:
+                    scheduler.add_listener(callback, mask)
+                scheduler.start()
+                _scheduler = scheduler
+    return _scheduler
+
+
+def add_listener(callback: Callable[[JobExecutionEvent], None], mask: int) -> None:
+    """
+    Listen to job events without starting the scheduler
+    :param callback: Called with every event matching the mask
+    :param mask: Event codes OR-ed together
+    """
+    with _scheduler_lock:
+        _listeners.append((callback, mask))
+        if _scheduler is not None:
+            _scheduler.add_listener(callback, mask)
+
+
+def is_scheduler_running() -> bool:
+    """
+    Check whether the scheduler was started in this process
+    :return: True if started
+    """
+    return _scheduler is not None
+
+
+def _reset_after_fork() -> None:
+    # the scheduler thread and pools of the parent do not exist in a forked worker,
+    # the worker starts its own scheduler on first use
+    global _scheduler, _scheduler_lock
+    _scheduler = None
+    _scheduler_lock = threading.Lock()
+
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+os.register_at_fork(after_in_child=_reset_after_fork)
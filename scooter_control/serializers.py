@@ -1,3 +1,4 @@
+from django.core.validators import RegexValidator
 from rest_framework import serializers
 from rest_enumfield import EnumField
 
@@ -10,9 +11,50 @@ class ScooterSerializer(serializers.Serializer):
     passenger_id = serializers.UUIDField(required=True)
 
 
+class ScooterCountSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1, max_value=10000)
+
+
+class ScooterTransitionSerializer(serializers.Serializer):
+    scooter_id = serializers.UUIDField(required=True)
+    status = EnumField(choices=ScooterStatus, required=True)
+    passenger_id = serializers.UUIDField(required=False, help_text="Required to occupy the scooter")
+
+    def validate(self, attrs):
+        if attrs["status"] == ScooterStatus.OCCUPIED and "passenger_id" not in attrs:
+            raise serializers.ValidationError({"passenger_id": ["This field is required to occupy a scooter."]})
+        return attrs
+
+
+class ScooterBatchSerializer(serializers.Serializer):
+    transitions = ScooterTransitionSerializer(many=True, allow_empty=False, max_length=1000)
+    atomic = serializers.BooleanField(
+        default=False,
+        help_text="Apply nothing unless every transition can be applied",
+    )
+
+
+class ScooterTransitionResultSerializer(serializers.Serializer):
+    scooter_id = serializers.UUIDField()
+    result = serializers.ChoiceField(choices=["applied", "not_found", "conflict", "skipped"])
+
+
+class ScooterBatchResultSerializer(serializers.Serializer):
+    applied = serializers.BooleanField()
+    results = ScooterTransitionResultSerializer(many=True)
+
+
+# the passenger log holds one entry per line with fields separated by ";"
+log_field_validator = RegexValidator(r"[;\r\n]", inverse_match=True, message="Line breaks and ';' are not allowed.")
+
+
 class InPassengerSerializer(serializers.Serializer):
-    name = serializers.CharField(max_length=255)
-    surname = serializers.CharField(max_length=255)
+    name = serializers.CharField(max_length=255, validators=[log_field_validator])
+    surname = serializers.CharField(max_length=255, validators=[log_field_validator])
+
+
+class PassengerBatchSerializer(serializers.Serializer):
+    passengers = InPassengerSerializer(many=True, allow_empty=False, max_length=10000)
 
 
 class PassengerIDSerializer(serializers.Serializer):
@@ -32,6 +74,33 @@ class ScooterStatusSerializer(serializers.Serializer):
     status = EnumField(choices=ScooterStatus, required=True)
 
 
+class ScooterEventsQuerySerializer(serializers.Serializer):
+    status = serializers.ListField(
+        child=EnumField(choices=ScooterStatus),
+        required=False,
+        help_text="Statuses to receive, repeat the parameter for several, all by default",
+    )
+    scooter_id = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        max_length=1000,
+        help_text="Scooters to receive, repeat the parameter for several, all by default",
+    )
+
+
+class StatusEventSerializer(serializers.Serializer):
+    seq = serializers.IntegerField()
+    scooter_id = serializers.UUIDField()
+    status = EnumField(choices=ScooterStatus)
+    passenger_id = serializers.UUIDField(allow_null=True)
+
+
+class ScooterStatusCountSerializer(serializers.Serializer):
+    broken = serializers.IntegerField()
+    vacant = serializers.IntegerField()
+    occupied = serializers.IntegerField()
+
+
 class ValidationErrorSerializer(serializers.Serializer):
     errors = serializers.DictField(
         child=serializers.ListField(
@@ -40,16 +109,113 @@ class ValidationErrorSerializer(serializers.Serializer):
     )
 
 
+class BatchValidationErrorSerializer(serializers.Serializer):
+    errors = serializers.DictField(
+        child=serializers.JSONField(),
+        help_text="Messages by field, a list field holds the errors of its items by position",
+    )
+
+
 class PaginationSerializer(serializers.Serializer):
     limit = serializers.IntegerField(min_value=1, default=10, max_value=50)
     offset = serializers.IntegerField(min_value=0, default=0)
+    cursor = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Opaque cursor from next_cursor, empty to start cursor pagination",
+    )
+
+    status = EnumField(
+        choices=ScooterStatus,
+        required=False,
+        help_text="Only list scooters with this status",
+    )
+
+    def validate(self, attrs):
+        if "cursor" in attrs and "offset" in self.initial_data:
+            raise serializers.ValidationError({"offset": ["Offset cannot be used with cursor."]})
+        if "cursor" in attrs and "status" in attrs:
+            raise serializers.ValidationError({"status": ["Status cannot be used with cursor."]})
+        return attrs
+
+
+class ScooterPageSerializer(serializers.Serializer):
+    results = ScooterSerializer(many=True)
+    next_cursor = serializers.CharField(allow_null=True)
 
 
 class OperationSerializer(serializers.Serializer):
     id = serializers.CharField(required=True, min_length=36, max_length=36)
     done = serializers.BooleanField()
+    failed = serializers.BooleanField(help_text="The operation finished without a result, request it again")
     result = serializers.DictField()
 
 
+class LogExportQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(
+        required=False,
+        help_text="Skip log segments closed before this moment",
+    )
+
+
+class LogEntryQuerySerializer(serializers.Serializer):
+    index = serializers.IntegerField(required=True, min_value=0)
+
+
+class LogEntrySerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    name = serializers.CharField()
+    surname = serializers.CharField()
+
+
+class LogSearchQuerySerializer(serializers.Serializer):
+    surname = serializers.CharField(required=True, max_length=255, help_text="Surname prefix")
+    limit = serializers.IntegerField(min_value=1, default=20, max_value=100)
+
+
+class LogSearchSerializer(serializers.Serializer):
+    total = serializers.IntegerField(help_text="Number of entries in the log")
+    results = LogEntrySerializer(many=True)
+
+
 class GetOperationQuerySerializer(serializers.Serializer):
     id = serializers.UUIDField(required=True)
+
+
+class WaitOperationQuerySerializer(serializers.Serializer):
+    id = serializers.UUIDField(required=True)
+    timeout = serializers.FloatField(
+        min_value=0,
+        # under the 30 seconds a worker may spend on a request by default
+        max_value=25,
+        default=20,
+        help_text="Seconds to hold the request while the operation is pending",
+    )
+
+
+class LogDownloadQuerySerializer(serializers.Serializer):
+    id = serializers.UUIDField(required=True)
+    gzip = serializers.BooleanField(
+        default=False,
+        help_text="Compress the log with gzip, byte ranges are not supported then",
+    )
+
+
+class LogMetricsSerializer(serializers.Serializer):
+    queue_depth = serializers.IntegerField()
+    queue_size = serializers.IntegerField()
+    written = serializers.IntegerField()
+    blocked = serializers.IntegerField()
+    dropped = serializers.IntegerField()
+
+
+class OperationMetricsSerializer(serializers.Serializer):
+    live = serializers.IntegerField()
+    done = serializers.IntegerField()
+    evicted = serializers.IntegerField()
+    coalesced = serializers.IntegerField()
+
+
+class MetricsSerializer(serializers.Serializer):
+    log = LogMetricsSerializer()
+    operations = OperationMetricsSerializer()
@@ -0,0 +1,142 @@
+"""
+Binary format of fleet snapshots and change journals.
+
+Both files start with a header of a magic, the format version and the generation,
+followed by blocks. A block is its payload length and CRC32 followed by entity
+records, a record is a kind code and the fixed layout of the kind. A journal block
+holds the changes of one write, so a block cut short by a crash is dropped whole.
+"""
+import struct
+import zlib
+from typing import BinaryIO, Iterable, Iterator
+from uuid import UUID
+
+from ..models import ScooterStatus
+
+MAGIC = b"FLEET"
+VERSION = 1
+# magic, version, generation
+HEADER = struct.Struct("<5sBQ")
+# payload length, CRC32 of the payload
+BLOCK = struct.Struct("<II")
+# the nil UUID stands for no passenger, uuid4 never generates it
+NO_ID = bytes(16)
+
+# entity state as services record it: kind, entity ID and JSON-serializable data
+Change = tuple[str, UUID, dict]
+
+
+class ScooterCodec:
+    """
+    Scooter ID, status and passenger ID in 33 bytes
+    """
+    code = 1
+    layout = struct.Struct("<16sb16s")
+    names = {status.value: status.name for status in ScooterStatus}
+
+    def encode(self, scooter_id: UUID, data: dict) -> bytes:
+        passenger_id = data["passenger_id"]
+        return self.layout.pack(
+            scooter_id.bytes,
+            ScooterStatus[data["status"]].value,
+            NO_ID if passenger_id is None else UUID(passenger_id).bytes,
+        )
+
+    def decode(self, buf: bytes, offset: int) -> tuple[UUID, dict, int]:
+        scooter_id, status, passenger_id = self.layout.unpack_from(buf, offset)
+        data = {
+            "status": self.names[status],
+            "passenger_id": None if passenger_id == NO_ID else str(UUID(bytes=passenger_id)),
+        }
+        return UUID(bytes=scooter_id), data, offset + self.layout.size
+
+
+class PassengerCodec:
+    """
+    Passenger ID followed by UTF-8 name and surname with their lengths
+    """
+    code = 2
+    layout = struct.Struct("<16sHH")
+
+    def encode(self, passenger_id: UUID, data: dict) -> bytes:
+        name, surname = data["name"].encode(), data["surname"].encode()
+        return self.layout.pack(passenger_id.bytes, len(name), len(surname)) + name + surname
+
+    def decode(self, buf: bytes, offset: int) -> tuple[UUID, dict, int]:
+        passenger_id, name_size, surname_size = self.layout.unpack_from(buf, offset)
+        offset += self.layout.size
+        name = buf[offset:offset + name_size].decode()
+        offset += name_size
+        surname = buf[offset:offset + surname_size].decode()
+        return UUID(bytes=passenger_id), {"name": name, "surname": surname}, offset + surname_size
+
+
+# codec by entity kind
+CODECS = {
+    "scooter": ScooterCodec(),
+    "passenger": PassengerCodec(),
+}
+KINDS = {codec.code: kind for kind, codec in CODECS.items()}
+
+
+class FormatError(ValueError):
+    pass
+
+
+def write_header(file: BinaryIO, generation: int) -> None:
+    file.write(HEADER.pack(MAGIC, VERSION, generation))
+
+
+def encode_block(changes: Iterable[Change]) -> bytes:
+    """
+    Encode entity states as one block
+    :param changes: Entity states
+    :return: Block bytes
+    """
+    payload = b"".join(
+        bytes((CODECS[kind].code,)) + CODECS[kind].encode(entity_id, data)
+        for kind, entity_id, data in changes
+    )
+    return BLOCK.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class BlockReader:
+    """
+    Entity states of a fleet file in file order. Iteration stops at the first incomplete
+    or corrupted block, end is then the size of the valid part of the file.
+    """
+
+    def __init__(self, buf: bytes):
+        self.buf = buf
+        # end of the last complete block
+        self.end = HEADER.size
+
+    def __iter__(self) -> Iterator[Change]:
+        buf = self.buf
+        view = memoryview(buf)
+        offset = HEADER.size
+        while offset + BLOCK.size <= len(buf):
+            size, crc = BLOCK.unpack_from(buf, offset)
+            start, end = offset + BLOCK.size, offset + BLOCK.size + size
+            if end > len(buf) or zlib.crc32(view[start:end]) != crc:
+                return
+            while start < end:
+                kind = KINDS[buf[start]]
+                entity_id, data, start = CODECS[kind].decode(buf, start + 1)
+                yield kind, entity_id, data
+            offset = self.end = end
+
+
+def read_file(buf: bytes) -> tuple[int, BlockReader]:
+    """
+    Read a snapshot or a journal
+    :param buf: File content
+    :return: Generation and the entity states of the file
+    :raises FormatError: Not a fleet file or an unknown version
+    """
+    if len(buf) < HEADER.size:
+        raise FormatError("Truncated header")
+    magic, version, generation = HEADER.unpack_from(buf)
+    if magic != MAGIC or version != VERSION:
+        raise FormatError(f"Not a fleet file of version {VERSION}")
+    return generation, BlockReader(buf)
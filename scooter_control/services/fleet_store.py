@@ -0,0 +1,487 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from typing import BinaryIO, Callable, ContextManager, Iterable, Iterator
+from uuid import UUID, uuid4
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Model
+
+from ..models import FleetChange, FleetLock, PassengerRecord, ScooterRecord
+from ..scheduler import get_scheduler, IntervalTrigger, Job
+from .fleet_file import HEADER, encode_block, read_file, write_header
+
+# replays the new state of an entity
+Replay = Callable[[UUID, dict], None]
+# gets the current state of every entity
+Dump = Callable[[], Iterable[tuple[UUID, dict]]]
+# record model by entity kind
+RECORDS: dict[str, type[Model]] = {
+    "scooter": ScooterRecord,
+    "passenger": PassengerRecord,
+}
+
+
+class FleetStore:
+    """
+    Fleet state storage of the worker process: services keep the state in memory and nothing is shared.
+    Services make changes inside writing(), record the new state of every changed entity
+    and call sync() before reading.
+    """
+    MEMORY = "memory"
+    SHARED = "shared"
+    DATABASE = "database"
+    SNAPSHOT = "snapshot"
+
+    shared = False
+
+    def register(self, kind: str, replay: Replay, dump: Dump | None = None) -> None:
+        """
+        Receive changes of an entity kind made by other processes or stored before a restart
+        :param kind: Entity kind
+        :param replay: Called with the entity ID and its new state
+        :param dump: Gets the state of every entity of the kind, consistent inside writing()
+        """
+
+    def writing(self) -> ContextManager:
+        """
+        Make changes that are recorded all or none, the local state is up to date inside
+        :return: Context manager
+        """
+        return nullcontext()
+
+    def record(self, kind: str, entity_id: UUID, data: dict, created: bool = False) -> None:
+        """
+        Record the new state of an entity, inside writing()
+        :param kind: Entity kind
+        :param entity_id: Entity ID
+        :param data: JSON-serializable state
+        :param created: Whether the entity is new
+        """
+
+    def sync(self, force: bool = False) -> None:
+        """
+        Replay changes made by other processes
+        :param force: Replay even if the last replay was recent
+        """
+
+
+class TransactionalFleetStore(FleetStore, ABC):
+    """
+    Fleet store writing the changes made inside writing() to the database in one transaction.
+    Writes are serialized within the process so the database sees them in the order
+    they were applied in memory.
+    """
+
+    def __init__(self):
+        self._replays: dict[str, Replay] = {}
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+
+    def register(self, kind: str, replay: Replay, dump: Dump | None = None) -> None:
+        self._replays[kind] = replay
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._write_lock:
+            if getattr(self._local, "changes", None) is not None:
+                yield  # nested in an outer write
+                return
+            # the latest state and whether the entity is new by kind and entity ID
+            self._local.changes = {}
+            try:
+                with transaction.atomic():
+                    self._begin()
+                    yield
+                    self._flush(self._local.changes)
+            finally:
+                self._local.changes = None
+
+    def record(self, kind: str, entity_id: UUID, data: dict, created: bool = False) -> None:
+        changes: dict[tuple[str, UUID], tuple[dict, bool]] = self._local.changes
+        _, was_created = changes.get((kind, entity_id), (None, False))
+        changes[(kind, entity_id)] = (data, created or was_created)
+
+    def _begin(self) -> None:
+        """
+        Prepare a write in the open transaction, before services change memory
+        """
+
+    @abstractmethod
+    def _flush(self, changes: dict[tuple[str, UUID], tuple[dict, bool]]) -> None:
+        """
+        Write the recorded changes in the open transaction
+        :param changes: The latest state and whether the entity is new by kind and entity ID
+        """
+
+
+class DatabaseFleetStore(TransactionalFleetStore):
+    """
+    Fleet state persisted in the database, one row per scooter or passenger. Services keep
+    serving from memory as a write-through cache: the rows are loaded once before the first
+    read or write and every change is written before writing() returns.
+    """
+    records = RECORDS
+
+    def __init__(self, batch_size: int = 1000):
+        """
+        :param batch_size: Rows inserted or updated in one query
+        """
+        super().__init__()
+        self.batch_size = batch_size
+        self._positions: dict[str, int] = {}
+        self._load_lock = threading.Lock()
+
+    def sync(self, force: bool = False) -> None:
+        if len(self._positions) == len(self._replays):
+            return
+        with self._load_lock:
+            for kind, replay in self._replays.items():
+                if kind in self._positions:
+                    continue
+                record_model = self.records[kind]
+                rows = record_model.objects.only("id", *record_model.STATE_FIELDS).order_by("position")
+                for row in rows.iterator(chunk_size=2000):
+                    replay(row.id, row.to_state())
+                last = record_model.objects.aggregate(last=Max("position"))["last"]
+                self._positions[kind] = 0 if last is None else last + 1
+
+    def _begin(self) -> None:
+        self.sync()
+
+    def _flush(self, changes: dict[tuple[str, UUID], tuple[dict, bool]]) -> None:
+        for kind, record_model in self.records.items():
+            created, updated = [], []
+            for (change_kind, entity_id), (data, is_created) in changes.items():
+                if change_kind != kind:
+                    continue
+                if is_created:
+                    created.append(record_model(id=entity_id, position=self._positions[kind], **data))
+                    self._positions[kind] += 1
+                else:
+                    updated.append(record_model(id=entity_id, **data))
+            if created:
+                record_model.objects.bulk_create(created, batch_size=self.batch_size)
+            if updated:
+                record_model.objects.bulk_update(updated, record_model.STATE_FIELDS, batch_size=self.batch_size)
+
+
+class SharedFleetStore(TransactionalFleetStore):
+    """
+    Fleet state shared by the worker processes of a host through an append-only change journal
+    in the database. Every process keeps serving reads from its memory and replays the journal
+    at most every sync_interval seconds, writers replay it first under a database-wide lock.
+    Every compact_interval seconds the journal is folded into the record tables and truncated:
+    a starting process, or one that fell behind the fold, loads the records and replays
+    the journal left after them.
+    """
+    shared = True
+
+    def __init__(self, sync_interval: float = 0.05, compact_interval: float | None = 60, batch_size: int = 1000):
+        """
+        :param sync_interval: Seconds reads may lag behind other processes
+        :param compact_interval: Seconds between journal compactions, None to compact by calling compact() only
+        :param batch_size: Record rows written in one query by a compaction
+        """
+        super().__init__()
+        self.sync_interval = sync_interval
+        self.compact_interval = compact_interval
+        self.batch_size = batch_size
+        self._last_id = 0
+        self._synced = float("-inf")
+        self._sync_lock = threading.Lock()
+        self._job: Job | None = None
+
+    def _begin(self) -> None:
+        FleetLock.objects.filter(pk=1).update(version=F("version") + 1)
+        self.sync(force=True)
+
+    def _flush(self, changes: dict[tuple[str, UUID], tuple[dict, bool]]) -> None:
+        journal = FleetChange.objects.bulk_create(
+            FleetChange(kind=kind, entity_id=entity_id, data=data)
+            for (kind, entity_id), (data, _) in changes.items()
+        )
+        # the changes are applied in memory already: skip them in the journal
+        # (a failed commit leaves this process ahead of the journal until restart)
+        if journal:
+            self._last_id = max(self._last_id, journal[-1].id)
+
+    def sync(self, force: bool = False) -> None:
+        if not force and time.monotonic() - self._synced < self.sync_interval:
+            return
+        with self._sync_lock, transaction.atomic():
+            synced = time.monotonic()
+            if self._job is None and self.compact_interval is not None:
+                self._job = get_scheduler().add_job(
+                    self.compact,
+                    trigger=IntervalTrigger(seconds=self.compact_interval),
+                    id=f"fleet-compact:{uuid4()}",
+                )
+            # the records and the journal are read in one transaction to be consistent
+            checkpoint = FleetLock.objects.filter(pk=1).values_list("checkpoint", flat=True).first() or 0
+            if checkpoint > self._last_id:
+                for kind, replay in self._replays.items():
+                    record_model = RECORDS[kind]
+                    rows = record_model.objects.only("id", *record_model.STATE_FIELDS).order_by("position")
+                    for row in rows.iterator(chunk_size=2000):
+                        replay(row.id, row.to_state())
+                self._last_id = checkpoint
+            changes = FleetChange.objects.filter(id__gt=self._last_id).order_by("id")
+            for change in changes.iterator(chunk_size=2000):
+                replay = self._replays.get(change.kind)
+                if replay is not None:
+                    replay(change.entity_id, change.data)
+                self._last_id = change.id
+            self._synced = synced
+
+    def compact(self) -> int:
+        """
+        Fold the journal into the record tables and delete the folded rows. Entities keep
+        the position of their first journal row, so the records list them in registration order.
+        :return: Number of journal rows folded
+        """
+        with transaction.atomic():
+            FleetLock.objects.filter(pk=1).update(version=F("version") + 1)
+            last = FleetChange.objects.aggregate(last=Max("id"))["last"]
+            if last is None:
+                return 0
+            # the position and the latest state by kind and entity ID
+            states: dict[tuple[str, UUID], tuple[int, dict]] = {}
+            count = 0
+            for change in FleetChange.objects.filter(id__lte=last).order_by("id").iterator(chunk_size=2000):
+                position, _ = states.get((change.kind, change.entity_id), (change.id, None))
+                states[(change.kind, change.entity_id)] = (position, change.data)
+                count += 1
+            for kind, record_model in RECORDS.items():
+                record_model.objects.bulk_create(
+                    (
+                        record_model(id=entity_id, position=position, **data)
+                        for (change_kind, entity_id), (position, data) in states.items()
+                        if change_kind == kind
+                    ),
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=["id"],
+                    update_fields=record_model.STATE_FIELDS,
+                )
+            FleetChange.objects.filter(id__lte=last).delete()
+            FleetLock.objects.filter(pk=1).update(checkpoint=last)
+        return count
+
+    def close(self) -> None:
+        """
+        Stop compacting the journal
+        """
+        if self._job is not None:
+            self._job.remove()
+            self._job = None
+
+
+class SnapshotFleetStore(FleetStore):
+    """
+    Fleet state of the worker process kept in files for a warm restart: a binary snapshot
+    of every entity and an append-only journal of the changes made since. Every write
+    appends one journal block, a snapshot is taken every snapshot_interval seconds and
+    starts a new journal. The files are read back once before the first read or write.
+    The directory belongs to one process.
+    """
+    snapshot_file = "fleet.snapshot"
+    journal_prefix = "fleet.journal."
+    # entities per snapshot block
+    block_size = 4096
+
+    def __init__(self, path: str, snapshot_interval: float | None = 300, fsync: bool = False):
+        """
+        :param path: Directory of the snapshot and journal files
+        :param snapshot_interval: Seconds between snapshots, None to take them by calling snapshot() only
+        :param fsync: Flush every journal write to disk, otherwise a crash of the machine may lose
+            the latest writes
+        """
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self._replays: dict[str, Replay] = {}
+        self._dumps: dict[str, Dump] = {}
+        self._write_lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+        self._journal: BinaryIO | None = None
+        self._job: Job | None = None
+        os.makedirs(path, exist_ok=True)
+
+    def register(self, kind: str, replay: Replay, dump: Dump | None = None) -> None:
+        if dump is None:
+            raise ValueError(f"Snapshots of {kind} need a dump")
+        self._replays[kind] = replay
+        self._dumps[kind] = dump
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._write_lock:
+            if getattr(self._local, "changes", None) is not None:
+                yield  # nested in an outer write
+                return
+            self.sync()
+            self._local.changes = []
+            try:
+                yield
+                if self._local.changes:
+                    self._journal.write(encode_block(self._local.changes))
+                    self._journal.flush()
+                    if self.fsync:
+                        os.fsync(self._journal.fileno())
+            finally:
+                self._local.changes = None
+
+    def record(self, kind: str, entity_id: UUID, data: dict, created: bool = False) -> None:
+        self._local.changes.append((kind, entity_id, data))
+
+    def sync(self, force: bool = False) -> None:
+        if self._journal is None:
+            self.restore()
+
+    def load(self) -> dict[str, float | int]:
+        """
+        Replay the snapshot and the journals written after it without changing the files
+        :return: Numbers of entities read from the snapshot and the journals, seconds spent,
+            and the generation of the last journal with the size of its valid part
+        """
+        start = time.perf_counter()
+        stats = {"snapshot": 0, "journal": 0}
+        generation, end = 0, None
+        snapshot_path = os.path.join(self.path, self.snapshot_file)
+        if os.path.exists(snapshot_path):
+            generation, stats["snapshot"], _ = self._replay_file(snapshot_path)
+        for journal_generation in self._journal_generations():
+            if journal_generation < generation:
+                continue
+            generation, end = journal_generation, None
+            journal_path = self._journal_path(journal_generation)
+            if os.path.getsize(journal_path) >= HEADER.size:  # else cut short while created
+                _, count, end = self._replay_file(journal_path)
+                stats["journal"] += count
+        stats["seconds"] = time.perf_counter() - start
+        stats["generation"], stats["end"] = generation, end
+        return stats
+
+    def restore(self) -> dict[str, float | int] | None:
+        """
+        Load the files once and open the journal for writing
+        :return: Load statistics, None if already restored
+        """
+        with self._write_lock:
+            if self._journal is not None:
+                return None
+            stats = self.load()
+            self._generation = stats["generation"]
+            self._journal = self._open_journal(self._generation, stats["end"])
+            if self.snapshot_interval is not None:
+                self._job = get_scheduler().add_job(
+                    self.snapshot,
+                    trigger=IntervalTrigger(seconds=self.snapshot_interval),
+                    id=f"fleet-snapshot:{uuid4()}",
+                )
+        return stats
+
+    def snapshot(self) -> dict[str, float | int]:
+        """
+        Write every entity to a new snapshot and start a new journal, older journals are removed
+        :return: Number of entities written, snapshot size in bytes and seconds spent
+        """
+        start = time.perf_counter()
+        with self._snapshot_lock:
+            with self._write_lock:
+                self.sync()
+                # dumped under the lock to be consistent with the journal switch
+                states = [(kind, list(dump())) for kind, dump in self._dumps.items()]
+                self._generation += 1
+                previous, self._journal = self._journal, self._open_journal(self._generation, None)
+                previous.close()
+
+            tmp_path = os.path.join(self.path, self.snapshot_file + ".tmp")
+            count = 0
+            with open(tmp_path, "wb") as snapshot_file:
+                write_header(snapshot_file, self._generation)
+                for kind, entities in states:
+                    for offset in range(0, len(entities), self.block_size):
+                        snapshot_file.write(encode_block(
+                            (kind, entity_id, data) for entity_id, data in entities[offset:offset + self.block_size]
+                        ))
+                    count += len(entities)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+                size = snapshot_file.tell()
+            os.replace(tmp_path, os.path.join(self.path, self.snapshot_file))
+
+            for generation in self._journal_generations():
+                if generation < self._generation:
+                    os.remove(self._journal_path(generation))
+        return {"entities": count, "size": size, "seconds": time.perf_counter() - start}
+
+    def close(self) -> None:
+        """
+        Stop taking snapshots and close the journal, the next read or write restores the files again
+        """
+        with self._write_lock:
+            if self._job is not None:
+                self._job.remove()
+                self._job = None
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _replay_file(self, path: str) -> tuple[int, int, int]:
+        with open(path, "rb") as fleet_file:
+            generation, changes = read_file(fleet_file.read())
+        count = 0
+        for kind, entity_id, data in changes:
+            replay = self._replays.get(kind)
+            if replay is not None:
+                replay(entity_id, data)
+            count += 1
+        return generation, count, changes.end
+
+    def _open_journal(self, generation: int, end: int | None) -> BinaryIO:
+        path = self._journal_path(generation)
+        if end is None:
+            journal = open(path, "wb")
+            write_header(journal, generation)
+            journal.flush()
+            return journal
+        journal = open(path, "r+b")
+        journal.truncate(end)  # drop a block cut short by a crash
+        journal.seek(end)
+        return journal
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"{self.journal_prefix}{generation:010d}")
+
+    def _journal_generations(self) -> list[int]:
+        return sorted(
+            int(name[len(self.journal_prefix):])
+            for name in os.listdir(self.path)
+            if name.startswith(self.journal_prefix) and name[len(self.journal_prefix):].isdigit()
+        )
+
+
+def create_fleet_store() -> FleetStore:
+    """
+    Create a fleet store configured by the FLEET_STORE setting
+    :return: Fleet store
+    """
+    config = getattr(settings, "FLEET_STORE", {})
+    store = config.get("STORE", FleetStore.MEMORY)
+    options = {key.lower(): value for key, value in config.get("OPTIONS", {}).items()}
+    if store == FleetStore.MEMORY:
+        return FleetStore(**options)
+    if store == FleetStore.SHARED:
+        return SharedFleetStore(**options)
+    if store == FleetStore.DATABASE:
+        return DatabaseFleetStore(**options)
+    if store == FleetStore.SNAPSHOT:
+        return SnapshotFleetStore(**options)
+    raise ValueError(f"Unknown fleet store: {store}")
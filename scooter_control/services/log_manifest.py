@@ -0,0 +1,143 @@
+import json
+import os
+from datetime import datetime, timezone
+
+
+class LogSegment:
+    """
+    Sealed part of the passenger log, a standalone CSV file with a header
+    """
+    __slots__ = ("number", "file", "entries", "size", "opened", "closed", "compressed")
+
+    number: int
+    file: str
+    entries: int
+    size: int
+    opened: datetime
+    closed: datetime
+    compressed: bool
+
+    def __init__(
+        self,
+        number: int,
+        file: str,
+        entries: int,
+        size: int,
+        opened: datetime,
+        closed: datetime,
+        compressed: bool = False,
+    ) -> None:
+        """
+        :param number: Segment number, increasing with every rotation
+        :param file: Segment file name in the log directory
+        :param entries: Number of entries
+        :param size: Uncompressed size in bytes, header included
+        :param opened: When the first entry could be written
+        :param closed: When the segment was sealed
+        :param compressed: Whether the file is gzip compressed
+        """
+        self.number = number
+        self.file = file
+        self.entries = entries
+        self.size = size
+        self.opened = opened
+        self.closed = closed
+        self.compressed = compressed
+
+    def to_dict(self) -> dict:
+        return {
+            "number": self.number,
+            "file": self.file,
+            "entries": self.entries,
+            "size": self.size,
+            "opened": self.opened.isoformat(),
+            "closed": self.closed.isoformat(),
+            "compressed": self.compressed,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogSegment":
+        return cls(
+            number=data["number"],
+            file=data["file"],
+            entries=data["entries"],
+            size=data["size"],
+            opened=datetime.fromisoformat(data["opened"]),
+            closed=datetime.fromisoformat(data["closed"]),
+            compressed=data["compressed"],
+        )
+
+
+class LogManifest:
+    """
+    Index of the sealed log segments and the active segment number, stored as JSON next to the log
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: Manifest file path
+        """
+        self.path = path
+        self.segments: list[LogSegment] = []
+        self.active: int = 1
+        self.active_opened: datetime = datetime.now(timezone.utc)
+
+    @classmethod
+    def load(cls, path: str) -> "LogManifest":
+        """
+        Read a manifest, a missing file gives an empty manifest
+        :param path: Manifest file path
+        :return: Manifest
+        """
+        manifest = cls(path)
+        if not os.path.exists(path):
+            return manifest
+        with open(path, encoding="utf-8") as manifest_file:
+            data = json.load(manifest_file)
+        manifest.segments = [LogSegment.from_dict(segment) for segment in data["segments"]]
+        manifest.active = data["active"]
+        manifest.active_opened = datetime.fromisoformat(data["active_opened"])
+        return manifest
+
+    def save(self) -> None:
+        """
+        Replace the manifest file atomically
+        :return:
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(
+                {
+                    "segments": [segment.to_dict() for segment in self.segments],
+                    "active": self.active,
+                    "active_opened": self.active_opened.isoformat(),
+                },
+                manifest_file,
+                indent=2,
+            )
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def get_segment(self, number: int) -> LogSegment | None:
+        """
+        Get a sealed segment, segments are numbered consecutively
+        :param number: Segment number
+        :return: Segment or None if it is not sealed or not in the manifest
+        """
+        if not self.segments:
+            return None
+        index = number - self.segments[0].number
+        if 0 <= index < len(self.segments):
+            return self.segments[index]
+        return None
+
+    def segments_since(self, since: datetime | None) -> list[LogSegment]:
+        """
+        Get sealed segments that may hold entries written after a moment
+        :param since: Moment, None for all segments
+        :return: Segments in log order
+        """
+        if since is None:
+            return list(self.segments)
+        return [segment for segment in self.segments if segment.closed >= since]
@@ -0,0 +1,37 @@
+import re
+from array import array
+
+from ..models import Passenger
+
+
+def extend_line_starts(buffer, size: int, starts: array) -> None:
+    """
+    Index line start offsets of a log buffer past the last indexed line
+    :param buffer: Memory map or bytes of a log segment
+    :param size: Number of bytes of the buffer holding complete lines
+    :param starts: Offsets of the lines indexed so far, starting with the header at 0
+    :return:
+    """
+    position = starts[-1]
+    while (newline := buffer.find(b"\n", position, size)) != -1 and newline + 1 < size:
+        position = newline + 1
+        starts.append(position)
+
+
+def surname_prefix_pattern(prefix: str) -> re.Pattern[bytes]:
+    """
+    Get a pattern matching log lines of passengers whose surname starts with a prefix
+    :param prefix: Surname prefix
+    :return: Compiled multiline pattern
+    """
+    return re.compile(rb"^[^;\n]*;" + re.escape(prefix.encode()) + rb"[^\n]*$", re.MULTILINE)
+
+
+def parse_entry(line: bytes) -> Passenger:
+    """
+    Parse a log line without the line break
+    :param line: Log line
+    :return: Logged passenger
+    """
+    name, surname = line.decode().split(";", 1)
+    return Passenger(name, surname)
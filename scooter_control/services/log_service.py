@@ -1,20 +1,150 @@
+import atexit
+import fcntl
+import gzip
+import mmap
 import os
+import queue
+import threading
+import weakref
+import zlib
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterable, Iterator
+from uuid import uuid4
 
 from django.conf import settings
-from ..models import Passenger
+from ..jobs import gzip_file
+from ..models import LogPin, LogSnapshot, Passenger
+from ..scheduler import (
+    add_listener,
+    get_scheduler,
+    EVENT_JOB_DONE,
+    EVENT_JOB_EXECUTED,
+    JobExecutionEvent,
+    PROCESS_POOL,
+)
+from .fleet_store import FleetStore
+from .log_manifest import LogManifest, LogSegment
+from .log_reader import extend_line_starts, parse_entry, surname_prefix_pattern
 
 
 class LogService:
-    def __init__(self, log_file_name: str = "passengers.csv", output_log_path: str = settings.STATIC_URL + "log/"):
+    DIRECT = "direct"
+    BUFFERED = "buffered"
+    BACKGROUND = "background"
+
+    BLOCK = "block"
+    DROP = "drop"
+
+    def __init__(
+        self,
+        log_file_name: str = "passengers.csv",
+        output_log_path: str = settings.STATIC_URL + "log/",
+        mode: str = DIRECT,
+        flush_size: int = 100,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+        queue_policy: str = BLOCK,
+        queue_timeout: float = 1.0,
+        max_bytes: int | None = None,
+        rotate_interval: float | None = None,
+        max_segments: int | None = None,
+        compress: bool = False,
+        compress_executor: str = PROCESS_POOL,
+        per_process: bool = False,
+    ):
+        """
+        :param log_file_name: Log file name
+        :param output_log_path: Log directory URL
+        :param mode: DIRECT to write every entry at once, BUFFERED to write entries in batches,
+            BACKGROUND to queue entries for a writer thread
+        :param flush_size: Number of buffered entries that triggers a write, batch size of the writer thread
+        :param flush_interval: Seconds a buffered entry may wait for a write
+        :param queue_size: Capacity of the writer thread queue
+        :param queue_policy: What to do with an entry when the queue is full: BLOCK waits up to
+            queue_timeout seconds and drops the entry after that, DROP drops it at once
+        :param queue_timeout: Seconds to wait for a free queue slot under the BLOCK policy
+        :param max_bytes: Size of the log file that triggers rotation into a numbered segment
+        :param rotate_interval: Seconds after which the log file is rotated into a numbered segment
+        :param max_segments: Number of sealed segments kept, older ones are deleted with their entries
+            once no live snapshot pins them, None to keep every segment
+        :param compress: Whether to gzip rotated segments
+        :param compress_executor: Scheduler executor compressing segments
+        :param per_process: Keep the log in the subdirectory of a worker slot, so that worker
+            processes serving the same directory do not rotate each other's files. A process holds
+            the lowest slot no other live process holds, so a restarted worker continues the log
+            of the worker it replaces. A worker forked from the process that created the service
+            moves to a slot of its own.
+        """
+        if mode not in (self.DIRECT, self.BUFFERED, self.BACKGROUND):
+            raise ValueError(f"Unknown log mode: {mode}")
+        if queue_policy not in (self.BLOCK, self.DROP):
+            raise ValueError(f"Unknown log queue policy: {queue_policy}")
         self.log_file_name = log_file_name
-        self.output_log_path = output_log_path[1:] + (
+        self.base_log_path = output_log_path[1:] + (
             "/" if output_log_path[-1] != "/" else ""  # cut out first '/' to get relative path and set last '/'
         )
-        self.log_file = self.output_log_path + self.log_file_name
+        self.per_process = per_process
+        self._slot_file: BinaryIO | None = None
+        self.mode = mode
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue_policy = queue_policy
+        self.queue_timeout = queue_timeout
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.max_segments = max_segments
+        self.compress = compress
+        self.compress_executor = compress_executor
+
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+
+        self._queue: queue.Queue[str] = queue.Queue(maxsize=queue_size)
+        self._written = 0
+        self._blocked = 0
+        self._dropped = 0
+
+        self._header = (";".join(Passenger.__slots__) + "\n").encode()
+        self._file_lock = threading.Lock()
+        self._active_size = 0
+        self._active_entries = 0
+        # line start offsets by segment number, filled on demand by readers
+        self._line_starts: dict[int, array] = {}
+        self._index_lock = threading.Lock()
+        # pins of the snapshots still referenced
+        self._pins: weakref.WeakSet[LogPin] = weakref.WeakSet()
+        # segments being compressed by job ID
+        self._compressing: dict[str, LogSegment] = {}
+        # rotated segments waiting for the next write to be compressed, so that rotating
+        # on start does not start the scheduler while the service is created
+        self._to_compress: list[LogSegment] = []
+
+        if self.compress:
+            add_listener(self._on_segment_compressed, EVENT_JOB_DONE)
+        self._open_directory()
+
+        if self.mode == self.BACKGROUND:
+            threading.Thread(target=self._drain_queue, name="log-writer", daemon=True).start()
+        if self.mode != self.DIRECT:
+            atexit.register(self.flush)
+        if self.per_process:
+            reset = weakref.WeakMethod(self._reset_after_fork)
+            os.register_at_fork(after_in_child=lambda: reset() and reset()())
 
-        with open(self.log_file, "w") as log_file:
-            a = Passenger("", "")
-            log_file.write(";".join(a.__dict__.keys()) + "\n")
+    @classmethod
+    def from_settings(cls) -> "LogService":
+        """
+        Create a log service configured by the PASSENGER_LOG setting
+        :return: Log service
+        """
+        options = {key.lower(): value for key, value in getattr(settings, "PASSENGER_LOG", {}).items()}
+        # worker processes sharing the fleet would share one log directory otherwise
+        options.setdefault("per_process", getattr(settings, "FLEET_STORE", {}).get("STORE") == FleetStore.SHARED)
+        return cls(**options)
 
     def write_entry(self, name: str, surname: str) -> None:
         """
@@ -23,12 +153,486 @@ class LogService:
         :param surname: Passenger surname
         :return:
         """
-        with open(self.log_file, "a") as log_file:
-            log_file.write(";".join([name, surname]) + "\n")
+        line = ";".join([name, surname]) + "\n"
+        if self.mode == self.DIRECT:
+            self._append([line], sync=False)
+            with self._lock:
+                self.offset += len(line.encode())
+            return
+
+        if self.mode == self.BACKGROUND:
+            if self._enqueue(line):
+                with self._lock:
+                    self.offset += len(line.encode())
+            return
+
+        lines = []
+        with self._lock:
+            self._buffer.append(line)
+            self.offset += len(line.encode())
+            if len(self._buffer) >= self.flush_size:
+                lines = self._take_buffer()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        self._write_taken(lines)
+
+    def write_entries(self, passengers: list[tuple[str, str]]) -> None:
+        """
+        Write many passengers to log file with a single write and sync, whatever the mode
+        :param passengers: Names and surnames
+        :return:
+        """
+        lines = [";".join(passenger) + "\n" for passenger in passengers]
+        size = sum(len(line.encode()) for line in lines)
+        if self.mode == self.BUFFERED:
+            with self._lock:
+                self._buffer.extend(lines)  # written along with the buffered entries
+                self.offset += size
+                lines = self._take_buffer()
+            self._write_taken(lines)
+            return
+
+        self._append(lines)
+        with self._lock:
+            self.offset += size
+
+    def flush(self) -> None:
+        """
+        Write buffered and queued entries to log file and sync it to disk
+        :return:
+        """
+        if self.mode == self.BACKGROUND:
+            self._queue.join()
+            return
+        with self._lock:
+            lines = self._take_buffer()
+        self._write_taken(lines)
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Get writer counters
+        :return: Queue depth and capacity, numbers of written, blocked and dropped entries
+        """
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "written": self._written,
+            "blocked": self._blocked,
+            "dropped": self._dropped,
+        }
+
+    def _enqueue(self, line: str) -> bool:
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            pass
+        if self.queue_policy == self.BLOCK:
+            with self._lock:
+                self._blocked += 1
+            try:
+                self._queue.put(line, timeout=self.queue_timeout)
+                return True
+            except queue.Full:
+                pass
+        with self._lock:
+            self._dropped += 1
+        return False
+
+    def _drain_queue(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            while len(lines) < self.flush_size:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(lines)
+            except OSError:
+                with self._lock:
+                    self._dropped += len(lines)
+            finally:
+                for _ in lines:
+                    self._queue.task_done()
+
+    def _take_buffer(self) -> list[str]:
+        # called under _lock: the file lock is taken before _lock is released, so batches are
+        # written in the order they were taken while other writers keep buffering
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        lines, self._buffer = self._buffer, []
+        if lines:
+            self._file_lock.acquire()
+        return lines
+
+    def _write_taken(self, lines: list[str]) -> None:
+        if not lines:
+            return
+        try:
+            self._write_lines(lines)
+        finally:
+            self._file_lock.release()
+
+    def _append(self, lines: list[str], sync: bool = True) -> None:
+        with self._file_lock:
+            self._write_lines(lines, sync)
+
+    def _write_lines(self, lines: list[str], sync: bool = True) -> None:
+        # called under _file_lock
+        data = "".join(lines).encode()
+        if self._rotation_due(len(data)):
+            self._rotate()
+        if self._to_compress:
+            self._compress_segments()
+        with open(self.log_file, "ab") as log_file:
+            log_file.write(data)
+            if sync:
+                log_file.flush()
+                os.fsync(log_file.fileno())
+        self._active_size += len(data)
+        self._active_entries += len(lines)
+        self._written += len(lines)
+
+    def _claim_slot(self) -> int:
+        # the slot lock lasts as long as the lock file stays open, other processes
+        # holding the file inherited from this one keep their own lock
+        if self._slot_file is not None:
+            self._slot_file.close()
+        os.makedirs(self.base_log_path, exist_ok=True)
+        slot = 0
+        while True:
+            slot_file = open(f"{self.base_log_path}worker-{slot}.lock", "ab")
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot_file.close()
+                slot += 1
+                continue
+            self._slot_file = slot_file
+            return slot
+
+    def _open_directory(self) -> None:
+        self.output_log_path = self.base_log_path + (f"worker-{self._claim_slot()}/" if self.per_process else "")
+        self.log_file = self.output_log_path + self.log_file_name
+        os.makedirs(self.output_log_path, exist_ok=True)
+        self.manifest = LogManifest.load(
+            self.output_log_path + os.path.splitext(self.log_file_name)[0] + ".manifest.json"
+        )
+        self._open_log_file()
+
+        # size in bytes of the whole log with one header once every accepted entry is written,
+        # serves as the log version
+        self.offset = len(self._header) + sum(
+            segment.size - len(self._header) for segment in self.manifest.segments
+        ) + self._active_size - len(self._header)
+
+    def _reset_after_fork(self) -> None:
+        # entries buffered or queued by the parent are written by the parent,
+        # the writer thread and the flush timer of the parent do not exist here
+        self._buffer.clear()
+        self._timer = None
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._line_starts.clear()
+        self._pins = weakref.WeakSet()
+        self._compressing.clear()
+        self._to_compress.clear()
+        self._written = self._blocked = self._dropped = 0
+        self._open_directory()
+        if self.mode == self.BACKGROUND:
+            threading.Thread(target=self._drain_queue, name="log-writer", daemon=True).start()
+
+    def _open_log_file(self) -> None:
+        last = self.manifest.segments[-1] if self.manifest.segments else None
+        if (
+            last is not None
+            and not os.path.exists(self.output_log_path + last.file)
+            and os.path.exists(self.log_file)
+        ):
+            os.replace(self.log_file, self.output_log_path + last.file)  # finish an interrupted rotation
+
+        if not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0:
+            self._write_header()
+            return
+
+        self._active_size = os.path.getsize(self.log_file)
+        with open(self.log_file, "rb") as log_file:
+            lines = sum(chunk.count(b"\n") for chunk in iter(lambda: log_file.read(1 << 20), b""))
+        self._active_entries = max(lines - 1, 0)
+        if self._active_entries:
+            self._rotate()  # keep entries of the previous run as a sealed segment
+
+    def _write_header(self) -> None:
+        with open(self.log_file, "wb") as log_file:
+            log_file.write(self._header)
+        self._active_size = len(self._header)
+        self._active_entries = 0
+
+    def _segment_path(self, segment: LogSegment) -> str:
+        return self.output_log_path + segment.file
+
+    def _rotation_due(self, incoming: int) -> bool:
+        if not self._active_entries:
+            return False
+        if self.max_bytes is not None and self._active_size + incoming > self.max_bytes:
+            return True
+        return (
+            self.rotate_interval is not None
+            and datetime.now(timezone.utc) - self.manifest.active_opened >= timedelta(seconds=self.rotate_interval)
+        )
+
+    def _rotate(self) -> None:
+        now = datetime.now(timezone.utc)
+        name, extension = os.path.splitext(self.log_file_name)
+        segment = LogSegment(
+            number=self.manifest.active,
+            file=f"{name}.{self.manifest.active:06d}{extension}",
+            entries=self._active_entries,
+            size=self._active_size,
+            opened=self.manifest.active_opened,
+            closed=now,
+        )
+        self.manifest.segments.append(segment)
+        self.manifest.active += 1
+        self.manifest.active_opened = now
+        self.manifest.save()  # saved first so that a crash before the rename is recovered on start
+        os.replace(self.log_file, self._segment_path(segment))
+        self._write_header()
+        if self.compress:
+            self._to_compress.append(segment)
+        self._prune_segments()
+
+    def _compress_segments(self) -> None:
+        for segment in self._to_compress:
+            if self.manifest.get_segment(segment.number) is not segment:
+                continue  # pruned
+            job_id = f"compress:{uuid4()}"
+            self._compressing[job_id] = segment
+            get_scheduler().add_job(
+                gzip_file, args=(self._segment_path(segment),), id=job_id, executor=self.compress_executor,
+            )
+        self._to_compress.clear()
+
+    def _prune_segments(self) -> None:
+        if self.max_segments is None or len(self.manifest.segments) <= self.max_segments:
+            return
+        pruned = self.manifest.segments[:len(self.manifest.segments) - self.max_segments]
+        pinned = min((pin.first for pin in self._pins), default=None)
+        if pinned is not None:
+            # kept segments stay contiguous, so only the ones older than every pin go
+            pruned = [segment for segment in pruned if segment.number < pinned]
+        del self.manifest.segments[:len(pruned)]
+        self.manifest.save()  # saved first so that a crash leaves unlisted files, not missing ones
+        with self._index_lock:
+            for segment in pruned:
+                self._line_starts.pop(segment.number, None)
+        for segment in pruned:
+            if os.path.exists(self._segment_path(segment)):
+                os.remove(self._segment_path(segment))
+
+    def _on_segment_compressed(self, event: JobExecutionEvent) -> None:
+        segment = self._compressing.pop(event.job_id, None)
+        if segment is None or event.code != EVENT_JOB_EXECUTED:
+            return  # a failed segment stays uncompressed
+        path = self._segment_path(segment)
+        with self._file_lock:
+            if self.manifest.get_segment(segment.number) is not segment:
+                os.remove(path + ".gz")  # pruned while compressed
+                return
+            segment.file += ".gz"
+            segment.compressed = True
+            self.manifest.save()
+        os.remove(path)
+
+    def _open_segment(self, number: int) -> BinaryIO:
+        with self._file_lock:
+            if number == self.manifest.active:
+                return open(self.log_file, "rb")
+            segment = self.manifest.get_segment(number)
+            if segment is None:
+                raise FileNotFoundError(f"Log segment {number} is not in the manifest")
+            if segment.compressed:
+                return gzip.open(self._segment_path(segment), "rb")
+            return open(self._segment_path(segment), "rb")
 
     def get_log_file_path(self) -> str:
         """
-        Get the log file path
+        Get the log file path, writing buffered entries first
         :return:
         """
+        self.flush()
         return self.log_file
+
+    def export(self, since: datetime | None = None) -> LogSnapshot:
+        """
+        Make every entry accepted so far readable and pin the segments holding them.
+        Only entries still buffered or queued since the previous export are written,
+        segments are append-only and are never rewritten.
+        :param since: Skip sealed segments closed before this moment
+        :return: Snapshot of the log
+        """
+        self.flush()
+        with self._file_lock:
+            segments = [(segment.number, segment.size) for segment in self.manifest.segments_since(since)]
+            segments.append((self.manifest.active, self._active_size))
+            pin = self._pin(segments[0][0])
+        size = len(self._header) + sum(segment_size - len(self._header) for _, segment_size in segments)
+        return LogSnapshot(self.log_file, size, tuple(segments), self.output_log_path, pin)
+
+    def pin_snapshot(self, snapshot: LogSnapshot) -> LogSnapshot | None:
+        """
+        Check that every segment of a snapshot can still be read and pin them for reading
+        :param snapshot: Snapshot returned by export, possibly of another worker or restored
+        :return: Snapshot pinned while referenced, None if it belongs to another log
+            or some of its segments were deleted
+        """
+        if snapshot.directory != self.output_log_path:
+            return None
+        with self._file_lock:
+            for number, _ in snapshot.segments:
+                if number == self.manifest.active:
+                    continue
+                segment = self.manifest.get_segment(number)
+                if segment is None or not os.path.exists(self._segment_path(segment)):
+                    return None
+            if snapshot.pin is not None:
+                return snapshot
+            return snapshot._replace(pin=self._pin(snapshot.segments[0][0]))
+
+    def _pin(self, first: int) -> LogPin:
+        pin = LogPin(first)
+        self._pins.add(pin)
+        return pin
+
+    def read_snapshot(
+        self,
+        snapshot: LogSnapshot,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int = 64 * 1024,
+    ) -> Iterator[bytes]:
+        """
+        Read a byte range of an exported snapshot in chunks
+        :param snapshot: Snapshot returned by export or pin_snapshot
+        :param start: Offset of the first byte in the snapshot
+        :param end: Offset after the last byte, snapshot end by default
+        :param chunk_size: Maximum chunk size in bytes
+        :return: Iterator over chunks
+        """
+        if snapshot.directory != self.output_log_path:
+            raise FileNotFoundError(f"Snapshot of another log: {snapshot.directory}")
+        if end is None:
+            end = snapshot.size
+        position = 0
+        for index, (number, segment_size) in enumerate(snapshot.segments):
+            skip = len(self._header) if index else 0  # one header for the whole snapshot
+            part_start, part_end = position, position + segment_size - skip
+            position = part_end
+            if part_end <= start or part_start >= end:
+                continue
+            with self._open_segment(number) as segment_file:
+                segment_file.seek(max(start, part_start) - part_start + skip)
+                remaining = min(end, part_end) - max(start, part_start)
+                while remaining > 0:
+                    chunk = segment_file.read(min(chunk_size, remaining))
+                    if not chunk:
+                        return
+                    remaining -= len(chunk)
+                    yield chunk
+
+    @staticmethod
+    def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Compress chunks into a gzip stream on the fly
+        :param chunks: Uncompressed chunks
+        :return: Iterator over gzip stream chunks
+        """
+        compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+        for chunk in chunks:
+            if data := compressor.compress(chunk):
+                yield data
+        yield compressor.flush()
+
+    def count_entries(self) -> int:
+        """
+        Count entries written to the log
+        :return: Number of entries in all segments
+        """
+        with self._file_lock:
+            return sum(segment.entries for segment in self.manifest.segments) + self._active_entries
+
+    def get_entry(self, index: int) -> Passenger | None:
+        """
+        Read an entry written to the log
+        :param index: Entry index in the whole log, starting from 0
+        :return: Logged passenger or None if there is no such entry
+        """
+        for number, entries in self._segment_entries():
+            if index < entries:
+                with self._mapped_segment(number) as (buffer, size):
+                    starts = self._index_lines(number, buffer, size)
+                    start = starts[index + 1]  # line 0 is the header
+                    return parse_entry(buffer[start:buffer.find(b"\n", start, size)])
+            index -= entries
+        return None
+
+    def search_surname(self, prefix: str, limit: int = 20) -> list[tuple[int, Passenger]]:
+        """
+        Find entries by surname prefix, scanning memory-mapped segments in log order
+        :param prefix: Surname prefix, case-sensitive
+        :param limit: Maximum number of entries to find
+        :return: Entry indexes with logged passengers
+        """
+        pattern = surname_prefix_pattern(prefix)
+        found: list[tuple[int, Passenger]] = []
+        first_index = 0
+        for number, entries in self._segment_entries():
+            with self._mapped_segment(number) as (buffer, size):
+                starts = None
+                for match in pattern.finditer(buffer, len(self._header), size):
+                    if starts is None:
+                        starts = self._index_lines(number, buffer, size)
+                    index = first_index + bisect_right(starts, match.start()) - 2  # skip the header line
+                    found.append((index, parse_entry(match.group())))
+                    if len(found) >= limit:
+                        return found
+            first_index += entries
+        return found
+
+    def _segment_entries(self) -> list[tuple[int, int]]:
+        with self._file_lock:
+            return [(segment.number, segment.entries) for segment in self.manifest.segments] + [
+                (self.manifest.active, self._active_entries),
+            ]
+
+    @contextmanager
+    def _mapped_segment(self, number: int) -> Iterator[tuple[mmap.mmap | bytes, int]]:
+        """
+        Map a segment into memory, compressed segments are decompressed into a buffer instead
+        :param number: Segment number
+        :return: Context manager giving the buffer and the size of its complete lines
+        """
+        with self._file_lock:
+            if number == self.manifest.active:
+                size = self._active_size
+            else:
+                size = self.manifest.get_segment(number).size
+        segment_file = self._open_segment(number)
+        if isinstance(segment_file, gzip.GzipFile):
+            with segment_file:
+                yield segment_file.read(), size
+            return
+        with segment_file, mmap.mmap(segment_file.fileno(), size, access=mmap.ACCESS_READ) as buffer:
+            yield buffer, size
+
+    def _index_lines(self, number: int, buffer: mmap.mmap | bytes, size: int) -> array:
+        with self._index_lock:
+            starts = self._line_starts.setdefault(number, array("Q", [0]))
+            extend_line_starts(buffer, size, starts)
+            return starts
@@ -1,41 +1,235 @@
+import asyncio
+import pickle
+import threading
+import time
 from uuid import UUID, uuid4
-from typing import Callable
+from typing import Callable, Hashable
 from datetime import datetime
-from ..models import Operation
-from ..scheduler import scheduler, DateTrigger
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from ..models import Operation, OperationRecord
+from ..scheduler import (
+    add_listener,
+    get_scheduler,
+    DateTrigger,
+    EVENT_JOB_DONE,
+    EVENT_JOB_EXECUTED,
+    JobExecutionEvent,
+    THREAD_POOL,
+)
+from .operation_store import OperationStore
 
 
 class OperationService:
 
-    def __init__(self):
-        self.operations: dict[UUID, Operation] = {}
+    def __init__(self, ttl: float | None = None, max_size: int | None = None, persist: bool = False):
+        """
+        :param ttl: Seconds a finished operation is kept since it was last read, None to keep forever
+        :param max_size: Maximum number of finished operations kept, None for no limit
+        :param persist: Write finished operations to the database, to be read back once evicted or after a restart
+        """
+        self.persist = persist
+        self.operations: OperationStore = OperationStore(ttl, max_size, on_evict=self._forget_key)
+        self.keys: dict[Hashable, UUID] = {}
+        self._keys_lock = threading.Lock()
+        self._coalesced = 0
+        # notified whenever an operation finishes
+        self._finished = threading.Condition()
+        # futures of async waiters with their event loops by operation ID, guarded by _finished
+        self._waiters: dict[UUID, list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        add_listener(self._on_job_done, EVENT_JOB_DONE)
+
+    @classmethod
+    def from_settings(cls) -> "OperationService":
+        """
+        Create an operation service configured by the OPERATIONS setting
+        :return: Operation service
+        """
+        return cls(**{key.lower(): value for key, value in getattr(settings, "OPERATIONS", {}).items()})
 
     def execute_operation(
         self,
         func: Callable,
         run_date: datetime | str = None,
         args: list | tuple = (),
+        key: Hashable = None,
+        executor: str = THREAD_POOL,
     ) -> UUID:
-        op_id = uuid4()
-        self.operations[op_id] = Operation(op_id)
+        """
+        Schedule a function call as an operation
+        :param func: Function to call
+        :param run_date: When to call the function, now by default
+        :param args: Function arguments
+        :param executor: Scheduler executor to run the function in, THREAD_POOL for I/O-bound work
+            or PROCESS_POOL for CPU-bound work with a module-level function
+        :param key: Identity of the work: a pending or finished operation with the same key
+            is returned instead of scheduling the work again
+        :return: Operation ID
+        """
+        if key is None:
+            return self._schedule(func, run_date, args, executor)
 
-        def __exec_func() -> None:
-            res = func(*args)
-            self.finish_operation(op_id, res)
+        with self._keys_lock:
+            op = self.operations.get(self.keys.get(key))
+            if op is not None:
+                self._coalesced += 1
+                return op.id
+            op_id = self._schedule(func, run_date, args, executor, key)
+            self.keys[key] = op_id
+            return op_id
 
-        scheduler.add_job(
-            __exec_func,
+    def _schedule(
+        self,
+        func: Callable,
+        run_date: datetime | str | None,
+        args: list | tuple,
+        executor: str,
+        key: Hashable = None,
+    ) -> UUID:
+        op_id = uuid4()
+        self.operations[op_id] = Operation(op_id, key=key)
+        get_scheduler().add_job(
+            func,
+            args=args,
+            id=str(op_id),
+            executor=executor,
             trigger=DateTrigger(datetime.now() if run_date is None else run_date),
         )
         return op_id
 
+    def _on_job_done(self, event: JobExecutionEvent) -> None:
+        try:
+            op_id = UUID(event.job_id)
+        except ValueError:
+            return  # not an operation job
+        op = self.operations.get(op_id)
+        if op is None:
+            return  # an operation of another service
+        if event.code == EVENT_JOB_EXECUTED:
+            self.finish_operation(op_id, event.retval)
+        else:
+            self.fail_operation(op_id)
+
     def finish_operation(self, op_id: UUID, result) -> bool:
         op: Operation = self.operations.get(op_id)
         if op is None:
             return False
         op.result = result
-        op.done = True
+        self._mark_done(op)
+        if self.persist:
+            OperationRecord.objects.create(id=op_id, result=pickle.dumps(result), finished=timezone.now())
+        return True
+
+    def fail_operation(self, op_id: UUID) -> bool:
+        """
+        Finish an operation whose job raised or missed its run time. The operation is kept
+        as failed under the retention rules but not persisted, and its key is released
+        so the next caller schedules the work again.
+        :param op_id: Operation ID
+        :return: Whether the operation was found
+        """
+        op: Operation = self.operations.get(op_id)
+        if op is None:
+            return False
+        op.failed = True
+        with self._keys_lock:
+            self._forget_key(op)
+        self._mark_done(op)
         return True
 
+    def _mark_done(self, op: Operation) -> None:
+        op.done = True
+        self.operations.mark_done(op.id)
+        with self._finished:
+            self._finished.notify_all()
+            waiters = self._waiters.pop(op.id, [])
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:  # the waiter loop is closed
+                pass
+
+    @staticmethod
+    def _wake(future: asyncio.Future) -> None:
+        # runs on the waiter event loop
+        if not future.done():
+            future.set_result(None)
+
     def get_operation(self, op_id: UUID) -> Operation | None:
-        return self.operations.get(op_id)
+        op = self.operations.get(op_id)
+        if op is None and self.persist:
+            record = OperationRecord.objects.filter(pk=op_id).only("result").first()
+            if record is not None:
+                op = Operation(op_id, done=True, result=pickle.loads(record.result))
+                self.operations[op_id] = op
+        return op
+
+    def wait_operation(self, op_id: UUID, timeout: float) -> Operation | None:
+        """
+        Block until an operation finishes
+        :param op_id: Operation ID
+        :param timeout: Seconds to wait at most
+        :return: Operation, still pending if the timeout passed, or None if not found
+        """
+        deadline = time.monotonic() + timeout
+        # may query the database, done is checked again under the condition
+        op = self.get_operation(op_id)
+        with self._finished:
+            while op is not None and not op.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._finished.wait(remaining)
+                op = self.operations.get(op_id)
+            return op
+
+    async def wait_operation_async(self, op_id: UUID, timeout: float) -> Operation | None:
+        """
+        Wait on the running event loop until an operation finishes, without holding a thread
+        :param op_id: Operation ID
+        :param timeout: Seconds to wait at most
+        :return: Operation, still pending if the timeout passed, or None if not found
+        """
+        op = self.operations.get(op_id)
+        if op is None and self.persist:
+            op = await sync_to_async(self.get_operation)(op_id)
+        if op is None:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._finished:
+            if op.done:
+                return op
+            waiter = (loop, future)
+            self._waiters.setdefault(op_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._finished:
+                waiters = self._waiters.get(op_id, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[op_id]
+        return op
+
+    def is_operation_evicted(self, op_id: UUID) -> bool:
+        return self.operations.is_evicted(op_id)
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Get operation counters
+        :return: Numbers of live and finished operations and total number of evicted ones
+        """
+        return {
+            **self.operations.get_metrics(),
+            "coalesced": self._coalesced,
+        }
+
+    def _forget_key(self, op: Operation | None) -> None:
+        if op is not None and op.key is not None and self.keys.get(op.key) == op.id:
+            del self.keys[op.key]
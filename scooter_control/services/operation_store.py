@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Iterator
+from uuid import UUID
+
+from ..models import Operation
+
+
+class OperationStore(MutableMapping):
+    """
+    Operations by ID. Pending operations are kept until they finish, finished ones are kept
+    in least recently used order and evicted once idle for ttl seconds or when there are
+    more than max_size of them. IDs of recently evicted operations are remembered.
+    """
+    evicted_ids_size = 10000
+
+    def __init__(
+        self,
+        ttl: float | None = None,
+        max_size: int | None = None,
+        on_evict: Callable[[Operation], None] | None = None,
+    ):
+        """
+        :param ttl: Seconds a finished operation is kept since it was last read, None to keep forever
+        :param max_size: Maximum number of finished operations kept, None for no limit
+        :param on_evict: Called with every evicted operation
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self._pending: dict[UUID, Operation] = {}
+        self._done: OrderedDict[UUID, tuple[float, Operation]] = OrderedDict()
+        self._evicted_ids: OrderedDict[UUID, None] = OrderedDict()
+        self._evicted = 0
+        self._lock = threading.RLock()
+
+    def __getitem__(self, op_id: UUID) -> Operation:
+        with self._lock:
+            self._prune()
+            if op_id in self._pending:
+                return self._pending[op_id]
+            _, op = self._done[op_id]
+            self._done[op_id] = (time.monotonic(), op)
+            self._done.move_to_end(op_id)
+            return op
+
+    def __setitem__(self, op_id: UUID, op: Operation) -> None:
+        with self._lock:
+            self._pending.pop(op_id, None)
+            self._done.pop(op_id, None)
+            if op.done:
+                self._done[op_id] = (time.monotonic(), op)
+            else:
+                self._pending[op_id] = op
+            self._prune()
+
+    def __delitem__(self, op_id: UUID) -> None:
+        with self._lock:
+            if self._pending.pop(op_id, None) is None:
+                del self._done[op_id]
+
+    def __contains__(self, op_id) -> bool:
+        with self._lock:
+            self._prune()
+            return op_id in self._pending or op_id in self._done
+
+    def __iter__(self) -> Iterator[UUID]:
+        with self._lock:
+            return iter(list(self._pending) + list(self._done))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._done)
+
+    def mark_done(self, op_id: UUID) -> None:
+        """
+        Move a finished operation under the retention rules
+        :param op_id: Operation ID
+        """
+        with self._lock:
+            op = self._pending.get(op_id)
+            if op is not None:
+                self[op_id] = op
+
+    def is_evicted(self, op_id: UUID) -> bool:
+        """
+        Check whether an operation was evicted recently
+        :param op_id: Operation ID
+        :return: True if the operation was evicted
+        """
+        with self._lock:
+            self._prune()
+            return op_id in self._evicted_ids
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Get store counters
+        :return: Numbers of pending and finished operations and total number of evictions
+        """
+        with self._lock:
+            self._prune()
+            return {
+                "live": len(self._pending),
+                "done": len(self._done),
+                "evicted": self._evicted,
+            }
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        while self._done:
+            op_id, (accessed, _) = next(iter(self._done.items()))
+            if self.ttl is not None and now - accessed >= self.ttl:
+                self._evict(op_id)
+            elif self.max_size is not None and len(self._done) > self.max_size:
+                self._evict(op_id)
+            else:
+                break
+
+    def _evict(self, op_id: UUID) -> None:
+        _, op = self._done.pop(op_id)
+        self._evicted += 1
+        self._evicted_ids[op_id] = None
+        while len(self._evicted_ids) > self.evicted_ids_size:
+            self._evicted_ids.popitem(last=False)
+        if self.on_evict is not None:
+            self.on_evict(op)
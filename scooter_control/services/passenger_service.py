@@ -1,10 +1,19 @@
 from uuid import UUID, uuid4
 from ..models import Passenger
+from .fleet_store import FleetStore
 
 
 class PassengerService:
-    def __init__(self):
+    # fleet store entity kind
+    KIND = "passenger"
+
+    def __init__(self, store: FleetStore | None = None):
+        """
+        :param store: Fleet store sharing passengers with other processes, the process memory only by default
+        """
         self.passengers: dict[UUID: Passenger] = dict()
+        self.store: FleetStore = FleetStore() if store is None else store
+        self.store.register(self.KIND, self._replay, self._dump)
 
     def add_passenger(self, name: str, surname: str) -> UUID:
         """
@@ -14,15 +23,43 @@ class PassengerService:
         :return: Created Passenger ID
         """
         passenger_id = uuid4()
-        self.passengers[passenger_id] = Passenger(name, surname)
+        with self.store.writing():
+            self.store.record(self.KIND, passenger_id, {"name": name, "surname": surname}, created=True)
+            self.passengers[passenger_id] = Passenger(name, surname)
         return passenger_id
 
+    def add_passengers(self, passengers: list[tuple[str, str]]) -> list[UUID]:
+        """
+        Register a batch of new passengers
+        :param passengers: Names and surnames
+        :return: Created Passenger IDs in the same order
+        """
+        passenger_ids = [uuid4() for _ in passengers]
+        with self.store.writing():
+            for passenger_id, (name, surname) in zip(passenger_ids, passengers):
+                self.store.record(self.KIND, passenger_id, {"name": name, "surname": surname}, created=True)
+            self.passengers.update(
+                (passenger_id, Passenger(name, surname))
+                for passenger_id, (name, surname) in zip(passenger_ids, passengers)
+            )
+        return passenger_ids
+
     def get_passenger(self, passenger_id: UUID) -> Passenger | None:
         """
         Get a passenger
         :param passenger_id: Passenger ID
         :return: Passenger object or None if no passenger is found
         """
-        if passenger_id in self.passengers:
-            return self.passengers[passenger_id]
-        return None
+        self.store.sync()
+        if passenger_id not in self.passengers and self.store.shared:
+            self.store.sync(force=True)  # the passenger may be added by another process
+        return self.passengers.get(passenger_id)
+
+    def _replay(self, passenger_id: UUID, data: dict) -> None:
+        self.passengers[passenger_id] = Passenger(data["name"], data["surname"])
+
+    def _dump(self) -> list[tuple[UUID, dict]]:
+        return [
+            (passenger_id, {"name": passenger.name, "surname": passenger.surname})
+            for passenger_id, passenger in self.passengers.items()
+        ]
@@ -0,0 +1,152 @@
+import binascii
+import threading
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from itertools import islice
+from uuid import UUID
+from ..models import Scooter, ScooterStatus
+
+
+class ScooterRegistry(dict):
+    """
+    Scooters by ID with an insertion-ordered ID index, per-status ID indexes
+    and a passenger ID index. The registry is append-only: scooters are never
+    removed from the fleet. Status and passenger changes of registered scooters
+    must go through set_status and set_passenger.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.order: list[UUID] = []
+        # dicts with None values serve as insertion-ordered sets
+        self.by_status: dict[ScooterStatus, dict[UUID, None]] = {s: {} for s in ScooterStatus}
+        # held while a status index changes or is paged, iterating a changing dict raises
+        self._status_lock = threading.Lock()
+        # ID of the scooter that took a passenger last, while it still holds the passenger
+        self.by_passenger: dict[UUID, UUID] = {}
+
+    def __setitem__(self, scooter_id: UUID, scooter: Scooter) -> None:
+        old = self.get(scooter_id)
+        if old is None:
+            self.order.append(scooter_id)
+        else:
+            self._unlink_passenger(old)
+        super().__setitem__(scooter_id, scooter)
+        with self._status_lock:
+            if old is not None:
+                self.by_status[old.status].pop(scooter_id, None)
+            self.by_status[scooter.status][scooter_id] = None
+        if scooter.passenger_id is not None:
+            self.by_passenger[scooter.passenger_id] = scooter_id
+
+    def update(self, *args, **kwargs) -> None:
+        for scooter_id, scooter in dict(*args, **kwargs).items():
+            self[scooter_id] = scooter
+
+    def extend(self, scooters: list[Scooter]) -> None:
+        """
+        Register new scooters at once, none of them may be registered yet
+        :param scooters: Scooters in insertion order
+        """
+        ids = [scooter.id for scooter in scooters]
+        super().update(zip(ids, scooters))
+        self.order.extend(ids)
+        with self._status_lock:
+            for scooter in scooters:
+                self.by_status[scooter.status][scooter.id] = None
+        for scooter in scooters:
+            if scooter.passenger_id is not None:
+                self.by_passenger[scooter.passenger_id] = scooter.id
+
+    def page(self, limit: int, offset: int) -> list[Scooter]:
+        """
+        Get scooters in insertion order, touching only the requested page
+        :param limit: Page size
+        :param offset: Index of the first scooter in the page
+        :return: List of at most limit scooters
+        """
+        return [self[scooter_id] for scooter_id in self.order[offset:offset + limit]]
+
+    def set_status(self, scooter: Scooter, status: ScooterStatus) -> None:
+        """
+        Change a registered scooter status keeping the status index up to date
+        :param scooter: Registered scooter
+        :param status: New status
+        """
+        if scooter.status != status:
+            with self._status_lock:
+                self.by_status[scooter.status].pop(scooter.id, None)
+                self.by_status[status][scooter.id] = None
+            scooter.status = status
+
+    def set_passenger(self, scooter: Scooter, passenger_id: UUID | None) -> None:
+        """
+        Change a registered scooter passenger keeping the passenger index up to date
+        :param scooter: Registered scooter
+        :param passenger_id: New passenger ID, None for no passenger
+        """
+        if scooter.passenger_id != passenger_id:
+            self._unlink_passenger(scooter)
+            if passenger_id is not None:
+                self.by_passenger[passenger_id] = scooter.id
+            scooter.passenger_id = passenger_id
+
+    def riding(self, passenger_id: UUID | None) -> Scooter | None:
+        """
+        Get the scooter a passenger occupies
+        :param passenger_id: Passenger ID
+        :return: Occupied scooter or None if the passenger rides none
+        """
+        scooter_id = self.by_passenger.get(passenger_id)
+        if scooter_id is None:
+            return None
+        scooter = self[scooter_id]
+        return scooter if scooter.status == ScooterStatus.OCCUPIED else None
+
+    def _unlink_passenger(self, scooter: Scooter) -> None:
+        if scooter.passenger_id is not None and self.by_passenger.get(scooter.passenger_id) == scooter.id:
+            del self.by_passenger[scooter.passenger_id]
+
+    def status_page(self, status: ScooterStatus, limit: int, offset: int) -> list[Scooter]:
+        """
+        Get scooters with a status in the order they got it. The index is walked up to
+        the page under a lock, so deep pages cost O(offset + limit).
+        :param status: Scooter status
+        :param limit: Page size
+        :param offset: Index of the first scooter in the page
+        :return: List of at most limit scooters
+        """
+        with self._status_lock:
+            ids = list(islice(self.by_status[status], offset, offset + limit))
+        return [self[scooter_id] for scooter_id in ids]
+
+    def status_counts(self) -> dict[ScooterStatus, int]:
+        """
+        Count scooters by status
+        :return: Number of scooters for every status
+        """
+        return {status: len(ids) for status, ids in self.by_status.items()}
+
+    def cursor(self, position: int) -> str:
+        """
+        Get an opaque cursor pointing after a scooter
+        :param position: Index of the scooter in insertion order
+        :return: Cursor string
+        """
+        return urlsafe_b64encode(position.to_bytes(8, "big") + self.order[position].bytes).decode()
+
+    def resume_position(self, cursor: str) -> int | None:
+        """
+        Get the index to resume from after the scooter a cursor points to
+        :param cursor: Cursor string
+        :return: Index of the next scooter or None if the cursor is invalid
+        """
+        try:
+            raw = urlsafe_b64decode(cursor.encode())
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) != 24:
+            return None
+        position = int.from_bytes(raw[:8], "big")
+        if position >= len(self.order) or self.order[position].bytes != raw[8:]:
+            return None
+        return position + 1
@@ -1,58 +1,270 @@
+import threading
+from contextlib import AbstractContextManager, ExitStack, nullcontext
+from typing import Iterable
 from uuid import UUID
-from ..models import Scooter, ScooterStatus
+from ..models import Scooter, ScooterStatus, ScooterTransition
+from .fleet_store import FleetStore
+from .scooter_registry import ScooterRegistry
+from .status_feed import StatusFeed
 
 
 class ScooterService:
-    def __init__(self):
-        self.scooters: dict[UUID: Scooter] = dict()
+    # transition results
+    APPLIED = "applied"
+    NOT_FOUND = "not_found"
+    CONFLICT = "conflict"
+    SKIPPED = "skipped"
+
+    # fleet store entity kind
+    KIND = "scooter"
+
+    def __init__(self, lock_stripes: int = 64, store: FleetStore | None = None):
+        """
+        :param lock_stripes: Number of locks guarding scooter status changes, a scooter maps to one of them,
+            and as many guarding the scooters of passengers
+        :param store: Fleet store sharing scooters with other processes, the process memory only by default
+        """
+        self.scooters: ScooterRegistry = ScooterRegistry()
+        self.feed: StatusFeed = StatusFeed()
+        self.store: FleetStore = FleetStore() if store is None else store
+        self.store.register(self.KIND, self._replay, self._dump)
+        # scooter locks are taken before passenger locks, each kind in stripe order
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._passenger_locks = [threading.Lock() for _ in range(lock_stripes)]
 
     def add_scooter(self) -> Scooter:
         s = Scooter()
-        self.scooters[s.id] = s
+        with self.store.writing():
+            self._record(s.id, s.status, s.passenger_id, created=True)
+            self.scooters[s.id] = s
         return s
 
+    def add_scooters(self, count: int) -> list[Scooter]:
+        """
+        Register a batch of new scooters
+        :param count: Number of scooters
+        :return: Created scooters in registration order
+        """
+        scooters = [Scooter() for _ in range(count)]
+        with self.store.writing():
+            for s in scooters:
+                self._record(s.id, s.status, s.passenger_id, created=True)
+            self.scooters.extend(scooters)
+        return scooters
+
     def get_scooter(self, scooter_id: UUID) -> Scooter | None:
-        return self.scooters.get(scooter_id)
+        return self._find(scooter_id)
 
     def occupy_scooter(self, scooter_id: UUID, passenger_id: UUID) -> bool:
-        if scooter_id in self.scooters:
-            s: Scooter = self.scooters[scooter_id]
-            s.status = ScooterStatus.OCCUPIED
-            s.passenger_id = passenger_id
-            return True
-        return False
+        """
+        Occupy a scooter if it is vacant and the passenger rides no other scooter, atomically
+        :param scooter_id: Scooter ID
+        :param passenger_id: Passenger taking the scooter
+        :return: False if the scooter is not found or not vacant or the passenger rides another scooter
+        """
+        return self._apply(ScooterTransition(scooter_id, ScooterStatus.OCCUPIED, passenger_id)) == self.APPLIED
 
     def vacant_scooter(self, scooter_id: UUID) -> bool:
-        if scooter_id in self.scooters:
-            s: Scooter = self.scooters[scooter_id]
-            s.status = ScooterStatus.VACANT
-            s.passenger_id = None
-            return True
-        return False
+        return self._apply(ScooterTransition(scooter_id, ScooterStatus.VACANT)) == self.APPLIED
 
     def break_scooter(self, scooter_id: UUID) -> bool:
-        if scooter_id in self.scooters:
-            s: Scooter = self.scooters[scooter_id]
-            s.status = ScooterStatus.BROKEN
-            return True
-        return False
-
-    def get_scooter_list(self, limit: int = None, offset: int = None) -> list[Scooter]:
-        scooters_list: list[Scooter] = list(self.scooters.values())
-        out_scooters: list[Scooter] = []
+        return self._apply(ScooterTransition(scooter_id, ScooterStatus.BROKEN)) == self.APPLIED
+
+    def apply_transitions(self, transitions: list[ScooterTransition], atomic: bool = False) -> list[str]:
+        """
+        Change statuses of many scooters in one pass
+        :param transitions: Status changes, applied in order
+        :param atomic: Apply nothing unless every transition can be applied
+        :return: APPLIED, NOT_FOUND, CONFLICT (occupying a scooter that is not vacant or by a passenger
+            riding another scooter) or SKIPPED (not applied because of another transition) for every transition
+        """
+        if not atomic:
+            with self.store.writing():
+                return [self._apply(transition) for transition in transitions]
+
+        with ExitStack() as stack:
+            stack.enter_context(self.store.writing())
+            scooters = [self.scooters.get(transition.scooter_id) for transition in transitions]
+            stripes = sorted({self._stripe(s.id) for s in scooters if s is not None})  # in order to avoid deadlocks
+            for stripe in stripes:
+                stack.enter_context(self._locks[stripe])
+            statuses = {s.id: s.status for s in scooters if s is not None}
+            # passenger of every scooter and the scooter every passenger rides, as transitions apply
+            riders = {s.id: s.passenger_id for s in scooters if s is not None}
+            passenger_ids = {t.passenger_id for t in transitions if t.passenger_id is not None}
+            passenger_ids.update(p for p in riders.values() if p is not None)
+            self._lock_passengers(stack, passenger_ids)
+            riding = {p: s.id for p in passenger_ids if (s := self.scooters.riding(p)) is not None}
+            results = []
+            for transition, s in zip(transitions, scooters):
+                result = self._check(
+                    s,
+                    transition,
+                    statuses.get(transition.scooter_id),
+                    transition.passenger_id in riding,
+                )
+                if result == self.APPLIED:
+                    if riding.get(riders[s.id]) == s.id:
+                        del riding[riders[s.id]]
+                    statuses[s.id] = transition.status
+                    if transition.status == ScooterStatus.OCCUPIED:
+                        riders[s.id] = transition.passenger_id
+                        riding[transition.passenger_id] = s.id
+                    elif transition.status == ScooterStatus.VACANT:
+                        riders[s.id] = None
+                results.append(result)
+            if any(result != self.APPLIED for result in results):
+                return [self.SKIPPED if result == self.APPLIED else result for result in results]
+            for transition, s in zip(transitions, scooters):
+                self._set_status(s, transition)
+        return results
+
+    def _stripe(self, entity_id: UUID) -> int:
+        return entity_id.int % len(self._locks)
+
+    def _passenger_lock(self, passenger_id: UUID | None) -> AbstractContextManager:
+        if passenger_id is None:
+            return nullcontext()
+        return self._passenger_locks[self._stripe(passenger_id)]
+
+    def _lock_passengers(self, stack: ExitStack, passenger_ids: Iterable[UUID | None]) -> None:
+        for stripe in sorted({self._stripe(p) for p in passenger_ids if p is not None}):
+            stack.enter_context(self._passenger_locks[stripe])
+
+    def _find(self, scooter_id: UUID) -> Scooter | None:
+        self.store.sync()
+        s = self.scooters.get(scooter_id)
+        if s is None and self.store.shared:
+            self.store.sync(force=True)  # the scooter may be added by another process
+            s = self.scooters.get(scooter_id)
+        return s
+
+    def _apply(self, transition: ScooterTransition) -> str:
+        with self.store.writing():
+            s = self.scooters.get(transition.scooter_id)
+            if s is None:
+                return self.NOT_FOUND
+            with self._locks[self._stripe(s.id)]:
+                # a vacant scooter has no passenger, so occupying touches the index of the new passenger only
+                occupy = transition.status == ScooterStatus.OCCUPIED
+                with self._passenger_lock(transition.passenger_id if occupy else s.passenger_id):
+                    riding = occupy and self.scooters.riding(transition.passenger_id) is not None
+                    result = self._check(s, transition, s.status, riding)
+                    if result == self.APPLIED:
+                        self._set_status(s, transition)
+        return result
+
+    def _check(
+        self,
+        s: Scooter | None,
+        transition: ScooterTransition,
+        status: ScooterStatus | None,
+        riding: bool,
+    ) -> str:
+        if s is None:
+            return self.NOT_FOUND
+        if transition.status == ScooterStatus.OCCUPIED and (status != ScooterStatus.VACANT or riding):
+            return self.CONFLICT
+        return self.APPLIED
+
+    def _set_status(self, s: Scooter, transition: ScooterTransition) -> None:
+        # the scooter lock and the locks of its old and new passengers are held
+        passenger_id = s.passenger_id
+        if transition.status == ScooterStatus.OCCUPIED:
+            passenger_id = transition.passenger_id
+        elif transition.status == ScooterStatus.VACANT:
+            passenger_id = None
+        self._record(s.id, transition.status, passenger_id)
+        self._update(s, transition.status, passenger_id)
+
+    def _update(self, s: Scooter, status: ScooterStatus, passenger_id: UUID | None) -> None:
+        # the scooter lock and the locks of its old and new passengers are held
+        self.scooters.set_status(s, status)
+        self.scooters.set_passenger(s, passenger_id)
+        self.feed.publish(s)
+
+    def _record(
+        self,
+        scooter_id: UUID,
+        status: ScooterStatus,
+        passenger_id: UUID | None,
+        created: bool = False,
+    ) -> None:
+        self.store.record(self.KIND, scooter_id, self._state(status, passenger_id), created=created)
+
+    @staticmethod
+    def _state(status: ScooterStatus, passenger_id: UUID | None) -> dict:
+        return {"status": status.name, "passenger_id": None if passenger_id is None else str(passenger_id)}
+
+    def _dump(self) -> list[tuple[UUID, dict]]:
+        return [(s.id, self._state(s.status, s.passenger_id)) for s in self.scooters.page(len(self.scooters), 0)]
+
+    def _replay(self, scooter_id: UUID, data: dict) -> None:
+        status = ScooterStatus[data["status"]]
+        passenger_id = None if data["passenger_id"] is None else UUID(data["passenger_id"])
+        s = self.scooters.get(scooter_id)
+        if s is None:
+            with self._passenger_lock(passenger_id):
+                self.scooters[scooter_id] = Scooter(scooter_id, status, passenger_id)
+            return
+        with self._locks[self._stripe(s.id)], ExitStack() as stack:
+            self._lock_passengers(stack, (s.passenger_id, passenger_id))
+            self._update(s, status, passenger_id)
+
+    def get_scooter_list(
+        self,
+        limit: int = None,
+        offset: int = None,
+        status: ScooterStatus | None = None,
+    ) -> list[Scooter]:
         if limit is None:
             limit = 10
         if offset is None:
             offset = 0
-        try:
-            for i in range(offset, offset + limit):
-                out_scooters.append(scooters_list[i])
-        except IndexError:
-            return out_scooters
-        return out_scooters
+        self.store.sync()
+        if status is not None:
+            return self.scooters.status_page(status, limit, offset)
+        return self.scooters.page(limit, offset)
+
+    def get_scooter_page(self, limit: int = None, cursor: str = None) -> tuple[list[Scooter], str | None] | None:
+        """
+        Get a page of scooters following a cursor
+        :param limit: Page size
+        :param cursor: Cursor of the previous page, empty for the first page
+        :return: Scooters and the next page cursor (None on the last page) or None if the cursor is invalid
+        """
+        if limit is None:
+            limit = 10
+        self.store.sync()
+        start = 0
+        if cursor:
+            start = self.scooters.resume_position(cursor)
+            if start is None:
+                return None
+        scooters = self.scooters.page(limit, start)
+        end = start + len(scooters)
+        if not scooters or end >= len(self.scooters.order):
+            return scooters, None
+        return scooters, self.scooters.cursor(end - 1)
+
+    def count_scooters_by_status(self) -> dict[ScooterStatus, int]:
+        """
+        Count scooters in every status
+        :return: Number of scooters by status
+        """
+        self.store.sync()
+        return self.scooters.status_counts()
+
+    def get_passenger_scooter(self, passenger_id: UUID) -> Scooter | None:
+        """
+        Get the scooter a passenger occupies
+        :param passenger_id: Passenger ID
+        :return: Occupied scooter or None if the passenger rides none
+        """
+        self.store.sync()
+        return self.scooters.riding(passenger_id)
 
     def is_scooter_broken(self, scooter_id: UUID) -> bool | None:
-        if scooter_id in self.scooters:
-            s: Scooter = self.scooters[scooter_id]
+        if (s := self._find(scooter_id)) is not None:
             return s.status == ScooterStatus.BROKEN
         return None
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from typing import Iterable
+from uuid import UUID
+
+from ..models import Scooter, ScooterStatus, StatusEvent
+
+
+class Subscription:
+    """
+    Status events matching a filter, delivered to the event loop that subscribed
+    """
+
+    def __init__(
+        self,
+        feed: "StatusFeed",
+        loop: asyncio.AbstractEventLoop,
+        queue_size: int,
+        statuses: frozenset[ScooterStatus] | None = None,
+        scooter_ids: frozenset[UUID] | None = None,
+    ):
+        """
+        :param feed: Feed publishing the events
+        :param loop: Event loop of the subscriber
+        :param queue_size: Maximum number of undelivered events, newer events are dropped
+        :param statuses: Statuses to receive, None for all
+        :param scooter_ids: Scooters to receive, None for all
+        """
+        self.feed = feed
+        self.loop = loop
+        self.statuses = statuses
+        self.scooter_ids = scooter_ids
+        self.queue: asyncio.Queue[StatusEvent] = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def matches(self, event: StatusEvent) -> bool:
+        return (
+            (self.statuses is None or event.status in self.statuses)
+            and (self.scooter_ids is None or event.scooter_id in self.scooter_ids)
+        )
+
+    async def get(self) -> StatusEvent:
+        """
+        Wait for the next event
+        :return: Event
+        """
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.feed.unsubscribe(self)
+
+    def _deliver(self, event: StatusEvent) -> None:
+        # runs on the subscriber event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.feed.dropped += 1
+
+
+class StatusFeed:
+    """
+    Publishes scooter status changes to subscribers, publishing is cheap while nobody listens
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        """
+        :param queue_size: Maximum number of undelivered events per subscriber
+        """
+        self.queue_size = queue_size
+        self.subscriptions: list[Subscription] = []
+        self.seq = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        statuses: Iterable[ScooterStatus] | None = None,
+        scooter_ids: Iterable[UUID] | None = None,
+    ) -> Subscription:
+        """
+        Subscribe the running event loop to status changes
+        :param statuses: Statuses to receive, None or empty for all
+        :param scooter_ids: Scooters to receive, None or empty for all
+        :return: Subscription, close it when done
+        """
+        sub = Subscription(
+            self,
+            asyncio.get_running_loop(),
+            self.queue_size,
+            frozenset(statuses) if statuses else None,
+            frozenset(scooter_ids) if scooter_ids else None,
+        )
+        with self._lock:
+            self.subscriptions = self.subscriptions + [sub]
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not sub]
+
+    def publish(self, scooter: Scooter) -> StatusEvent:
+        """
+        Publish the current status of a scooter
+        :param scooter: Scooter which status changed
+        :return: Published event
+        """
+        with self._lock:
+            self.seq += 1
+            event = StatusEvent(self.seq, scooter.id, scooter.status, scooter.passenger_id)
+            subscriptions = self.subscriptions
+        for sub in subscriptions:
+            if sub.matches(event):
+                try:
+                    sub.loop.call_soon_threadsafe(sub._deliver, event)
+                except RuntimeError:  # the subscriber loop is closed
+                    self.unsubscribe(sub)
+        return event
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Get feed counters
+        :return: Numbers of subscribers, published events and events dropped for slow subscribers
+        """
+        return {
+            "subscribers": len(self.subscriptions),
+            "published": self.seq,
+            "dropped": self.dropped,
+        }
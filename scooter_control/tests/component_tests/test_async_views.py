@@ -0,0 +1,179 @@
+import asyncio
+import json
+from unittest import mock
+from uuid import uuid4
+
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from rest_framework import status
+
+from scooter_control import async_views
+from scooter_control.models import LogSnapshot, Operation, ScooterStatus
+
+
+class AsyncViewsTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.scooter = async_views.scooter_service.add_scooter()
+        self.passenger_id = async_views.passenger_service.add_passenger("Dmitriy", "Nagiev")
+
+    async def test_post_occupy_scooter_valid(self):
+        request = self.factory.post(
+            "/api/v1/scooter/occupy/",
+            {"scooter_id": str(self.scooter.id), "passenger_id": str(self.passenger_id)},
+            content_type="application/json",
+        )
+        response = await async_views.post_occupy_scooter(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.scooter.status, ScooterStatus.OCCUPIED)
+
+    async def test_post_occupy_scooter_validation_error(self):
+        request = self.factory.post("/api/v1/scooter/occupy/", {"i am": "error"})
+        response = await async_views.post_occupy_scooter(request)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(set(json.loads(response.content)["errors"]), {"scooter_id", "passenger_id"})
+
+    async def test_post_occupy_scooter_parse_error(self):
+        request = self.factory.post("/api/v1/scooter/occupy/", "{", content_type="application/json")
+        response = await async_views.post_occupy_scooter(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_get_passenger_scooter(self):
+        request = self.factory.get(f"/api/v1/passenger/scooter/?passenger_id={self.passenger_id}")
+        self.assertEqual((await async_views.get_passenger_scooter(request)).status_code, status.HTTP_204_NO_CONTENT)
+
+        async_views.scooter_service.occupy_scooter(self.scooter.id, self.passenger_id)
+        response = await async_views.get_passenger_scooter(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["id"], str(self.scooter.id))
+
+        request = self.factory.get(f"/api/v1/passenger/scooter/?passenger_id={uuid4()}")
+        self.assertEqual((await async_views.get_passenger_scooter(request)).status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_post_vacant_scooter_not_found(self):
+        request = self.factory.post("/api/v1/scooter/vacant/", {"scooter_id": str(uuid4())})
+        response = await async_views.post_vacant_scooter(request)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_scooter_broken(self):
+        request = self.factory.get(f"/api/v1/scooter/broken/?scooter_id={self.scooter.id}")
+        self.assertEqual((await async_views.scooter_broken(request)).status_code, status.HTTP_204_NO_CONTENT)
+
+        request = self.factory.post("/api/v1/scooter/broken/", {"scooter_id": str(self.scooter.id)})
+        self.assertEqual((await async_views.scooter_broken(request)).status_code, status.HTTP_200_OK)
+
+        request = self.factory.get(f"/api/v1/scooter/broken/?scooter_id={self.scooter.id}")
+        response = await async_views.scooter_broken(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["status"], ScooterStatus.BROKEN.name)
+
+    async def test_get_scooters_list_valid(self):
+        request = self.factory.get("/api/v1/scooter/all?limit=1&cursor=")
+        response = await async_views.get_scooters_list(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)["results"]), 1)
+
+    async def test_get_scooters_list_method_not_allowed(self):
+        request = self.factory.post("/api/v1/scooter/all")
+        response = await async_views.get_scooters_list(request)
+
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_get_scooter_status_count(self):
+        request = self.factory.get("/api/v1/scooter/status/count/")
+        response = await async_views.get_scooter_status_count(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(json.loads(response.content)), {"broken", "vacant", "occupied"})
+
+    async def test_get_scooter_events(self):
+        request = self.factory.get(f"/api/v1/scooter/events/?status=BROKEN&scooter_id={self.scooter.id}")
+        response = await async_views.get_scooter_events(request)
+        stream = aiter(response.streaming_content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(await anext(stream), b"retry: 1000\n\n")
+
+        async_views.scooter_service.vacant_scooter(self.scooter.id)
+        async_views.scooter_service.break_scooter(self.scooter.id)
+        chunk = (await asyncio.wait_for(anext(stream), 1)).decode()
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()  # as the ASGI handler does on client disconnect
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+        head, data = chunk.rsplit("data: ", 1)
+        self.assertRegex(head, r"^id: \d+\nevent: status\n$")
+        self.assertEqual(
+            json.loads(data),
+            {
+                "seq": json.loads(data)["seq"],
+                "scooter_id": str(self.scooter.id),
+                "status": ScooterStatus.BROKEN.name,
+                "passenger_id": None,
+            },
+        )
+        self.assertEqual(async_views.scooter_service.feed.get_metrics()["subscribers"], 0)
+
+    async def test_get_log_file_status_wait(self):
+        op_id = uuid4()
+        async_views.ops_service.operations[op_id] = Operation(op_id)
+        async_views.ops_service.finish_operation(op_id, LogSnapshot("static/log/passengers.csv", 13, ((1, 13),)))
+
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={op_id}&timeout=5")
+        response = await async_views.get_log_file_status_wait(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["done"], True)
+        self.assertEqual(json.loads(response.content)["result"]["path"], f"/api/v1/log/download/?id={op_id}")
+
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={uuid4()}")
+        response = await async_views.get_log_file_status_wait(request)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={op_id}&timeout=26")
+        response = await async_views.get_log_file_status_wait(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    async def test_get_log_file_status_wait_keeps_loop_free(self):
+        op_id = uuid4()
+        async_views.ops_service.operations[op_id] = Operation(op_id)
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={op_id}&timeout=0.5")
+        waiting = asyncio.ensure_future(async_views.get_log_file_status_wait(request))
+
+        await asyncio.sleep(0.05)
+        request = self.factory.get("/api/v1/scooter/status/count/")
+        self.assertEqual((await async_views.get_scooter_status_count(request)).status_code, status.HTTP_200_OK)
+        self.assertFalse(waiting.done())
+        self.assertEqual(json.loads((await waiting).content)["done"], False)
+
+    async def test_get_scooter_events_keepalive(self):
+        with mock.patch.object(async_views, "EVENTS_KEEPALIVE", 0.01):
+            request = self.factory.get(f"/api/v1/scooter/events/?scooter_id={self.scooter.id}")
+            response = await async_views.get_scooter_events(request)
+            stream = aiter(response.streaming_content)
+
+            self.assertEqual(await anext(stream), b"retry: 1000\n\n")
+            self.assertEqual(await asyncio.wait_for(anext(stream), 1), b": keepalive\n\n")
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            pending.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+
+    async def test_get_scooter_events_validation_error(self):
+        request = self.factory.get("/api/v1/scooter/events/?status=FLYING")
+        response = await async_views.get_scooter_events(request)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    async def test_get_scooter_events_wsgi(self):
+        request = RequestFactory().get("/api/v1/scooter/events/")
+        response = await async_views.get_scooter_events(request)
+
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
@@ -1,16 +1,35 @@
+import gzip
+import json
+import pickle
+import shutil
 import time
-from uuid import uuid4
+from unittest import mock
+from uuid import UUID, uuid4
 
 from rest_framework import status
 from rest_framework.test import APITestCase, APIRequestFactory
 
-from scooter_control.models import ScooterStatus
+from scooter_control.models import Operation, ScooterStatus
+from scooter_control.services import LogService, OperationService
 from scooter_control.views import ScooterViewSet
 
 
 class ScooterControlSystemTests(APITestCase):
+    log_dir = "static/log/test_views/"
+
     def setUp(self):
         self.factory = APIRequestFactory()
+        # keep the log of the running service out of the way, exports of an equal log are reused otherwise
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+        for patch in (
+            mock.patch.object(ScooterViewSet, "log_service", LogService(output_log_path="/" + self.log_dir)),
+            mock.patch.object(ScooterViewSet, "ops_service", OperationService()),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
 
     def get_valid_scooter(self):
         request = self.factory.get(
@@ -34,6 +53,90 @@ class ScooterControlSystemTests(APITestCase):
         self.assertEqual(response.data['status'], ScooterStatus.VACANT.name)
         self.assertEqual(response.data['passenger_id'], None)
 
+    def test_post_scooters_bulk_valid(self):
+        request = self.factory.post("/api/v1/scooter/bulk/", {"count": 1201}, format="json")
+        response = ScooterViewSet.as_view({"post": "post_scooters_bulk"})(request)
+        scooters = json.loads(b"".join(response.streaming_content))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(scooters), 1201)
+        self.assertEqual(len({scooter["id"] for scooter in scooters}), 1201)
+        self.assertEqual(scooters[-1]["status"], ScooterStatus.VACANT.name)
+        self.assertIsNotNone(ScooterViewSet.scooter_service.get_scooter(UUID(scooters[-1]["id"])))
+
+    def test_post_scooters_bulk_validation_error(self):
+        request = self.factory.post("/api/v1/scooter/bulk/", {"count": 10001}, format="json")
+        response = ScooterViewSet.as_view({"post": "post_scooters_bulk"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertIn("count", response.data["errors"])
+
+    def post_scooters_batch(self, transitions: list[dict], atomic: bool = False):
+        request = self.factory.post(
+            "/api/v1/scooter/batch/",
+            {"transitions": transitions, "atomic": atomic},
+            format="json",
+        )
+        return ScooterViewSet.as_view({"post": "post_scooters_batch"})(request)
+
+    def test_post_scooters_batch_valid(self):
+        passenger_id = self.post_valid_passenger().data["passenger_id"]
+        first, second = self.get_valid_scooter().data["id"], self.get_valid_scooter().data["id"]
+        missing = str(uuid4())
+
+        response = self.post_scooters_batch([
+            {"scooter_id": first, "status": "OCCUPIED", "passenger_id": passenger_id},
+            {"scooter_id": second, "status": "BROKEN"},
+            {"scooter_id": missing, "status": "VACANT"},
+            {"scooter_id": second, "status": "OCCUPIED", "passenger_id": missing},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["applied"], True)
+        self.assertEqual(
+            [item["result"] for item in response.data["results"]],
+            ["applied", "applied", "not_found", "not_found"],
+        )
+        self.assertEqual(ScooterViewSet.scooter_service.get_scooter(UUID(first)).status, ScooterStatus.OCCUPIED)
+        self.assertEqual(ScooterViewSet.scooter_service.get_scooter(UUID(second)).status, ScooterStatus.BROKEN)
+
+    def test_post_scooters_batch_atomic_conflict(self):
+        scooter_id = self.get_valid_scooter().data["id"]
+
+        response = self.post_scooters_batch(
+            [{"scooter_id": scooter_id, "status": "BROKEN"}, {"scooter_id": str(uuid4()), "status": "BROKEN"}],
+            atomic=True,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["applied"], False)
+        self.assertEqual([item["result"] for item in response.data["results"]], ["skipped", "not_found"])
+        self.assertEqual(ScooterViewSet.scooter_service.get_scooter(UUID(scooter_id)).status, ScooterStatus.VACANT)
+
+    def test_post_scooters_batch_atomic_unknown_passenger(self):
+        scooter_id = self.get_valid_scooter().data["id"]
+
+        response = self.post_scooters_batch(
+            [
+                {"scooter_id": str(uuid4()), "status": "BROKEN"},
+                {"scooter_id": scooter_id, "status": "BROKEN"},
+                {"scooter_id": scooter_id, "status": "OCCUPIED", "passenger_id": str(uuid4())},
+            ],
+            atomic=True,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([item["result"] for item in response.data["results"]], ["not_found", "skipped", "not_found"])
+
+    def test_post_scooters_batch_validation_error(self):
+        response = self.post_scooters_batch([{"scooter_id": str(uuid4()), "status": "OCCUPIED"}])
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(
+            response.data["errors"]["transitions"][0]["passenger_id"],
+            ["This field is required to occupy a scooter."],
+        )
+
     def test_post_passenger_valid(self):
         response = self.post_valid_passenger()
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -48,6 +151,40 @@ class ScooterControlSystemTests(APITestCase):
         response = ScooterViewSet.as_view({'post': 'post_passenger'})(request)
         self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
 
+    def test_post_passengers_bulk_valid(self):
+        written = ScooterViewSet.log_service.get_metrics()["written"]
+        request = self.factory.post(
+            "/api/v1/passenger/bulk/",
+            {"passengers": [{"name": "Dmitriy", "surname": f"Nagiev{i}"} for i in range(3)]},
+            format="json",
+        )
+        response = ScooterViewSet.as_view({"post": "post_passengers_bulk"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        passenger = ScooterViewSet.passenger_service.get_passenger(UUID(response.data[2]["passenger_id"]))
+        self.assertEqual(passenger.surname, "Nagiev2")
+        self.assertEqual(ScooterViewSet.log_service.get_metrics()["written"], written + 3)
+
+    def test_post_passenger_log_separator_validation_error(self):
+        for name, surname in (("Ann\nX", "Lee"), ("Ann", "Lee\r"), ("Ann;X", "Lee")):
+            request = self.factory.post("/api/v1/passenger/", {"name": name, "surname": f"{surname} Jr"})
+            response = ScooterViewSet.as_view({"post": "post_passenger"})(request)
+            self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        self.assertEqual(ScooterViewSet.log_service.count_entries(), 0)
+
+    def test_post_passengers_bulk_validation_error(self):
+        request = self.factory.post(
+            "/api/v1/passenger/bulk/",
+            {"passengers": [{"name": "Dmitriy", "surname": "Nagiev"}, {"name": "Dmitriy"}]},
+            format="json",
+        )
+        response = ScooterViewSet.as_view({"post": "post_passengers_bulk"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.data["errors"]["passengers"][1]["surname"], ["This field is required."])
+
     def test_post_occupy_scooter_valid(self):
         passenger_id = self.post_valid_passenger().data['passenger_id']
         scooter_data = self.get_valid_scooter().data
@@ -62,6 +199,64 @@ class ScooterControlSystemTests(APITestCase):
         response = ScooterViewSet.as_view({'post': 'post_occupy_scooter'})(request)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_post_occupy_scooter_conflict(self):
+        passenger_id = self.post_valid_passenger().data['passenger_id']
+        scooter_id = self.get_valid_scooter().data['id']
+        ScooterViewSet.scooter_service.break_scooter(UUID(scooter_id))
+
+        request = self.factory.post(
+            '/api/v1/scooter/occupy',
+            {
+                'scooter_id': scooter_id,
+                'passenger_id': passenger_id,
+            }
+        )
+        response = ScooterViewSet.as_view({'post': 'post_occupy_scooter'})(request)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_post_occupy_scooter_passenger_riding(self):
+        passenger_id = self.post_valid_passenger().data['passenger_id']
+        for expected in (status.HTTP_200_OK, status.HTTP_409_CONFLICT):
+            request = self.factory.post(
+                '/api/v1/scooter/occupy',
+                {
+                    'scooter_id': self.get_valid_scooter().data['id'],
+                    'passenger_id': passenger_id,
+                }
+            )
+            response = ScooterViewSet.as_view({'post': 'post_occupy_scooter'})(request)
+            self.assertEqual(response.status_code, expected)
+
+    def test_get_passenger_scooter_valid(self):
+        passenger_id = self.post_valid_passenger().data['passenger_id']
+        scooter_id = self.get_valid_scooter().data['id']
+        ScooterViewSet.scooter_service.occupy_scooter(UUID(scooter_id), UUID(passenger_id))
+
+        request = self.factory.get(f'/api/v1/passenger/scooter?passenger_id={passenger_id}')
+        response = ScooterViewSet.as_view({'get': 'get_passenger_scooter'})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {'id': scooter_id, 'status': ScooterStatus.OCCUPIED.name, 'passenger_id': passenger_id},
+        )
+
+    def test_get_passenger_scooter_no_content(self):
+        passenger_id = self.post_valid_passenger().data['passenger_id']
+
+        request = self.factory.get(f'/api/v1/passenger/scooter?passenger_id={passenger_id}')
+        response = ScooterViewSet.as_view({'get': 'get_passenger_scooter'})(request)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_get_passenger_scooter_not_found(self):
+        request = self.factory.get(f'/api/v1/passenger/scooter?passenger_id={uuid4()}')
+        response = ScooterViewSet.as_view({'get': 'get_passenger_scooter'})(request)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_passenger_scooter_validation_error(self):
+        request = self.factory.get('/api/v1/passenger/scooter?passenger_id=i_am_error')
+        response = ScooterViewSet.as_view({'get': 'get_passenger_scooter'})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
     def test_post_occupy_scooter_not_found(self):
         request = self.factory.post(
             f'/api/v1/scooter/occupy',
@@ -161,6 +356,76 @@ class ScooterControlSystemTests(APITestCase):
         response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
         self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
 
+    def test_get_scooters_list_cursor_valid(self):
+        for _ in range(3):
+            self.get_valid_scooter()
+
+        request = self.factory.get(
+            '/api/v1/scooter/all?limit=2&cursor=',
+        )
+        response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotEqual(response.data['next_cursor'], None)
+
+        request = self.factory.get(
+            f'/api/v1/scooter/all?limit=50&cursor={response.data["next_cursor"]}',
+        )
+        response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['next_cursor'], None)
+
+    def test_get_scooters_list_cursor_validation_error(self):
+        request = self.factory.get(
+            '/api/v1/scooter/all?cursor=i_am_error',
+        )
+        response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        request = self.factory.get(
+            '/api/v1/scooter/all?cursor=&offset=10',
+        )
+        response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_get_scooters_list_status_valid(self):
+        scooter_data = self.get_valid_scooter().data
+        self.get_valid_scooter()
+
+        request = self.factory.post(
+            '/api/v1/scooter/broken',
+            {
+                'scooter_id': scooter_data['id'],
+            }
+        )
+        ScooterViewSet.as_view({'post': 'post_broken_scooter'})(request)
+
+        request = self.factory.get(
+            f'/api/v1/scooter/all?status={ScooterStatus.BROKEN.name}&limit=50',
+        )
+        response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(scooter_data['id'], [s['id'] for s in response.data])
+        self.assertTrue(all(s['status'] == ScooterStatus.BROKEN.name for s in response.data))
+
+    def test_get_scooters_list_status_validation_error(self):
+        request = self.factory.get(
+            '/api/v1/scooter/all?status=FLYING',
+        )
+        response = ScooterViewSet.as_view({'get': 'get_scooters_list'})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_get_scooter_status_count_valid(self):
+        request = self.factory.get('/api/v1/scooter/status/count/')
+        before = ScooterViewSet.as_view({'get': 'get_scooter_status_count'})(request).data
+        self.get_valid_scooter()
+
+        request = self.factory.get('/api/v1/scooter/status/count/')
+        response = ScooterViewSet.as_view({'get': 'get_scooter_status_count'})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['vacant'], before['vacant'] + 1)
+        self.assertEqual(response.data['broken'], before['broken'])
+
     def test_get_scooter_broken_valid(self):
         scooter_data = self.get_valid_scooter().data
         desired_data = {
@@ -179,7 +444,7 @@ class ScooterControlSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         request = self.factory.get(
-            f'/api/v1/scooter/broken?scooter_id={scooter_data['id']}',
+            f'/api/v1/scooter/broken?scooter_id={scooter_data["id"]}',
         )
         response = ScooterViewSet.as_view({'get': 'get_scooter_broken'})(request)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -189,7 +454,7 @@ class ScooterControlSystemTests(APITestCase):
         scooter_data = self.get_valid_scooter().data
 
         request = self.factory.get(
-            f'/api/v1/scooter/broken?scooter_id={scooter_data['id']}',
+            f'/api/v1/scooter/broken?scooter_id={scooter_data["id"]}',
         )
         response = ScooterViewSet.as_view({'get': 'get_scooter_broken'})(request)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
@@ -211,6 +476,8 @@ class ScooterControlSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
 
     def test_get_log_file_success(self):
+        self.post_valid_passenger()  # a log with no new entries reuses the previous export
+
         request = self.factory.get("/api/v1/log")
         response = ScooterViewSet.as_view({"get": "get_log_file"})(request)
 
@@ -218,18 +485,35 @@ class ScooterControlSystemTests(APITestCase):
         self.assertEqual(response.data["done"], False)
         self.assertEqual(response.data["result"], None)
 
+    def test_get_log_file_reuse_success(self):
+        self.post_valid_passenger()
+        request = self.factory.get("/api/v1/log")
+        first_id = ScooterViewSet.as_view({"get": "get_log_file"})(request).data["id"]
+
+        time.sleep(1)
+
+        request = self.factory.get("/api/v1/log")
+        response = ScooterViewSet.as_view({"get": "get_log_file"})(request)
+        self.assertEqual(response.data["id"], first_id)
+        self.assertEqual(response.data["done"], True)
+
+        self.post_valid_passenger()
+        request = self.factory.get("/api/v1/log")
+        response = ScooterViewSet.as_view({"get": "get_log_file"})(request)
+        self.assertNotEqual(response.data["id"], first_id)
+
     def test_get_log_file_status_success(self):
         desired_response_data = {
             "id": None,
             "done": True,
-            "result": {
-                "path": "static/log/passengers.csv"
-            },
+            "failed": False,
+            "result": None,
         }
 
         request = self.factory.get("/api/v1/log")
         response = ScooterViewSet.as_view({"get": "get_log_file"})(request)
         desired_response_data["id"] = response.data['id']
+        desired_response_data["result"] = {"path": f"/api/v1/log/download/?id={response.data['id']}"}
 
         time.sleep(1)
 
@@ -254,6 +538,15 @@ class ScooterControlSystemTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
         self.assertEqual(response.data, desired_response_data)
 
+    def test_get_log_file_status_gone(self):
+        op_id = self.export_log()
+        ScooterViewSet.ops_service.operations._evict(UUID(op_id))
+
+        request = self.factory.get(f"/api/v1/log/status?id={op_id}")
+        response = ScooterViewSet.as_view({"get": "get_log_file_status"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
     def test_get_log_file_status_not_found(self):
         op_id = uuid4()
 
@@ -261,3 +554,146 @@ class ScooterControlSystemTests(APITestCase):
         response = ScooterViewSet.as_view({"get": "get_log_file_status"})(request)
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_log_file_status_wait_success(self):
+        self.post_valid_passenger()
+        request = self.factory.get("/api/v1/log")
+        op_id = ScooterViewSet.as_view({"get": "get_log_file"})(request).data["id"]
+
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={op_id}&timeout=5")
+        response = ScooterViewSet.as_view({"get": "get_log_file_status_wait"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], op_id)
+        self.assertEqual(response.data["done"], True)
+
+    def test_get_log_file_status_wait_validation_error(self):
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={uuid4()}&timeout=26")
+        response = ScooterViewSet.as_view({"get": "get_log_file_status_wait"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_get_log_file_status_wait_not_found(self):
+        request = self.factory.get(f"/api/v1/log/status/wait/?id={uuid4()}")
+        response = ScooterViewSet.as_view({"get": "get_log_file_status_wait"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_metrics_success(self):
+        self.post_valid_passenger()
+
+        request = self.factory.get("/api/v1/metrics/")
+        response = ScooterViewSet.as_view({"get": "get_metrics"})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data["log"]["written"], 1)
+
+    def export_log(self) -> str:
+        request = self.factory.get("/api/v1/log")
+        op_id = ScooterViewSet.as_view({"get": "get_log_file"})(request).data["id"]
+        time.sleep(1)
+        return op_id
+
+    def download_log(self, query: str, **headers):
+        request = self.factory.get(f"/api/v1/log/download/?{query}", headers=headers)
+        return ScooterViewSet.as_view({"get": "get_log_file_download"})(request)
+
+    def test_get_log_file_download_success(self):
+        self.post_valid_passenger()
+        op_id = self.export_log()
+        self.post_valid_passenger()  # not part of the snapshot
+
+        response = self.download_log(f"id={op_id}")
+        content = b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        self.assertTrue(content.startswith(b"name;surname\n"))
+        self.assertTrue(content.endswith(b"Dmitriy;Nagiev\n"))
+
+        response = self.download_log(f"id={op_id}", Range="bytes=5-")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), content[5:])
+        self.assertEqual(response["Content-Range"], f"bytes 5-{len(content) - 1}/{len(content)}")
+
+        response = self.download_log(f"id={op_id}", Range="bytes=-7")
+        self.assertEqual(b"".join(response.streaming_content), content[-7:])
+
+        response = self.download_log(f"id={op_id}", Range="bytes=0-3", **{"If-Range": '"stale"'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.download_log(f"id={op_id}&gzip=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), content)
+
+    def test_get_log_file_download_range_not_satisfiable(self):
+        op_id = self.export_log()
+
+        response = self.download_log(f"id={op_id}", Range="bytes=100000000-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_get_log_file_download_not_found(self):
+        response = self.download_log(f"id={uuid4()}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_log_file_download_failed(self):
+        op_id = uuid4()
+        ScooterViewSet.ops_service.operations[op_id] = Operation(op_id)
+        ScooterViewSet.ops_service.fail_operation(op_id)
+
+        request = self.factory.get(f"/api/v1/log/status?id={op_id}")
+        response = ScooterViewSet.as_view({"get": "get_log_file_status"})(request)
+        self.assertEqual(response.data["failed"], True)
+        self.assertEqual(response.data["result"], None)
+
+        response = self.download_log(f"id={op_id}")
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_get_log_file_download_other_worker(self):
+        self.post_valid_passenger()
+        op_id = self.export_log()
+        op = ScooterViewSet.ops_service.get_operation(UUID(op_id))
+        op.result = op.result._replace(directory="static/log/test_views/worker-1/")  # exported by another worker
+
+        response = self.download_log(f"id={op_id}")
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_get_log_file_download_pruned(self):
+        ScooterViewSet.log_service = LogService(output_log_path="/" + self.log_dir, max_bytes=40, max_segments=1)
+        self.post_valid_passenger()
+        op_id = self.export_log()
+        op = ScooterViewSet.ops_service.get_operation(UUID(op_id))
+        op.result = pickle.loads(pickle.dumps(op.result))  # restored from the database, pins nothing
+        for _ in range(4):
+            self.post_valid_passenger()  # rotates and prunes the segment of the snapshot
+
+        response = self.download_log(f"id={op_id}")
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_get_log_file_download_validation_error(self):
+        response = self.download_log("cannot=validate")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_get_log_entry_and_search_success(self):
+        self.post_valid_passenger()
+
+        request = self.factory.get("/api/v1/log/search/?surname=Nagi")
+        response = ScooterViewSet.as_view({"get": "get_log_search"})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data["total"], 1)
+        result = response.data["results"][0]
+        self.assertEqual(result["surname"], "Nagiev")
+
+        request = self.factory.get(f"/api/v1/log/entry/?index={result['index']}")
+        response = ScooterViewSet.as_view({"get": "get_log_entry"})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, result)
+
+    def test_get_log_entry_not_found(self):
+        request = self.factory.get("/api/v1/log/entry/?index=100000000")
+        response = ScooterViewSet.as_view({"get": "get_log_entry"})(request)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_log_search_validation_error(self):
+        request = self.factory.get("/api/v1/log/search/")
+        response = ScooterViewSet.as_view({"get": "get_log_search"})(request)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
@@ -0,0 +1,282 @@
+import os
+import shutil
+from io import StringIO
+from uuid import uuid4
+
+from django.core import checks
+from django.core.management import call_command
+from django.test import TestCase
+
+from scooter_control.models import FleetChange, PassengerRecord, ScooterRecord, ScooterStatus, ScooterTransition
+from scooter_control.services import PassengerService, ScooterService
+from scooter_control.services.fleet_store import (
+    DatabaseFleetStore,
+    FleetStore,
+    SharedFleetStore,
+    SnapshotFleetStore,
+    TransactionalFleetStore,
+    create_fleet_store,
+)
+
+
+class SharedFleetStoreTest(TestCase):
+    def setUp(self) -> None:
+        # two worker processes sharing the database
+        self.store_a = SharedFleetStore(sync_interval=0, compact_interval=None)
+        self.store_b = SharedFleetStore(sync_interval=0, compact_interval=None)
+        self.scooters_a = ScooterService(store=self.store_a)
+        self.scooters_b = ScooterService(store=self.store_b)
+        self.passengers_a = PassengerService(store=self.store_a)
+        self.passengers_b = PassengerService(store=self.store_b)
+
+    def test_scooter_shared(self):
+        added = self.scooters_a.add_scooter()
+        bulk = self.scooters_a.add_scooters(2)
+
+        scooter = self.scooters_b.get_scooter(added.id)
+        self.assertIsNotNone(scooter)
+        self.assertEqual(scooter.status, ScooterStatus.VACANT)
+        self.assertEqual(
+            [s.id for s in self.scooters_b.get_scooter_list(limit=10, offset=0)],
+            [added.id] + [s.id for s in bulk],
+        )
+        self.assertEqual(FleetChange.objects.count(), 3)
+
+    def test_occupy_shared(self):
+        scooter = self.scooters_a.add_scooter()
+        self.scooters_b.get_scooter(scooter.id)
+        passenger_id = uuid4()
+
+        self.assertTrue(self.scooters_a.occupy_scooter(scooter.id, passenger_id))
+        self.assertFalse(self.scooters_b.occupy_scooter(scooter.id, uuid4()))
+
+        replica = self.scooters_b.get_scooter(scooter.id)
+        self.assertEqual((replica.status, replica.passenger_id), (ScooterStatus.OCCUPIED, passenger_id))
+        self.assertEqual(self.scooters_b.count_scooters_by_status()[ScooterStatus.OCCUPIED], 1)
+
+        self.assertTrue(self.scooters_b.break_scooter(scooter.id))
+        self.assertTrue(self.scooters_a.is_scooter_broken(scooter.id))
+        self.assertEqual(scooter.passenger_id, passenger_id)
+
+    def test_passenger_shared(self):
+        passenger_id = self.passengers_a.add_passenger("Ivan", "Ivanov")
+        passenger_ids = self.passengers_a.add_passengers([("Petr", "Petrov")])
+
+        self.assertEqual(repr(self.passengers_b.get_passenger(passenger_id)), "Ivan Ivanov")
+        self.assertEqual(repr(self.passengers_b.get_passenger(passenger_ids[0])), "Petr Petrov")
+        self.assertIsNone(self.passengers_b.get_passenger(uuid4()))
+
+    def test_compact(self):
+        added = self.scooters_a.add_scooters(3)
+        passenger_id = self.passengers_a.add_passenger("Ivan", "Ivanov")
+        self.scooters_b.get_scooter(added[0].id)  # store_b is synced before the compaction
+        self.scooters_a.occupy_scooter(added[1].id, passenger_id)
+
+        self.assertEqual(self.store_a.compact(), 5)
+        self.assertEqual(self.store_a.compact(), 0)
+        self.assertEqual(FleetChange.objects.count(), 0)
+        self.assertEqual(ScooterRecord.objects.get(pk=added[1].id).status, "OCCUPIED")
+        self.scooters_a.break_scooter(added[2].id)
+
+        # a new worker loads the records and replays the journal after them
+        store = SharedFleetStore(sync_interval=0, compact_interval=None)
+        scooters, passengers = ScooterService(store=store), PassengerService(store=store)
+        self.assertEqual([s.id for s in scooters.get_scooter_list(limit=10, offset=0)], [s.id for s in added])
+        self.assertEqual(scooters.get_passenger_scooter(passenger_id).id, added[1].id)
+        self.assertTrue(scooters.is_scooter_broken(added[2].id))
+        self.assertEqual(repr(passengers.get_passenger(passenger_id)), "Ivan Ivanov")
+
+        # a worker that fell behind the compaction catches up the same way
+        self.assertEqual(self.scooters_b.get_scooter(added[1].id).passenger_id, passenger_id)
+        self.assertTrue(self.scooters_b.is_scooter_broken(added[2].id))
+
+    def test_failed_write_not_recorded(self):
+        with self.assertRaises(RuntimeError):
+            with self.store_a.writing():
+                self.store_a.record(ScooterService.KIND, uuid4(), {"status": "VACANT", "passenger_id": None})
+                raise RuntimeError
+
+        self.assertEqual(FleetChange.objects.count(), 0)
+
+    def test_create_fleet_store(self):
+        with self.settings(FLEET_STORE={"STORE": "shared", "OPTIONS": {"SYNC_INTERVAL": 1}}):
+            store = create_fleet_store()
+        self.assertIsInstance(store, SharedFleetStore)
+        self.assertEqual(store.sync_interval, 1)
+
+        with self.settings(FLEET_STORE={"STORE": "database", "OPTIONS": {"BATCH_SIZE": 10}}):
+            self.assertEqual(create_fleet_store().batch_size, 10)
+
+        with self.settings(FLEET_STORE={"STORE": "memory"}):
+            self.assertNotIsInstance(create_fleet_store(), SharedFleetStore)
+
+        with self.settings(FLEET_STORE={"STORE": "redis"}):
+            with self.assertRaises(ValueError):
+                create_fleet_store()
+
+    def test_async_views_check(self):
+        for store, errors in (
+            ("shared", ["scooter_control.E001"]),
+            ("database", ["scooter_control.E001"]),
+            ("snapshot", ["scooter_control.E001"]),
+            ("memory", []),
+        ):
+            with self.settings(ASYNC_VIEWS=True, FLEET_STORE={"STORE": store}):
+                self.assertEqual([error.id for error in checks.run_checks()], errors)
+
+        with self.settings(ASYNC_VIEWS=False, FLEET_STORE={"STORE": "shared"}):
+            self.assertEqual(checks.run_checks(), [])
+
+    def test_transactional_store_abstract(self):
+        with self.assertRaises(TypeError):
+            TransactionalFleetStore()
+
+    def test_memory_store(self):
+        service = ScooterService(store=FleetStore())
+        scooter = service.add_scooter()
+
+        self.assertTrue(service.occupy_scooter(scooter.id, uuid4()))
+        self.assertEqual(FleetChange.objects.count(), 0)
+
+
+class DatabaseFleetStoreTest(TestCase):
+    def setUp(self) -> None:
+        self.store = DatabaseFleetStore(batch_size=2)
+        self.scooters = ScooterService(store=self.store)
+        self.passengers = PassengerService(store=self.store)
+
+    def restart(self) -> tuple[ScooterService, PassengerService]:
+        store = DatabaseFleetStore()
+        return ScooterService(store=store), PassengerService(store=store)
+
+    def test_write_through(self):
+        first = self.scooters.add_scooter()
+        rest = self.scooters.add_scooters(3)
+        passenger_id = self.passengers.add_passenger("Ivan", "Ivanov")
+        self.scooters.occupy_scooter(rest[0].id, passenger_id)
+        self.scooters.break_scooter(rest[1].id)
+
+        self.assertEqual(
+            list(ScooterRecord.objects.order_by("position").values_list("id", "status", "passenger_id")),
+            [
+                (first.id, "VACANT", None),
+                (rest[0].id, "OCCUPIED", passenger_id),
+                (rest[1].id, "BROKEN", None),
+                (rest[2].id, "VACANT", None),
+            ],
+        )
+        self.assertEqual(ScooterRecord.objects.filter(passenger_id=passenger_id).get().id, rest[0].id)
+        self.assertEqual(PassengerRecord.objects.get(pk=passenger_id).surname, "Ivanov")
+
+    def test_restart(self):
+        added = self.scooters.add_scooters(3)
+        passenger_ids = self.passengers.add_passengers([("Ivan", "Ivanov"), ("Petr", "Petrov")])
+        self.scooters.occupy_scooter(added[2].id, passenger_ids[1])
+
+        scooters, passengers = self.restart()
+        self.assertEqual([s.id for s in scooters.get_scooter_list(limit=10, offset=0)], [s.id for s in added])
+        self.assertEqual(scooters.get_scooter(added[2].id).passenger_id, passenger_ids[1])
+        self.assertEqual(scooters.count_scooters_by_status()[ScooterStatus.OCCUPIED], 1)
+        self.assertEqual(repr(passengers.get_passenger(passenger_ids[0])), "Ivan Ivanov")
+
+        # new scooters follow the loaded ones
+        added.append(scooters.add_scooter())
+        self.assertEqual([s.id for s in self.restart()[0].get_scooter_list(limit=10, offset=0)], [s.id for s in added])
+
+    def test_atomic_batch_not_recorded(self):
+        scooter = self.scooters.add_scooter()
+
+        self.scooters.apply_transitions(
+            [ScooterTransition(scooter.id, ScooterStatus.BROKEN), ScooterTransition(uuid4(), ScooterStatus.BROKEN)],
+            atomic=True,
+        )
+
+        self.assertEqual(ScooterRecord.objects.get(pk=scooter.id).status, "VACANT")
+
+
+class SnapshotFleetStoreTest(TestCase):
+    fleet_dir = "static/fleet/test_snapshot/"
+
+    def setUp(self) -> None:
+        shutil.rmtree(self.fleet_dir, ignore_errors=True)
+        self.store = SnapshotFleetStore(self.fleet_dir, snapshot_interval=None)
+        self.scooters = ScooterService(store=self.store)
+        self.passengers = PassengerService(store=self.store)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        shutil.rmtree(self.fleet_dir, ignore_errors=True)
+
+    def restart(self) -> tuple[ScooterService, PassengerService]:
+        self.store.close()
+        self.store = SnapshotFleetStore(self.fleet_dir, snapshot_interval=None)
+        return ScooterService(store=self.store), PassengerService(store=self.store)
+
+    def assertRestored(self, scooters: ScooterService, expected: list) -> None:
+        self.assertEqual(
+            [(s.id, s.status, s.passenger_id) for s in scooters.get_scooter_list(limit=100, offset=0)],
+            [(s.id, s.status, s.passenger_id) for s in expected],
+        )
+
+    def test_restore_journal(self):
+        added = self.scooters.add_scooters(3)
+        passenger_id = self.passengers.add_passenger("Ivan", "Ivanov")
+        self.scooters.occupy_scooter(added[0].id, passenger_id)
+        self.scooters.break_scooter(added[1].id)
+
+        scooters, passengers = self.restart()
+        self.assertRestored(scooters, added)
+        self.assertEqual(scooters.count_scooters_by_status()[ScooterStatus.BROKEN], 1)
+        self.assertEqual(repr(passengers.get_passenger(passenger_id)), "Ivan Ivanov")
+
+    def test_restore_snapshot_and_journal(self):
+        added = self.scooters.add_scooters(5)
+        passenger_ids = self.passengers.add_passengers([("Ivan", "Ivanov"), ("Петр", "Петров")])
+        self.scooters.occupy_scooter(added[0].id, passenger_ids[1])
+        self.store.block_size = 2
+        self.assertEqual(self.store.snapshot()["entities"], 7)
+        self.scooters.vacant_scooter(added[0].id)
+        self.scooters.occupy_scooter(added[4].id, passenger_ids[0])
+        added.append(self.scooters.add_scooter())
+
+        scooters, passengers = self.restart()
+        self.assertEqual(sorted(os.listdir(self.fleet_dir)), ["fleet.journal.0000000001", "fleet.snapshot"])
+        self.assertRestored(scooters, added)
+        self.assertEqual(repr(passengers.get_passenger(passenger_ids[1])), "Петр Петров")
+
+        stats = self.store.restore()
+        self.assertIsNone(stats)
+        self.assertEqual(self.restart()[0].store.load()["journal"], 3)
+
+    def test_torn_journal_block(self):
+        added = self.scooters.add_scooters(2)
+        self.scooters.break_scooter(added[0].id)
+        self.store.close()
+        journal = os.path.join(self.fleet_dir, "fleet.journal.0000000000")
+        with open(journal, "r+b") as journal_file:
+            journal_file.truncate(os.path.getsize(journal) - 1)
+
+        scooters, _ = self.restart()
+        self.assertEqual(scooters.get_scooter(added[0].id).status, ScooterStatus.VACANT)
+        scooters.break_scooter(added[1].id)
+
+        scooters, _ = self.restart()
+        self.assertEqual(
+            [s.status for s in scooters.get_scooter_list(limit=10, offset=0)],
+            [ScooterStatus.VACANT, ScooterStatus.BROKEN],
+        )
+
+    def test_fleet_restore_command(self):
+        self.scooters.add_scooters(3)
+        self.passengers.add_passenger("Ivan", "Ivanov")
+        self.store.close()
+        out = StringIO()
+
+        with self.settings(FLEET_STORE={"STORE": "snapshot", "OPTIONS": {"PATH": self.fleet_dir}}):
+            call_command("fleet_restore", "--snapshot", stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("Restored 3 scooters and 1 passengers in "))
+        self.assertTrue(lines[0].endswith("0 entities from the snapshot, 4 changes from the journal"))
+        self.assertTrue(lines[1].startswith("Wrote a snapshot of 4 entities"))
+        self.assertEqual(self.restart()[0].store.load()["snapshot"], 4)
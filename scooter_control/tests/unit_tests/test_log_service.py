@@ -1,3 +1,12 @@
+import glob
+import gzip
+import os
+import pickle
+import shutil
+import threading
+import time
+from unittest import mock
+
 from django.conf import settings
 from django.test import TestCase
 
@@ -5,28 +14,373 @@ from scooter_control.models import Passenger
 from scooter_control.services import LogService
 
 
+def remove_log_files(name: str) -> None:
+    for path in glob.glob(f"static/log/{name}.*"):
+        os.remove(path)  # segments kept from previous runs
+
+
 class LogServiceTest(TestCase):
     def setUp(self) -> None:
         self.log_file_name = "test_log_service.csv"
+        remove_log_files("test_log_service")
         self.service = LogService(log_file_name=self.log_file_name)
 
     def test_log_service_init_success(self):
-        a = Passenger("", "")
-        columns = ";".join(a.__dict__.keys()) + "\n"
+        columns = ";".join(Passenger.__slots__) + "\n"
         with open(self.service.log_file) as csv_file:
             row_names = csv_file.readline()
             self.assertEqual(row_names, columns)
 
     def test_write_entry_success(self):
         passenger = Passenger("Elon", "Musk")
-        columns = ";".join(passenger.__dict__.keys()) + "\n"
+        columns = ";".join(Passenger.__slots__) + "\n"
         self.service.write_entry(passenger.name, passenger.surname)
         with open(self.service.log_file) as csv_file:
             row_names = csv_file.readline()
             log_entry = csv_file.readline()
             self.assertEqual(row_names, columns)
-            self.assertEqual(log_entry, ";".join(passenger.__dict__.values())+"\n")
+            self.assertEqual(log_entry, ";".join([passenger.name, passenger.surname])+"\n")
+
+    def test_write_entries_success(self):
+        self.service.write_entries([("Elon", "Musk"), ("Jeff", "Bezos")])
+
+        with open(self.service.log_file) as csv_file:
+            self.assertEqual(csv_file.readlines()[1:], ["Elon;Musk\n", "Jeff;Bezos\n"])
+        self.assertEqual(self.service.offset, os.path.getsize(self.service.log_file))
+        self.assertEqual(self.service.get_metrics()["written"], 2)
+
+    def test_export_success(self):
+        self.service.write_entry("Elon", "Musk")
+        snapshot = self.service.export()
+
+        self.assertEqual(snapshot.path, self.service.log_file)
+        self.assertEqual(snapshot.size, os.path.getsize(self.service.log_file))
+        self.assertEqual(snapshot.size, self.service.offset)
+
+    def test_read_snapshot_success(self):
+        self.service.write_entry("Elon", "Musk")
+        snapshot = self.service.export()
+        self.service.write_entry("Jeff", "Bezos")
+
+        content = b"".join(self.service.read_snapshot(snapshot, chunk_size=4))
+        self.assertEqual(content, b"name;surname\nElon;Musk\n")
+        self.assertEqual(b"".join(self.service.read_snapshot(snapshot, 5, 12)), b"surname")
+        self.assertEqual(gzip.decompress(b"".join(self.service.gzip_chunks([content]))), content)
 
     def test_get_log_file_path_success(self):
         file_path = (settings.STATIC_URL + "log/" + self.log_file_name)[1:]
         self.assertEqual(self.service.get_log_file_path(), file_path)
+
+
+class BufferedLogServiceTest(TestCase):
+    def setUp(self) -> None:
+        remove_log_files("test_buffered_log_service")
+        self.service = LogService(
+            log_file_name="test_buffered_log_service.csv",
+            mode=LogService.BUFFERED,
+            flush_size=3,
+            flush_interval=0.1,
+        )
+
+    def read_entries(self) -> list[str]:
+        with open(self.service.log_file) as csv_file:
+            return csv_file.readlines()[1:]
+
+    def test_write_entry_buffered(self):
+        self.service.write_entry("Elon", "Musk")
+        self.assertEqual(self.read_entries(), [])
+
+        self.service.flush()
+        self.assertEqual(self.read_entries(), ["Elon;Musk\n"])
+
+    def test_write_entry_flush_size(self):
+        for i in range(4):
+            self.service.write_entry("Elon", str(i))
+        self.assertEqual(self.read_entries(), ["Elon;0\n", "Elon;1\n", "Elon;2\n"])
+
+    def test_write_entry_during_flush(self):
+        release = threading.Event()
+        write_lines = self.service._write_lines
+        self.service._write_lines = lambda lines, sync=True: release.wait() and write_lines(lines, sync)
+        flushing = threading.Thread(target=lambda: [self.service.write_entry("Elon", str(i)) for i in range(3)])
+        flushing.start()
+        while self.service._buffer or not self.service._file_lock.locked():
+            time.sleep(0.01)  # the batch was taken and the write stalled
+
+        start = time.monotonic()
+        self.service.write_entry("Jeff", "Bezos")  # buffered while the batch is written
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        release.set()
+        flushing.join()
+        self.service.flush()
+        self.assertEqual(self.read_entries(), ["Elon;0\n", "Elon;1\n", "Elon;2\n", "Jeff;Bezos\n"])
+
+    def test_write_entry_flush_interval(self):
+        self.service.write_entry("Elon", "Musk")
+        time.sleep(0.3)
+        self.assertEqual(self.read_entries(), ["Elon;Musk\n"])
+
+    def test_write_entries_buffered(self):
+        self.service.write_entry("Elon", "Musk")
+        self.service.write_entries([("Jeff", "Bezos")])
+
+        self.assertEqual(self.read_entries(), ["Elon;Musk\n", "Jeff;Bezos\n"])
+
+    def test_export_buffered(self):
+        self.service.write_entry("Elon", "Musk")
+        snapshot = self.service.export()
+        self.assertEqual(snapshot.size, os.path.getsize(self.service.log_file))
+
+    def test_get_log_file_path_flushes(self):
+        self.service.write_entry("Elon", "Musk")
+        self.service.get_log_file_path()
+        self.assertEqual(self.read_entries(), ["Elon;Musk\n"])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            LogService(log_file_name="test_buffered_log_service.csv", mode="telepathy")
+
+
+class BackgroundLogServiceTest(TestCase):
+    def setUp(self) -> None:
+        remove_log_files("test_background_log_service")
+        self.service = LogService(
+            log_file_name="test_background_log_service.csv",
+            mode=LogService.BACKGROUND,
+            queue_size=2,
+            queue_policy=LogService.DROP,
+        )
+
+    def test_write_entry_background(self):
+        self.service.write_entry("Elon", "Musk")
+        self.service.flush()
+        with open(self.service.log_file) as csv_file:
+            self.assertEqual(csv_file.readlines()[1:], ["Elon;Musk\n"])
+        self.assertEqual(self.service.get_metrics()["written"], 1)
+        self.assertEqual(self.service.get_metrics()["queue_depth"], 0)
+
+    def stall_writer(self) -> threading.Event:
+        release = threading.Event()
+        append = self.service._append
+        self.service._append = lambda lines: release.wait() and append(lines)
+        return release
+
+    def test_write_entry_queue_full_drop(self):
+        release = self.stall_writer()
+        self.service.write_entry("Elon", "0")
+        while self.service.get_metrics()["queue_depth"]:
+            time.sleep(0.01)  # the writer thread took the entry and stalled
+
+        for i in range(1, 4):
+            self.service.write_entry("Elon", str(i))
+        self.assertEqual(self.service.get_metrics()["queue_depth"], 2)
+        self.assertEqual(self.service.get_metrics()["dropped"], 1)
+
+        release.set()
+        self.service.flush()
+        self.assertEqual(self.service.get_metrics()["written"], 3)
+
+    def test_write_entry_queue_full_block(self):
+        self.service.queue_policy = LogService.BLOCK
+        self.service.queue_timeout = 0.05
+        release = self.stall_writer()
+        for i in range(4):
+            self.service.write_entry("Elon", str(i))
+            time.sleep(0.05)
+
+        metrics = self.service.get_metrics()
+        self.assertEqual(metrics["blocked"], 1)
+        self.assertEqual(metrics["dropped"], 1)
+        release.set()
+
+
+class RotatingLogServiceTest(TestCase):
+    log_dir = "static/log/test_rotation/"
+
+    def setUp(self) -> None:
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def create_service(self, **kwargs) -> LogService:
+        return LogService(log_file_name="passengers.csv", output_log_path="/" + self.log_dir, **kwargs)
+
+    def wait_compressed(self, service: LogService) -> None:
+        for _ in range(500):
+            sealed = [name for name in os.listdir(self.log_dir) if name.endswith(".csv")]
+            if all(segment.compressed for segment in service.manifest.segments) and sealed == ["passengers.csv"]:
+                return
+            time.sleep(0.01)
+
+    def test_rotate_by_size(self):
+        service = self.create_service(max_bytes=40)
+        for i in range(5):
+            service.write_entry("Elon", f"Musk{i}")
+
+        self.assertEqual([s.entries for s in service.manifest.segments], [2, 2])
+        self.assertEqual(service.manifest.active, 3)
+        with open(service.log_file) as csv_file:
+            self.assertEqual(csv_file.readlines(), ["name;surname\n", "Elon;Musk4\n"])
+        with open(self.log_dir + "passengers.000001.csv") as csv_file:
+            self.assertEqual(csv_file.readlines(), ["name;surname\n", "Elon;Musk0\n", "Elon;Musk1\n"])
+
+    def test_rotate_by_time(self):
+        service = self.create_service(rotate_interval=0.1)
+        service.write_entry("Elon", "Musk")
+        time.sleep(0.2)
+        service.write_entry("Jeff", "Bezos")
+
+        self.assertEqual(len(service.manifest.segments), 1)
+
+    def test_restart_keeps_entries(self):
+        service = self.create_service()
+        service.write_entry("Elon", "Musk")
+
+        restarted = self.create_service()
+        self.assertEqual(restarted.manifest.segments[0].entries, 1)
+        self.assertEqual(restarted.offset, service.offset)
+        snapshot = restarted.export()
+        self.assertEqual(
+            b"".join(restarted.read_snapshot(snapshot)),
+            b"name;surname\nElon;Musk\n",
+        )
+
+    def test_max_segments(self):
+        service = self.create_service(max_bytes=40, max_segments=2)
+        for i in range(7):
+            service.write_entry("Elon", f"Musk{i}")
+
+        self.assertEqual([s.number for s in service.manifest.segments], [2, 3])
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.log_dir) if name.endswith(".csv")),
+            ["passengers.000002.csv", "passengers.000003.csv", "passengers.csv"],
+        )
+        self.assertEqual(service.count_entries(), 5)
+        self.assertEqual(repr(service.get_entry(0)), "Elon Musk2")
+        self.assertEqual(len(self.create_service(max_segments=2).manifest.segments), 2)
+
+    def test_per_process(self):
+        service = self.create_service(per_process=True)
+        service.write_entry("Elon", "Musk")
+        self.assertEqual(service.log_file, self.log_dir + "worker-0/passengers.csv")
+        snapshot = service.export()
+
+        parent_slot = os.dup(service._slot_file.fileno())  # the parent keeps its slot locked
+        try:
+            service._reset_after_fork()  # a forked worker
+            service.write_entry("Jeff", "Bezos")
+
+            self.assertEqual(service.log_file, self.log_dir + "worker-1/passengers.csv")
+            self.assertEqual(service.count_entries(), 1)
+            self.assertEqual(service.offset, len(b"name;surname\nJeff;Bezos\n"))
+            self.assertIsNone(service.pin_snapshot(snapshot))
+            with self.assertRaises(FileNotFoundError):
+                list(service.read_snapshot(snapshot))
+            with open(self.log_dir + "worker-0/passengers.csv") as csv_file:
+                self.assertEqual(csv_file.readlines(), ["name;surname\n", "Elon;Musk\n"])
+        finally:
+            os.close(parent_slot)
+
+        service._slot_file.close()  # the worker stops
+        restarted = self.create_service(per_process=True)  # takes over the slot of the stopped worker
+        self.assertEqual(restarted.log_file, self.log_dir + "worker-0/passengers.csv")
+        self.assertEqual(restarted.count_entries(), 1)
+
+        with self.settings(FLEET_STORE={"STORE": "shared"}, PASSENGER_LOG={"OUTPUT_LOG_PATH": "/" + self.log_dir}):
+            self.assertTrue(LogService.from_settings().per_process)
+
+    def test_prune_pinned_segments(self):
+        service = self.create_service(max_bytes=40, max_segments=1)
+        for i in range(2):
+            service.write_entry("Elon", f"Musk{i}")
+        snapshot = service.export()
+        restored = pickle.loads(pickle.dumps(snapshot))
+        self.assertIsNone(restored.pin)
+        for i in range(2, 12):
+            service.write_entry("Elon", f"Musk{i}")  # rotates several times
+
+        expected = b"name;surname\nElon;Musk0\nElon;Musk1\n"
+        self.assertEqual(b"".join(service.read_snapshot(snapshot)), expected)
+        self.assertEqual(b"".join(service.read_snapshot(service.pin_snapshot(restored))), expected)
+
+        del snapshot  # releases the pin
+        service.write_entry("Elon", "Musk12")
+        service.write_entry("Elon", "Musk13")  # rotates once the pin is released
+        self.assertEqual(len(service.manifest.segments), 1)
+        self.assertIsNone(service.pin_snapshot(restored))
+
+    def test_read_snapshot_segments(self):
+        service = self.create_service(max_bytes=40)
+        for i in range(5):
+            service.write_entry("Elon", f"Musk{i}")
+        snapshot = service.export()
+        service.write_entry("Elon", "Musk5")
+        service.write_entry("Elon", "Musk6")  # rotates the segment pinned by the snapshot
+
+        expected = b"name;surname\n" + b"".join(f"Elon;Musk{i}\n".encode() for i in range(5))
+        self.assertEqual(snapshot.size, len(expected))
+        self.assertEqual(b"".join(service.read_snapshot(snapshot, chunk_size=7)), expected)
+        self.assertEqual(b"".join(service.read_snapshot(snapshot, 20, 50)), expected[20:50])
+
+    def test_export_since(self):
+        service = self.create_service(max_bytes=40)
+        for i in range(5):
+            service.write_entry("Elon", f"Musk{i}")
+        since = service.manifest.segments[1].closed
+
+        snapshot = service.export(since=since)
+        self.assertEqual([number for number, _ in snapshot.segments], [2, 3])
+
+    def test_count_and_get_entry(self):
+        service = self.create_service(max_bytes=40)
+        for i in range(5):
+            service.write_entry("Elon", f"Musk{i}")
+
+        self.assertEqual(service.count_entries(), 5)
+        self.assertEqual(repr(service.get_entry(0)), "Elon Musk0")
+        self.assertEqual(repr(service.get_entry(3)), "Elon Musk3")
+        self.assertEqual(repr(service.get_entry(4)), "Elon Musk4")
+        self.assertEqual(service.get_entry(5), None)
+
+        service.write_entry("Elon", "Musk5")
+        self.assertEqual(repr(service.get_entry(5)), "Elon Musk5")
+
+    def test_search_surname(self):
+        service = self.create_service(max_bytes=40, compress=True)
+        for surname in ["Musk", "Bezos", "Musgrave", "Gates", "Mustang"]:
+            service.write_entry("Elon", surname)
+        self.wait_compressed(service)
+
+        found = service.search_surname("Mus")
+        self.assertEqual([index for index, _ in found], [0, 2, 4])
+        self.assertEqual([p.surname for _, p in found], ["Musk", "Musgrave", "Mustang"])
+        self.assertEqual(len(service.search_surname("Mus", limit=2)), 2)
+        self.assertEqual(service.search_surname("surname"), [])
+
+    def test_compress_segments(self):
+        service = self.create_service(max_bytes=40, compress=True)
+        for i in range(3):
+            service.write_entry("Elon", f"Musk{i}")
+        snapshot = service.export()
+        self.wait_compressed(service)
+
+        self.assertEqual(service.manifest.segments[0].file, "passengers.000001.csv.gz")
+        self.assertFalse(os.path.exists(self.log_dir + "passengers.000001.csv"))
+        self.assertEqual(
+            b"".join(service.read_snapshot(snapshot)),
+            b"name;surname\nElon;Musk0\nElon;Musk1\nElon;Musk2\n",
+        )
+
+    def test_compress_rotated_on_start(self):
+        self.create_service().write_entry("Elon", "Musk")
+
+        with mock.patch("scooter_control.services.log_service.get_scheduler") as get_scheduler:
+            service = self.create_service(compress=True)
+            get_scheduler.assert_not_called()  # the service is created at import time
+        self.assertEqual(service.manifest.segments[0].file, "passengers.000001.csv")
+
+        service.write_entry("Jeff", "Bezos")
+        self.wait_compressed(service)
+        self.assertEqual(service.manifest.segments[0].file, "passengers.000001.csv.gz")
@@ -1,7 +1,13 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
 from uuid import uuid4
 from django.test import TestCase
 
+from scooter_control.jobs import gzip_file
 from scooter_control.models import Operation
+from scooter_control.scheduler import PROCESS_POOL
 from scooter_control.services import OperationService
 
 
@@ -38,4 +44,157 @@ class TestOperationService(TestCase):
         op_id = self.service.execute_operation(lambda x: x+1, args=(0,))
         op = Operation(op_id)
 
-        self.assertEqual(self.service.operations.get(op_id), op)
\ No newline at end of file
+        self.assertEqual(self.service.operations.get(op_id), op)
+
+    def test_execute_operation_process_pool(self):
+        path = "static/log/test_process_pool.csv"
+        with open(path, "w") as file:
+            file.write("name;surname\n")
+        op_id = self.service.execute_operation(gzip_file, args=(path,), executor=PROCESS_POOL)
+        for _ in range(500):
+            if self.service.get_operation(op_id).done:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.service.get_operation(op_id).result, path + ".gz")
+        os.remove(path)
+        os.remove(path + ".gz")
+
+    def test_execute_operation_key_reuses_finished(self):
+        later = datetime.now() + timedelta(hours=1)
+        op_id = self.service.execute_operation(lambda: 1, run_date=later, key="one")
+
+        self.service.finish_operation(op_id, 1)
+        self.assertEqual(self.service.execute_operation(lambda: 1, run_date=later, key="one"), op_id)
+        self.assertNotEqual(self.service.execute_operation(lambda: 1, run_date=later, key="two"), op_id)
+
+    def test_execute_operation_key_coalesces_pending(self):
+        calls = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.2)
+            return len(calls)
+
+        op_ids = set()
+        threads = [
+            threading.Thread(target=lambda: op_ids.add(self.service.execute_operation(work, key="herd")))
+            for _ in range(50)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        time.sleep(0.5)
+
+        self.assertEqual(len(op_ids), 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(self.service.get_operation(op_ids.pop()).result, 1)
+        self.assertEqual(self.service.get_metrics()["coalesced"], 49)
+
+    def test_execute_operation_key_released_on_error(self):
+        def fail():
+            raise RuntimeError("export failed")
+
+        with self.assertLogs("apscheduler.executors.default", level="ERROR"):
+            op_id = self.service.execute_operation(fail, key="fail")
+            start = time.monotonic()
+            op = self.service.wait_operation(op_id, 5)
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((op.done, op.failed, op.result), (True, True, None))
+        self.assertNotIn("fail", self.service.keys)
+        self.assertNotEqual(self.service.execute_operation(lambda: 1, key="fail"), op_id)
+        self.assertEqual(self.service.get_metrics()["done"], 1)
+
+    def test_failed_operation_ttl(self):
+        service = OperationService(ttl=0.1)
+        op_id = uuid4()
+        service.operations[op_id] = Operation(op_id)
+
+        self.assertEqual(service.fail_operation(op_id), True)
+        self.assertEqual(service.fail_operation(uuid4()), False)
+        time.sleep(0.2)
+        self.assertEqual(service.get_operation(op_id), None)
+        self.assertEqual(service.get_metrics()["evicted"], 1)
+
+    def test_wait_operation_finished(self):
+        op_id = uuid4()
+        self.service.operations[op_id] = Operation(op_id)
+        threading.Timer(0.1, self.service.finish_operation, args=(op_id, 1)).start()
+
+        start = time.monotonic()
+        op = self.service.wait_operation(op_id, 5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(op.done, True)
+        self.assertEqual(op.result, 1)
+
+    def test_wait_operation_timeout(self):
+        op_id = uuid4()
+        self.service.operations[op_id] = Operation(op_id)
+
+        self.assertEqual(self.service.wait_operation(op_id, 0.1).done, False)
+        self.assertEqual(self.service.wait_operation(uuid4(), 0.1), None)
+
+    async def test_wait_operation_async(self):
+        op_id = uuid4()
+        self.service.operations[op_id] = Operation(op_id)
+        threading.Timer(0.1, self.service.finish_operation, args=(op_id, 1)).start()
+
+        start = time.monotonic()
+        op = await self.service.wait_operation_async(op_id, 5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((op.done, op.result), (True, 1))
+        self.assertEqual((await self.service.wait_operation_async(op_id, 5)).result, 1)
+        self.assertEqual(self.service._waiters, {})
+
+    async def test_wait_operation_async_timeout(self):
+        op_id = uuid4()
+        self.service.operations[op_id] = Operation(op_id)
+
+        self.assertEqual((await self.service.wait_operation_async(op_id, 0.1)).done, False)
+        self.assertEqual(await self.service.wait_operation_async(uuid4(), 0.1), None)
+        self.assertEqual(self.service._waiters, {})
+
+    def test_finished_operation_ttl(self):
+        service = OperationService(ttl=0.1)
+        op_id = uuid4()
+        service.operations[op_id] = Operation(op_id)
+        service.finish_operation(op_id, True)
+        time.sleep(0.2)
+
+        self.assertEqual(service.get_operation(op_id), None)
+        self.assertEqual(service.is_operation_evicted(op_id), True)
+        self.assertEqual(service.get_metrics(), {"live": 0, "done": 0, "evicted": 1, "coalesced": 0})
+
+    def test_finished_operation_max_size(self):
+        service = OperationService(max_size=2)
+        op_ids = [uuid4() for _ in range(3)]
+        for op_id in op_ids:
+            service.operations[op_id] = Operation(op_id, key=op_id)
+            service.keys[op_id] = op_id
+        service.operations[uuid4()] = Operation(uuid4())
+
+        service.finish_operation(op_ids[0], True)
+        service.finish_operation(op_ids[1], True)
+        service.get_operation(op_ids[0])  # op_ids[1] is now the least recently used
+        service.finish_operation(op_ids[2], True)
+
+        self.assertIsNotNone(service.get_operation(op_ids[0]))
+        self.assertEqual(service.get_operation(op_ids[1]), None)
+        self.assertNotIn(op_ids[1], service.keys)
+        self.assertEqual(service.get_metrics(), {"live": 1, "done": 2, "evicted": 1, "coalesced": 0})
+
+    def test_finished_operation_persisted(self):
+        service = OperationService(max_size=0, persist=True)
+        op_id = uuid4()
+        service.operations[op_id] = Operation(op_id)
+        service.finish_operation(op_id, {"path": "passengers.csv"})
+
+        self.assertEqual(service.get_metrics()["evicted"], 1)
+        self.assertEqual(service.get_operation(op_id), Operation(op_id, True, {"path": "passengers.csv"}))
+
+        restarted = OperationService(persist=True)
+        self.assertEqual(restarted.wait_operation(op_id, 0).result, {"path": "passengers.csv"})
+        self.assertEqual(restarted.get_metrics()["done"], 1)
+        self.assertEqual(restarted.get_operation(uuid4()), None)
@@ -16,6 +16,13 @@ class PassengerServiceTest(TestCase):
         self.assertEqual(self.service.passengers[added_passenger_id].name, passenger.name)
         self.assertEqual(self.service.passengers[added_passenger_id].surname, passenger.surname)
 
+    def test_add_passengers(self):
+        passenger_ids = self.service.add_passengers([('Water', 'Rock'), ('Fire', 'Stone')])
+
+        self.assertEqual(len(passenger_ids), 2)
+        self.assertEqual(repr(self.service.get_passenger(passenger_ids[0])), 'Water Rock')
+        self.assertEqual(repr(self.service.get_passenger(passenger_ids[1])), 'Fire Stone')
+
     def test_get_passenger_success(self):
         passenger = Passenger(name='Water', surname='Rock')
         passenger_id = uuid4()
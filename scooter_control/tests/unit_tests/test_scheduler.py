@@ -0,0 +1,28 @@
+import os
+from django.test import TestCase
+
+from scooter_control.scheduler import get_scheduler, is_scheduler_running
+
+
+class TestScheduler(TestCase):
+    def test_get_scheduler_started_once(self):
+        scheduler = get_scheduler()
+
+        self.assertTrue(scheduler.running)
+        self.assertIs(get_scheduler(), scheduler)
+
+    def test_get_scheduler_after_fork(self):
+        parent = get_scheduler()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            running = is_scheduler_running()
+            child = get_scheduler()
+            os.write(write_end, bytes([running, child is not parent and child.running]))
+            child.shutdown()
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(os.read(read_end, 2), bytes([False, True]))
+        os.close(read_end)
@@ -1,8 +1,10 @@
+import asyncio
+import threading
 from uuid import uuid4
 
 from django.test import TestCase
 
-from scooter_control.models import Scooter, ScooterStatus
+from scooter_control.models import Scooter, ScooterStatus, ScooterTransition
 from scooter_control.services import ScooterService
 
 
@@ -17,6 +19,90 @@ class ScooterServiceTest(TestCase):
         self.assertEqual(self.service.scooters[added_scooter.id].status, ScooterStatus.VACANT)
         self.assertEqual(self.service.scooters[added_scooter.id].passenger_id, None)
 
+    def test_add_scooters(self):
+        first = self.service.add_scooter()
+        added = self.service.add_scooters(3)
+
+        self.assertEqual(len(added), 3)
+        self.assertEqual(self.service.scooters.order, [first.id] + [s.id for s in added])
+        self.assertEqual(self.service.count_scooters_by_status()[ScooterStatus.VACANT], 4)
+        self.assertEqual(self.service.get_scooter_list(limit=2, offset=2), added[1:])
+
+    def test_apply_transitions(self):
+        first, second = self.service.add_scooters(2)
+        passenger_id = uuid4()
+
+        results = self.service.apply_transitions([
+            ScooterTransition(first.id, ScooterStatus.OCCUPIED, passenger_id),
+            ScooterTransition(uuid4(), ScooterStatus.VACANT),
+            ScooterTransition(second.id, ScooterStatus.BROKEN),
+            ScooterTransition(first.id, ScooterStatus.OCCUPIED, uuid4()),
+        ])
+
+        self.assertEqual(results, ["applied", "not_found", "applied", "conflict"])
+        self.assertEqual((first.status, first.passenger_id), (ScooterStatus.OCCUPIED, passenger_id))
+        self.assertEqual(second.status, ScooterStatus.BROKEN)
+
+    def test_apply_transitions_atomic(self):
+        scooter = self.service.add_scooter()
+
+        results = self.service.apply_transitions(
+            [ScooterTransition(scooter.id, ScooterStatus.BROKEN), ScooterTransition(uuid4(), ScooterStatus.BROKEN)],
+            atomic=True,
+        )
+
+        self.assertEqual(results, ["skipped", "not_found"])
+        self.assertEqual(scooter.status, ScooterStatus.VACANT)
+
+        results = self.service.apply_transitions(
+            [
+                ScooterTransition(scooter.id, ScooterStatus.OCCUPIED, uuid4()),
+                ScooterTransition(scooter.id, ScooterStatus.OCCUPIED, uuid4()),
+            ],
+            atomic=True,
+        )
+
+        self.assertEqual(results, ["skipped", "conflict"])
+        self.assertEqual(scooter.status, ScooterStatus.VACANT)
+
+        results = self.service.apply_transitions(
+            [
+                ScooterTransition(scooter.id, ScooterStatus.OCCUPIED, uuid4()),
+                ScooterTransition(scooter.id, ScooterStatus.VACANT),
+            ],
+            atomic=True,
+        )
+
+        self.assertEqual(results, ["applied", "applied"])
+        self.assertEqual(scooter.status, ScooterStatus.VACANT)
+
+    def test_apply_transitions_atomic_passenger_riding(self):
+        first, second = self.service.add_scooters(2)
+        passenger_id = uuid4()
+
+        results = self.service.apply_transitions(
+            [
+                ScooterTransition(first.id, ScooterStatus.OCCUPIED, passenger_id),
+                ScooterTransition(second.id, ScooterStatus.OCCUPIED, passenger_id),
+            ],
+            atomic=True,
+        )
+
+        self.assertEqual(results, ["skipped", "conflict"])
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), None)
+
+        results = self.service.apply_transitions(
+            [
+                ScooterTransition(first.id, ScooterStatus.OCCUPIED, passenger_id),
+                ScooterTransition(first.id, ScooterStatus.BROKEN),
+                ScooterTransition(second.id, ScooterStatus.OCCUPIED, passenger_id),
+            ],
+            atomic=True,
+        )
+
+        self.assertEqual(results, ["applied", "applied", "applied"])
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), second)
+
     def test_get_scooter_success(self):
         scooter = Scooter()
         self.service.scooters[scooter.id] = scooter
@@ -36,6 +122,80 @@ class ScooterServiceTest(TestCase):
         self.assertEqual(self.service.scooters[scooter.id].status, ScooterStatus.OCCUPIED)
         self.assertEqual(self.service.scooters[scooter.id].passenger_id, passenger_id)
 
+    def test_occupy_scooter_not_vacant(self):
+        scooter = self.service.add_scooter()
+        passenger_id = uuid4()
+        self.service.occupy_scooter(scooter.id, passenger_id)
+
+        self.assertEqual(self.service.occupy_scooter(scooter.id, uuid4()), False)
+        self.assertEqual(scooter.passenger_id, passenger_id)
+
+    def test_occupy_scooter_passenger_riding(self):
+        first, second = self.service.add_scooters(2)
+        passenger_id = uuid4()
+        self.service.occupy_scooter(first.id, passenger_id)
+
+        self.assertEqual(self.service.occupy_scooter(second.id, passenger_id), False)
+        self.assertEqual(second.status, ScooterStatus.VACANT)
+
+        self.service.break_scooter(first.id)
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), None)
+        self.assertEqual(self.service.occupy_scooter(second.id, passenger_id), True)
+
+        self.service.vacant_scooter(first.id)  # the broken scooter releases the passenger
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), second)
+
+    def test_get_passenger_scooter(self):
+        scooter = self.service.add_scooter()
+        passenger_id = uuid4()
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), None)
+
+        self.service.occupy_scooter(scooter.id, passenger_id)
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), scooter)
+
+        self.service.vacant_scooter(scooter.id)
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), None)
+        self.assertEqual(self.service.scooters.by_passenger, {})
+
+    def test_occupy_scooters_passenger_race(self):
+        scooters = self.service.add_scooters(8)
+        passenger_id = uuid4()
+        barrier = threading.Barrier(8)
+        wins = []
+
+        def occupy(scooter):
+            barrier.wait()
+            if self.service.occupy_scooter(scooter.id, passenger_id):
+                wins.append(scooter)
+
+        threads = [threading.Thread(target=occupy, args=(s,)) for s in scooters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(wins), 1)
+        self.assertEqual(self.service.get_passenger_scooter(passenger_id), wins[0])
+
+    def test_occupy_scooter_race(self):
+        scooter = self.service.add_scooter()
+        barrier = threading.Barrier(8)
+        wins = []
+
+        def occupy():
+            passenger_id = uuid4()
+            barrier.wait()
+            if self.service.occupy_scooter(scooter.id, passenger_id):
+                wins.append(passenger_id)
+
+        threads = [threading.Thread(target=occupy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(wins, [scooter.passenger_id])
+
     def test_occupy_scooter_not_found(self):
         self.assertEqual(self.service.occupy_scooter(uuid4(), uuid4()), False)
 
@@ -76,6 +236,88 @@ class ScooterServiceTest(TestCase):
 
         self.assertListEqual(self.service.get_scooter_list(), scooters_list)
 
+    def test_get_scooter_list_offset(self):
+        scooters_list: list[Scooter] = [self.service.add_scooter() for _ in range(30)]
+
+        self.assertListEqual(self.service.get_scooter_list(limit=10, offset=15), scooters_list[15:25])
+        self.assertListEqual(self.service.get_scooter_list(limit=10, offset=25), scooters_list[25:])
+        self.assertListEqual(self.service.get_scooter_list(limit=10, offset=30), [])
+
+    def test_get_scooter_page_success(self):
+        scooters_list: list[Scooter] = [self.service.add_scooter() for _ in range(25)]
+
+        first_page, cursor = self.service.get_scooter_page(limit=10)
+        self.assertListEqual(first_page, scooters_list[:10])
+
+        scooters_list.append(self.service.add_scooter())
+        second_page, cursor = self.service.get_scooter_page(limit=10, cursor=cursor)
+        self.assertListEqual(second_page, scooters_list[10:20])
+
+        last_page, cursor = self.service.get_scooter_page(limit=10, cursor=cursor)
+        self.assertListEqual(last_page, scooters_list[20:])
+        self.assertEqual(cursor, None)
+
+    def test_get_scooter_page_invalid_cursor(self):
+        self.service.add_scooter()
+        _, cursor = self.service.get_scooter_page(limit=1)
+
+        self.assertEqual(cursor, None)
+        self.assertEqual(self.service.get_scooter_page(cursor="i am error"), None)
+        self.assertEqual(self.service.get_scooter_page(cursor=self.service.scooters.cursor(0)[:-4] + "AAAA"), None)
+
+    def test_get_scooter_list_status(self):
+        scooters_list: list[Scooter] = [self.service.add_scooter() for _ in range(5)]
+        self.service.break_scooter(scooters_list[3].id)
+        self.service.break_scooter(scooters_list[1].id)
+        self.service.vacant_scooter(scooters_list[1].id)
+        self.service.occupy_scooter(scooters_list[1].id, uuid4())
+
+        self.assertListEqual(
+            self.service.get_scooter_list(status=ScooterStatus.BROKEN),
+            [scooters_list[3]],
+        )
+        self.assertListEqual(
+            self.service.get_scooter_list(status=ScooterStatus.VACANT, limit=2, offset=1),
+            [scooters_list[2], scooters_list[4]],
+        )
+
+    def test_get_scooter_list_status_while_changing(self):
+        scooters_list = self.service.add_scooters(200)
+        stop = threading.Event()
+
+        def flip():
+            while not stop.is_set():
+                for s in scooters_list[::2]:
+                    self.service.break_scooter(s.id)
+                    self.service.vacant_scooter(s.id)
+
+        thread = threading.Thread(target=flip)
+        thread.start()
+        try:
+            for _ in range(200):
+                page = self.service.get_scooter_list(status=ScooterStatus.VACANT, limit=20, offset=50)
+                self.assertLessEqual(len(page), 20)
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_count_scooters_by_status(self):
+        scooter = Scooter()
+        scooter.status = ScooterStatus.BROKEN
+        self.service.scooters[scooter.id] = scooter
+        occupied = self.service.add_scooter()
+        self.service.occupy_scooter(occupied.id, uuid4())
+        self.service.add_scooter()
+
+        self.assertDictEqual(
+            self.service.count_scooters_by_status(),
+            {
+                ScooterStatus.BROKEN: 1,
+                ScooterStatus.VACANT: 1,
+                ScooterStatus.OCCUPIED: 1,
+            },
+        )
+
     def test_is_scooter_broken_success(self):
         scooter = Scooter()
         scooter.status = ScooterStatus.BROKEN
@@ -91,3 +333,40 @@ class ScooterServiceTest(TestCase):
 
     def test_is_scooter_broken_not_found(self):
         self.assertEqual(self.service.is_scooter_broken(uuid4()), None)
+
+    async def test_status_feed_filters(self):
+        first, second = self.service.add_scooter(), self.service.add_scooter()
+        broken = self.service.feed.subscribe(statuses=[ScooterStatus.BROKEN])
+        watched = self.service.feed.subscribe(scooter_ids=[second.id])
+
+        self.service.break_scooter(first.id)
+        self.service.occupy_scooter(second.id, uuid4())
+        self.service.vacant_scooter(second.id)
+        await asyncio.sleep(0)
+
+        self.assertEqual([(e.scooter_id, e.status) for e in drain(broken)], [(first.id, ScooterStatus.BROKEN)])
+        self.assertEqual([e.status for e in drain(watched)], [ScooterStatus.OCCUPIED, ScooterStatus.VACANT])
+        self.assertEqual(self.service.feed.get_metrics(), {"subscribers": 2, "published": 3, "dropped": 0})
+
+        broken.close()
+        watched.close()
+        self.assertEqual(self.service.feed.get_metrics()["subscribers"], 0)
+
+    async def test_status_feed_drops_for_slow_subscriber(self):
+        self.service.feed.queue_size = 1
+        scooter = self.service.add_scooter()
+        sub = self.service.feed.subscribe()
+
+        self.service.break_scooter(scooter.id)
+        self.service.vacant_scooter(scooter.id)
+        await asyncio.sleep(0)
+
+        self.assertEqual([e.status for e in drain(sub)], [ScooterStatus.BROKEN])
+        self.assertEqual(sub.dropped, 1)
+
+
+def drain(sub) -> list:
+    events = []
+    while not sub.queue.empty():
+        events.append(sub.queue.get_nowait())
+    return events
@@ -1,22 +1,44 @@
+import os
+import re
+from typing import Iterator, Sequence
 from uuid import UUID
 
-from drf_spectacular.utils import extend_schema
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter, PolymorphicProxySerializer
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
-# from .models import Scooter
+from .models import Operation, ScooterStatus, ScooterTransition
 from .serializers import (
     ScooterSerializer,
     ScooterIDSerializer,
+    ScooterCountSerializer,
     InPassengerSerializer,
+    PassengerBatchSerializer,
     PassengerIDSerializer,
     ValidationErrorSerializer,
+    BatchValidationErrorSerializer,
     OccupyScooterSerializer,
     PaginationSerializer,
+    ScooterPageSerializer,
+    ScooterBatchSerializer,
+    ScooterBatchResultSerializer,
+    ScooterStatusCountSerializer,
     OperationSerializer,
     GetOperationQuerySerializer,
+    WaitOperationQuerySerializer,
+    LogDownloadQuerySerializer,
+    LogExportQuerySerializer,
+    LogEntryQuerySerializer,
+    LogEntrySerializer,
+    LogSearchQuerySerializer,
+    LogSearchSerializer,
+    MetricsSerializer,
 )
 from .services import (
     LogService,
@@ -24,13 +46,56 @@ from .services import (
     ScooterService,
     PassengerService,
 )
+from .services.fleet_store import create_fleet_store
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single byte range of the Range header
+    :param header: Range header value
+    :param size: Resource size
+    :return: Start and end (exclusive) offsets or None to send the whole resource
+    :raise ValueError: Range is not satisfiable
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None  # unsupported units and multiple ranges are served as a whole
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size
+    else:
+        start, end = int(first), size if not last else min(int(last) + 1, size)
+    if start >= size or start >= end:
+        raise ValueError(header)
+    return start, end
+
+
+def json_array_chunks(items: Sequence, serializer_class: type, chunk_size: int = 500) -> Iterator[bytes]:
+    """
+    Serialize items as a JSON array one chunk at a time
+    :param items: Items to serialize
+    :param serializer_class: Serializer of a single item
+    :param chunk_size: Items serialized at once
+    :return: Iterator of JSON array parts
+    """
+    renderer = JSONRenderer()
+    yield b"["
+    for start in range(0, len(items), chunk_size):
+        chunk = renderer.render(serializer_class(items[start:start + chunk_size], many=True).data)
+        yield (b"," if start else b"") + chunk[1:-1]
+    yield b"]"
 
 
 class ScooterViewSet(ViewSet):
-    scooter_service = ScooterService()
-    log_service = LogService()
-    ops_service = OperationService()
-    passenger_service = PassengerService()
+    fleet_store = create_fleet_store()
+    scooter_service = ScooterService(store=fleet_store)
+    log_service = LogService.from_settings()
+    ops_service = OperationService.from_settings()
+    passenger_service = PassengerService(store=fleet_store)
 
     @extend_schema(
         summary="Get new scooter",
@@ -47,6 +112,31 @@ class ScooterViewSet(ViewSet):
             data=ScooterSerializer(s).data
         )
 
+    @extend_schema(
+        summary="Create a batch of new scooters",
+        request=ScooterCountSerializer,
+        responses={
+            status.HTTP_201_CREATED: ScooterSerializer(many=True),
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["POST"])
+    def post_scooters_bulk(self, request):
+        in_count = ScooterCountSerializer(data=request.data)
+        if not in_count.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": in_count.errors}).data,
+            )
+
+        scooters = self.scooter_service.add_scooters(in_count.validated_data["count"])
+        return StreamingHttpResponse(
+            json_array_chunks(scooters, ScooterSerializer),
+            status=status.HTTP_201_CREATED,
+            content_type="application/json",
+        )
+
     @extend_schema(
         summary="Post new passenger information",
         request=InPassengerSerializer,
@@ -72,12 +162,75 @@ class ScooterViewSet(ViewSet):
             data=PassengerIDSerializer({"passenger_id": new_passenger_id}).data
         )
 
+    @extend_schema(
+        summary="Post a batch of new passengers",
+        request=PassengerBatchSerializer,
+        responses={
+            status.HTTP_201_CREATED: PassengerIDSerializer(many=True),
+            status.HTTP_422_UNPROCESSABLE_ENTITY: BatchValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["POST"])
+    def post_passengers_bulk(self, request):
+        in_batch = PassengerBatchSerializer(data=request.data)
+        if not in_batch.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=BatchValidationErrorSerializer({"errors": in_batch.errors}).data,
+            )
+
+        passengers = [(passenger["name"], passenger["surname"]) for passenger in in_batch.validated_data["passengers"]]
+        passenger_ids = self.passenger_service.add_passengers(passengers)
+        self.log_service.write_entries(passengers)
+        return Response(
+            status=status.HTTP_201_CREATED,
+            data=PassengerIDSerializer([{"passenger_id": p} for p in passenger_ids], many=True).data,
+        )
+
+    @extend_schema(
+        summary="Get the scooter a passenger occupies",
+        parameters=[PassengerIDSerializer],
+        responses={
+            status.HTTP_200_OK: ScooterSerializer,
+            status.HTTP_204_NO_CONTENT: None,
+            status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_passenger_scooter(self, request):
+        query_ser = PassengerIDSerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        passenger_id = UUID(query_ser.data["passenger_id"])
+        if (scooter := self.scooter_service.get_passenger_scooter(passenger_id)) is not None:
+            return Response(
+                status=status.HTTP_200_OK,
+                data=ScooterSerializer(scooter).data,
+            )
+        if self.passenger_service.get_passenger(passenger_id) is None:
+            return Response(
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            status=status.HTTP_204_NO_CONTENT,
+        )
+
     @extend_schema(
         summary="Occupy scooter by user",
+        description="Only a vacant scooter can be occupied by a passenger riding no other scooter, "
+                    "otherwise the request conflicts.",
         request=OccupyScooterSerializer,
         responses={
             status.HTTP_200_OK: None,
             status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_409_CONFLICT: None,
             status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
         },
         auth=False,
@@ -96,12 +249,14 @@ class ScooterViewSet(ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        scooter_id = UUID(in_occupy.data["scooter_id"])
         if not self.scooter_service.occupy_scooter(
-            scooter_id=UUID(in_occupy.data["scooter_id"]),
+            scooter_id=scooter_id,
             passenger_id=UUID(in_occupy.data["passenger_id"]),
         ):
             return Response(
                 status=status.HTTP_404_NOT_FOUND
+                if self.scooter_service.get_scooter(scooter_id) is None else status.HTTP_409_CONFLICT
             )
 
         return Response(
@@ -164,11 +319,68 @@ class ScooterViewSet(ViewSet):
             status=status.HTTP_404_NOT_FOUND,
         )
 
+    @extend_schema(
+        summary="Change statuses of many scooters",
+        description="Transitions are applied in order. A transition with an unknown scooter or passenger "
+                    "is reported as not_found, occupying a scooter that is not vacant as conflict. "
+                    "With atomic set, nothing is applied unless every transition can be, the rest is skipped.",
+        request=ScooterBatchSerializer,
+        responses={
+            status.HTTP_200_OK: ScooterBatchResultSerializer,
+            status.HTTP_409_CONFLICT: ScooterBatchResultSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: BatchValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["POST"])
+    def post_scooters_batch(self, request):
+        in_batch = ScooterBatchSerializer(data=request.data)
+        if not in_batch.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=BatchValidationErrorSerializer({"errors": in_batch.errors}).data,
+            )
+
+        atomic = in_batch.validated_data["atomic"]
+        transitions = [ScooterTransition(**item) for item in in_batch.validated_data["transitions"]]
+        found = [
+            t.status != ScooterStatus.OCCUPIED or self.passenger_service.get_passenger(t.passenger_id) is not None
+            for t in transitions
+        ]
+        if atomic and not all(found):
+            # nothing is applied, an unknown scooter is still reported as such
+            results = [
+                ScooterService.SKIPPED
+                if passenger_found and self.scooter_service.get_scooter(t.scooter_id) is not None
+                else ScooterService.NOT_FOUND
+                for t, passenger_found in zip(transitions, found)
+            ]
+        else:
+            applied = iter(self.scooter_service.apply_transitions(
+                [t for t, passenger_found in zip(transitions, found) if passenger_found],
+                atomic=atomic,
+            ))
+            results = [next(applied) if passenger_found else ScooterService.NOT_FOUND for passenger_found in found]
+        applied = not atomic or all(result == ScooterService.APPLIED for result in results)
+
+        return Response(
+            status=status.HTTP_200_OK if applied else status.HTTP_409_CONFLICT,
+            data=ScooterBatchResultSerializer({
+                "applied": applied,
+                "results": [{"scooter_id": t.scooter_id, "result": result} for t, result in zip(transitions, results)],
+            }).data,
+        )
+
     @extend_schema(
         summary="Get scooters list",
         parameters=[PaginationSerializer],
         responses={
-            status.HTTP_200_OK: ScooterSerializer(many=True),
+            status.HTTP_200_OK: PolymorphicProxySerializer(
+                component_name="ScooterList",
+                serializers=[ScooterSerializer(many=True), ScooterPageSerializer],
+                resource_type_field_name=None,
+                many=False,
+            ),
             status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
         },
         auth=False,
@@ -182,13 +394,50 @@ class ScooterViewSet(ViewSet):
                 data=query_ser.errors,
             )
 
-        scooters = self.scooter_service.get_scooter_list(**query_ser.data)
+        if "cursor" in query_ser.data:
+            page = self.scooter_service.get_scooter_page(
+                limit=query_ser.data["limit"],
+                cursor=query_ser.data["cursor"],
+            )
+            if page is None:
+                return Response(
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    data={"cursor": ["Invalid cursor."]},
+                )
+            scooters, next_cursor = page
+            return Response(
+                status=status.HTTP_200_OK,
+                data=ScooterPageSerializer({"results": scooters, "next_cursor": next_cursor}).data,
+            )
+
+        scooters = self.scooter_service.get_scooter_list(
+            limit=query_ser.data["limit"],
+            offset=query_ser.data["offset"],
+            status=query_ser.validated_data.get("status"),
+        )
 
         return Response(
             status=status.HTTP_200_OK,
             data=ScooterSerializer(scooters, many=True).data,
         )
 
+    @extend_schema(
+        summary="Get number of scooters in every status",
+        responses={
+            status.HTTP_200_OK: ScooterStatusCountSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_scooter_status_count(self, _):
+        counts = self.scooter_service.count_scooters_by_status()
+        return Response(
+            status=status.HTTP_200_OK,
+            data=ScooterStatusCountSerializer(
+                {scooter_status.name.lower(): count for scooter_status, count in counts.items()}
+            ).data,
+        )
+
     @extend_schema(
         summary="Get notification if scooter is broken",
         parameters=[ScooterIDSerializer],
@@ -223,18 +472,32 @@ class ScooterViewSet(ViewSet):
 
     @extend_schema(
         summary="Generate passengers.csv and get operation details",
+        parameters=[LogExportQuerySerializer],
         responses={
             status.HTTP_200_OK: OperationSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
         },
         auth=False,
     )
     @action(detail=False, methods=["GET"])
-    def get_log_file(self, _):
-        op_id = self.ops_service.execute_operation(self.log_service.get_log_file_path)
+    def get_log_file(self, request):
+        query_ser = LogExportQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        since = query_ser.validated_data.get("since")
+        op_id = self.ops_service.execute_operation(
+            self.log_service.export,
+            args=(since,),
+            key=("log_export", self.log_service.offset, since),
+        )
         op = self.ops_service.get_operation(op_id)
         return Response(
             status=status.HTTP_200_OK,
-            data=OperationSerializer(op).data,
+            data=OperationSerializer(self._log_operation_data(op)).data,
         )
 
     @extend_schema(
@@ -243,6 +506,7 @@ class ScooterViewSet(ViewSet):
         responses={
             status.HTTP_200_OK: OperationSerializer,
             status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_410_GONE: None,
             status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
         },
         auth=False,
@@ -256,21 +520,227 @@ class ScooterViewSet(ViewSet):
                 data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
             )
 
-        op = self.ops_service.get_operation(UUID(query_ser.data.get("id")))
+        op_id = UUID(query_ser.data.get("id"))
+        op = self.ops_service.get_operation(op_id)
+        if op is None:
+            return Response(
+                status=status.HTTP_410_GONE if self.ops_service.is_operation_evicted(op_id) else status.HTTP_404_NOT_FOUND,
+            )
+
+        return Response(
+            status=status.HTTP_200_OK,
+            data=OperationSerializer(self._log_operation_data(op)).data,
+        )
+
+    @extend_schema(
+        summary="Wait for passengers.csv generation to finish",
+        description="Long-poll: the request is held until the operation finishes or the timeout passes, "
+                    "then the operation is returned as by the status endpoint. "
+                    "It is served by an async view that waits without holding a worker thread.",
+        parameters=[WaitOperationQuerySerializer],
+        responses={
+            status.HTTP_200_OK: OperationSerializer,
+            status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_410_GONE: None,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_log_file_status_wait(self, request):
+        query_ser = WaitOperationQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        op_id = query_ser.validated_data["id"]
+        op = self.ops_service.wait_operation(op_id, query_ser.validated_data["timeout"])
+        if op is None:
+            return Response(
+                status=status.HTTP_410_GONE if self.ops_service.is_operation_evicted(op_id) else status.HTTP_404_NOT_FOUND,
+            )
+
+        return Response(
+            status=status.HTTP_200_OK,
+            data=OperationSerializer(self._log_operation_data(op)).data,
+        )
+
+    @extend_schema(
+        summary="Download passengers.csv snapshot made by an operation",
+        parameters=[
+            LogDownloadQuerySerializer,
+            OpenApiParameter("Range", OpenApiTypes.STR, OpenApiParameter.HEADER),
+            OpenApiParameter("If-Range", OpenApiTypes.STR, OpenApiParameter.HEADER),
+        ],
+        responses={
+            (status.HTTP_200_OK, "text/csv"): OpenApiTypes.BINARY,
+            (status.HTTP_206_PARTIAL_CONTENT, "text/csv"): OpenApiTypes.BINARY,
+            status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_409_CONFLICT: None,
+            status.HTTP_410_GONE: None,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE: None,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+            status.HTTP_500_INTERNAL_SERVER_ERROR: None,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_log_file_download(self, request):
+        query_ser = LogDownloadQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        op_id = UUID(query_ser.data["id"])
+        op = self.ops_service.get_operation(op_id)
         if op is None:
+            return Response(
+                status=status.HTTP_410_GONE if self.ops_service.is_operation_evicted(op_id) else status.HTTP_404_NOT_FOUND,
+            )
+        if not op.done:
+            return Response(
+                status=status.HTTP_409_CONFLICT,
+            )
+        if op.failed:
+            return Response(
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        # checked before the response starts, so that it is not cut short by a missing segment
+        snapshot = self.log_service.pin_snapshot(op.result)
+        if snapshot is None:
+            # exported by another worker, or its segments were deleted since
+            return Response(
+                status=status.HTTP_410_GONE,
+            )
+        file_name = os.path.basename(snapshot.path)
+        etag = f'"{op.id}"'  # a snapshot never changes once exported
+
+        if query_ser.data["gzip"]:
+            response = StreamingHttpResponse(
+                self.log_service.gzip_chunks(self.log_service.read_snapshot(snapshot)),
+                content_type="application/gzip",
+            )
+            response["Content-Disposition"] = f'attachment; filename="{file_name}.gz"'
+            response["ETag"] = etag
+            return response
+
+        byte_range = None
+        if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = parse_range(request.headers["Range"], snapshot.size)
+            except ValueError:
+                response = Response(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response["Content-Range"] = f"bytes */{snapshot.size}"
+                return response
+
+        start, end = byte_range or (0, snapshot.size)
+        response = StreamingHttpResponse(
+            self.log_service.read_snapshot(snapshot, start, end),
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            content_type="text/csv",
+        )
+        if byte_range:
+            response["Content-Range"] = f"bytes {start}-{end - 1}/{snapshot.size}"
+        response["Content-Length"] = str(end - start)
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+        response["ETag"] = etag
+        return response
+
+    @extend_schema(
+        summary="Get passenger log entry by index",
+        parameters=[LogEntryQuerySerializer],
+        responses={
+            status.HTTP_200_OK: LogEntrySerializer,
+            status.HTTP_404_NOT_FOUND: None,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_log_entry(self, request):
+        query_ser = LogEntryQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        index = query_ser.data["index"]
+        if (passenger := self.log_service.get_entry(index)) is None:
             return Response(
                 status=status.HTTP_404_NOT_FOUND,
             )
 
         return Response(
             status=status.HTTP_200_OK,
-            data=OperationSerializer(
+            data=LogEntrySerializer({"index": index, "name": passenger.name, "surname": passenger.surname}).data,
+        )
+
+    @extend_schema(
+        summary="Search passenger log by surname prefix",
+        parameters=[LogSearchQuerySerializer],
+        responses={
+            status.HTTP_200_OK: LogSearchSerializer,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: ValidationErrorSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_log_search(self, request):
+        query_ser = LogSearchQuerySerializer(data=request.query_params)
+        if not query_ser.is_valid():
+            return Response(
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                data=ValidationErrorSerializer({"errors": query_ser.errors}).data,
+            )
+
+        found = self.log_service.search_surname(query_ser.data["surname"], limit=query_ser.data["limit"])
+        return Response(
+            status=status.HTTP_200_OK,
+            data=LogSearchSerializer(
+                {
+                    "total": self.log_service.count_entries(),
+                    "results": [
+                        {"index": index, "name": passenger.name, "surname": passenger.surname}
+                        for index, passenger in found
+                    ],
+                }
+            ).data,
+        )
+
+    @staticmethod
+    def _log_operation_data(op: Operation) -> dict:
+        return {
+            "id": op.id,
+            "done": op.done,
+            "failed": op.failed,
+            "result": {
+                # the snapshot is served by the download endpoint, the log file moves on
+                "path": f"{reverse('get_log_file_download')}?id={op.id}",
+            } if op.done and not op.failed else None,
+        }
+
+    @extend_schema(
+        summary="Get service metrics",
+        responses={
+            status.HTTP_200_OK: MetricsSerializer,
+        },
+        auth=False,
+    )
+    @action(detail=False, methods=["GET"])
+    def get_metrics(self, _):
+        return Response(
+            status=status.HTTP_200_OK,
+            data=MetricsSerializer(
                 {
-                    "id": op.id,
-                    "done": op.done,
-                    "result": {
-                        "path": op.result,
-                    },
+                    "log": self.log_service.get_metrics(),
+                    "operations": self.ops_service.get_metrics(),
                 }
             ).data,
         )